@@ -141,6 +141,10 @@ class OffPolicyAlgorithm(BaseAlgorithm):
             replay_buffer_kwargs = {}
         self.replay_buffer_kwargs = replay_buffer_kwargs
         self._episode_storage = None
+        # Reward and length of the running episode of every environment,
+        # an episode can span several rollouts
+        self._current_episode_rewards = None
+        self._current_episode_timesteps = None
 
         self.env_name = env_name
         self.total_steps = total_steps
@@ -248,6 +252,7 @@ class OffPolicyAlgorithm(BaseAlgorithm):
                 self.observation_space,
                 self.action_space,
                 self.device,
+                n_envs=self.n_envs,
                 optimize_memory_usage=self.optimize_memory_usage,
                 **self.replay_buffer_kwargs,
             )
@@ -343,6 +348,10 @@ class OffPolicyAlgorithm(BaseAlgorithm):
             pos = (replay_buffer.pos - 1) % replay_buffer.buffer_size
             replay_buffer.dones[pos] = True
 
+        if reset_num_timesteps or self._current_episode_rewards is None:
+            self._current_episode_rewards = np.zeros(self.n_envs)
+            self._current_episode_timesteps = np.zeros(self.n_envs, dtype=int)
+
         return super()._setup_learn(
             total_timesteps,
             eval_env,
@@ -412,7 +421,7 @@ class OffPolicyAlgorithm(BaseAlgorithm):
         raise NotImplementedError()
 
     def _sample_action(
-        self, learning_starts: int, action_noise: Optional[ActionNoise] = None
+        self, learning_starts: int, action_noise: Optional[ActionNoise] = None, n_envs: int = 1
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Sample an action according to the exploration policy.
@@ -423,6 +432,7 @@ class OffPolicyAlgorithm(BaseAlgorithm):
             Required for deterministic policy (e.g. TD3). This can also be used
             in addition to the stochastic policy for SAC.
         :param learning_starts: Number of steps before learning for the warm-up phase.
+        :param n_envs: Number of environments, one action is sampled for every environment
         :return: action to take in the environment
             and scaled action that will be stored in the replay buffer.
             The two differs when the action space is not normalized (bounds are not [-1, 1]).
@@ -430,11 +440,12 @@ class OffPolicyAlgorithm(BaseAlgorithm):
         # Select action randomly or according to policy
         if self.num_timesteps < learning_starts and not (self.use_sde and self.use_sde_at_warmup):
             # Warmup phase
-            unscaled_action = np.array([self.action_space.sample()])
+            unscaled_action = np.array([self.action_space.sample() for _ in range(n_envs)])
         else:
             # Note: when using continuous actions,
             # we assume that the policy uses tanh to scale the action
             # We use non-deterministic action in the case of SAC, for TD3, it does not matter
+            # The observations of all the environments are passed through the policy as one batch
             unscaled_action, _ = self.predict(self._last_obs, deterministic=False)
 
         # Rescale the action from [low, high] to [-1, 1]
@@ -512,7 +523,7 @@ class OffPolicyAlgorithm(BaseAlgorithm):
         :param new_obs: next observation in the current episode
             or first observation of the episode (when done is True)
         :param reward: reward for the current transition
-        :param done: Termination signal
+        :param done: Termination signal of every environment
         :param infos: List of additional information about the transition.
             It may contain the terminal observations and information about timeout.
         """
@@ -525,14 +536,17 @@ class OffPolicyAlgorithm(BaseAlgorithm):
             self._last_original_obs, new_obs_, reward_ = self._last_obs, new_obs, reward
 
         # As the VecEnv resets automatically, new_obs is already the
-        # first observation of the next episode
-        if done and infos[0].get("terminal_observation") is not None:
-            next_obs = infos[0]["terminal_observation"]
-            # VecNormalize normalizes the terminal observation
-            if self._vec_normalize_env is not None:
-                next_obs = self._vec_normalize_env.unnormalize_obs(next_obs)
-        else:
-            next_obs = new_obs_
+        # first observation of the next episode for the environments that are done
+        next_obs = new_obs_
+        if np.any(done):
+            # Only copied when an episode ended, to keep the new observations unchanged
+            next_obs = np.array(new_obs_)
+            for i, env_done in enumerate(done):
+                if env_done and infos[i].get("terminal_observation") is not None:
+                    next_obs[i] = infos[i]["terminal_observation"]
+                    # VecNormalize normalizes the terminal observation
+                    if self._vec_normalize_env is not None:
+                        next_obs[i] = self._vec_normalize_env.unnormalize_obs(next_obs[i])
 
         replay_buffer.add(
             self._last_original_obs,
@@ -580,78 +594,73 @@ class OffPolicyAlgorithm(BaseAlgorithm):
         num_collected_steps, num_collected_episodes = 0, 0
 
         assert isinstance(env, VecEnv), "You must pass a VecEnv"
-        assert env.num_envs == 1, "OffPolicyAlgorithm only support single environment"
         assert train_freq.frequency > 0, "Should at least collect one step or episode."
 
         if self.use_sde:
-            self.actor.reset_noise()
+            self.actor.reset_noise(env.num_envs)
 
         callback.on_rollout_start()
         continue_training = True
 
+        # A step is one step of all the environments, the train frequency counts
+        # steps of the vectorized environment like in the single environment case
         while should_collect_more_steps(train_freq, num_collected_steps, num_collected_episodes):
-            done = False
-            episode_reward, episode_timesteps = 0.0, 0
-
-            while not done:
-
-                if self.use_sde and self.sde_sample_freq > 0 and num_collected_steps % self.sde_sample_freq == 0:
-                    # Sample a new noise matrix
-                    self.actor.reset_noise()
-
-                # if self.env_name == 'acrobot_continuous':
-                #     env.render()
-
-                # Select action randomly or according to policy
-                action, buffer_action = self._sample_action(learning_starts, action_noise)
+            if self.use_sde and self.sde_sample_freq > 0 and num_collected_steps % self.sde_sample_freq == 0:
+                # Sample a new noise matrix
+                self.actor.reset_noise(env.num_envs)
 
-                # Rescale and perform action
-                new_obs, reward, done, infos = env.step(action)
+            # Select action randomly or according to policy
+            action, buffer_action = self._sample_action(learning_starts, action_noise, env.num_envs)
 
-                self.num_timesteps += 1
-                episode_timesteps += 1
-                num_collected_steps += 1
+            # Rescale and perform action
+            new_obs, reward, dones, infos = env.step(action)
 
-                # Give access to local variables
-                callback.update_locals(locals())
-                # Only stop training if return value is False, not when it is None.
-                if callback.on_step() is False:
-                    return RolloutReturn(0.0, num_collected_steps, num_collected_episodes, continue_training=False)
+            self.num_timesteps += env.num_envs
+            num_collected_steps += 1
 
-                episode_reward += reward
+            # Give access to local variables
+            callback.update_locals(locals())
+            # Only stop training if return value is False, not when it is None.
+            if callback.on_step() is False:
+                return RolloutReturn(0.0, num_collected_steps * env.num_envs, num_collected_episodes,
+                                     continue_training=False)
 
-                # Retrieve reward and episode length if using Monitor wrapper
-                self._update_info_buffer(infos, done)
+            self._current_episode_rewards += reward
+            self._current_episode_timesteps += 1
 
-                # Store data in replay buffer (normalized action and unnormalized observation)
-                self._store_transition(replay_buffer, buffer_action, new_obs, reward, done, infos)
+            # Retrieve reward and episode length if using Monitor wrapper
+            self._update_info_buffer(infos, dones)
 
-                self._update_current_progress_remaining(self.num_timesteps, self._total_timesteps)
+            # Store data in replay buffer (normalized action and unnormalized observation)
+            self._store_transition(replay_buffer, buffer_action, new_obs, reward, dones, infos)
 
-                # For DQN, check if the target network should be updated
-                # and update the exploration schedule
-                # For SAC/TD3, the update is done as the same time as the gradient update
-                # see https://github.com/hill-a/stable-baselines/issues/900
-                self._on_step()
+            self._update_current_progress_remaining(self.num_timesteps, self._total_timesteps)
 
-                if not should_collect_more_steps(train_freq, num_collected_steps, num_collected_episodes):
-                    break
+            # For DQN, check if the target network should be updated
+            # and update the exploration schedule
+            # For SAC/TD3, the update is done as the same time as the gradient update
+            # see https://github.com/hill-a/stable-baselines/issues/900
+            self._on_step()
 
-            if done:
-                num_collected_episodes += 1
-                self._episode_num += 1
-                episode_rewards.append(episode_reward)
-                total_timesteps.append(episode_timesteps)
+            for idx, done in enumerate(dones):
+                if done:
+                    num_collected_episodes += 1
+                    self._episode_num += 1
+                    episode_rewards.append(self._current_episode_rewards[idx])
+                    total_timesteps.append(self._current_episode_timesteps[idx])
+                    self._current_episode_rewards[idx] = 0.0
+                    self._current_episode_timesteps[idx] = 0
 
-                if action_noise is not None:
-                    action_noise.reset()
+                    if action_noise is not None:
+                        action_noise.reset()
 
-                # Log training infos
-                if log_interval is not None and self._episode_num % log_interval == 0:
-                    self._dump_logs()
+                    # Log training infos
+                    if log_interval is not None and self._episode_num % log_interval == 0:
+                        self._dump_logs()
 
         mean_reward = np.mean(episode_rewards) if num_collected_episodes > 0 else 0.0
 
         callback.on_rollout_end()
 
-        return RolloutReturn(mean_reward, num_collected_steps, num_collected_episodes, continue_training)
+        # Every step of the vectorized environment collects one transition per environment
+        return RolloutReturn(mean_reward, num_collected_steps * env.num_envs, num_collected_episodes, continue_training)
@@ -0,0 +1,380 @@
+from typing import List, Sequence
+
+import numpy as np
+import torch as th
+from torch import nn
+from stable_baselines3.common.utils import polyak_update
+
+from RLV.torch_rlv.algorithms.rlv.rlv import RLV
+from RLV.torch_rlv.algorithms.rlv.rlwithvideos import RlWithVideos
+from RLV.torch_rlv.algorithms.sac.softactorcritic import SaveOnBestTrainingRewardCallback
+from RLV.torch_rlv.models.population import (PopulationActor, PopulationCritic, PopulationInverseModel,
+                                             StackedParameter)
+from RLV.torch_rlv.utils.mixed_precision import MixedPrecision
+
+
+def _is_parameter_state(value, parameter: th.Tensor) -> bool:
+    # per element state like the Adam moments, the other entries (the step counter) are per parameter
+    return th.is_tensor(value) and value.shape == parameter.shape
+
+
+def stack_optimizer(member_optimizers: Sequence[th.optim.Optimizer],
+                    stacked_parameters: Sequence[StackedParameter]) -> th.optim.Optimizer:
+    """
+    Create the optimizer of stacked parameters, with the hyperparameters of the members' optimizers and their
+    state stacked like the parameters, so the population continues the optimization of every member.
+    :param member_optimizers: Optimizers of the members, over the ``member_parameters``
+    :param stacked_parameters: Parameters of the population module
+    :return: Optimizer over the stacked parameters
+    """
+    first = member_optimizers[0]
+    defaults = {key: value for key, value in first.param_groups[0].items() if key != 'params'}
+    optimizer = type(first)([stacked.parameter for stacked in stacked_parameters], **defaults)
+
+    for stacked in stacked_parameters:
+        states = [member_optimizer.state.get(member_parameter, {})
+                  for member_optimizer, member_parameter in zip(member_optimizers, stacked.member_parameters)]
+        if not any(states):
+            continue
+        assert all(states), "Either all or none of the members' optimizers have to have stepped"
+
+        state = {}
+        for key, value in states[0].items():
+            values = [member_state[key] for member_state in states]
+            if _is_parameter_state(value, stacked.member_parameters[0]):
+                state[key] = stacked.stack(values)
+            else:
+                assert all(member_value == value for member_value in values), \
+                    f"The members' optimizers differ in their '{key}', they can't be stacked"
+                state[key] = value.clone() if th.is_tensor(value) else value
+        optimizer.state[stacked.parameter] = state
+    return optimizer
+
+
+def copy_optimizer_to(optimizer: th.optim.Optimizer, member_optimizers: Sequence[th.optim.Optimizer],
+                      stacked_parameters: Sequence[StackedParameter]) -> None:
+    """
+    Copy the state and the learning rate of an optimizer created by ``stack_optimizer`` back into the members'
+    optimizers.
+    """
+    with th.no_grad():
+        for stacked in stacked_parameters:
+            state = optimizer.state.get(stacked.parameter)
+            if not state:
+                continue
+            for i, (member_optimizer, member_parameter) in enumerate(zip(member_optimizers,
+                                                                         stacked.member_parameters)):
+                member_state = member_optimizer.state[member_parameter]
+                for key, value in state.items():
+                    if not _is_parameter_state(value, stacked.parameter):
+                        member_state[key] = value.clone() if th.is_tensor(value) else value
+                    elif key in member_state:
+                        member_state[key].copy_(stacked.unstack(value, i))
+                    else:
+                        member_state[key] = stacked.unstack(value, i).clone()
+
+    for member_optimizer in member_optimizers:
+        for group in member_optimizer.param_groups:
+            group['lr'] = optimizer.param_groups[0]['lr']
+
+
+def _stack_ent_coefs(log_ent_coefs: Sequence[th.Tensor]) -> th.Tensor:
+    return th.stack(log_ent_coefs)[:, None]
+
+
+def _unstack_ent_coef(log_ent_coefs: th.Tensor, i: int) -> th.Tensor:
+    return log_ent_coefs[i, 0]
+
+
+class PopulationRLV:
+    """
+    Trains the RLV agents of several seeds together in one process. The actors, critics and inverse models
+    of the members are stacked into batched-weight networks, so one gradient step of the whole population
+    runs the kernels of a single agent on ``N`` times the data. Every member keeps its own environment,
+    replay buffer, encoder and logger, the action-free data is shared between the members.
+    The optimizers of the population start from the state of the members' optimizers, e.g. the warmed up
+    inverse model, and the stacked weights and optimizer states are copied back into the members after every
+    ``train`` call, so the rollouts, ``save`` and the logged metrics of every member stay those of a single seed.
+    With ``'fp16'`` mixed precision the members share one loss scale: an inf/NaN gradient of one member skips
+    the step of the whole population.
+    :param members: RLV agents with identical hyperparameters, created with the same ``shared_datasets``
+    """
+
+    def __init__(self, members: List[RLV]):
+        self.members = members
+        self.population_size = len(members)
+        first = members[0]
+        assert all(member.datasets is first.datasets for member in members), \
+            "The members of a population have to share their datasets"
+        assert all(member.action_relabeler is None for member in members), \
+            "Relabeling is not supported for a population, the relabeled actions would be shared"
+
+        self.device = first.device
+        self.env_name = first.env_name
+        self.half_batch_size = first.half_batch_size
+        self.gamma = first.gamma
+        self.tau = first.tau
+        self.target_update_interval = first.target_update_interval
+        self.target_entropy = first.target_entropy
+        self.action_free_replay_buffer = first.action_free_replay_buffer
+        self.amp = MixedPrecision(first.mixed_precision, self.device)
+
+        self.actor = PopulationActor([member.actor for member in members])
+        self.critic = PopulationCritic([member.critic for member in members])
+        self.critic_target = PopulationCritic([member.critic_target for member in members])
+        self.critic_target.requires_grad_(False)
+        self.inverse_model = PopulationInverseModel([member.inverse_model for member in members])
+
+        # (population optimizer, member optimizers, stacked parameters), to copy the optimizer states back
+        self._optimizers = []
+        self.actor_optimizer = self._stack_optimizer(
+            [member.actor.optimizer for member in members],
+            self.actor.stacked_parameters([member.actor for member in members]))
+        self.critic_optimizer = self._stack_optimizer(
+            [member.critic.optimizer for member in members],
+            self.critic.stacked_parameters([member.critic for member in members]))
+        self.inverse_model_optimizer = self._stack_optimizer(
+            [member.inverse_model.optimizer for member in members],
+            self.inverse_model.stacked_parameters([member.inverse_model for member in members]))
+
+        self.log_ent_coef, self.ent_coef_optimizer = None, None
+        if first.ent_coef_optimizer is not None:
+            member_log_ent_coefs = [member.log_ent_coef for member in members]
+            self.log_ent_coef = nn.Parameter(_stack_ent_coefs([coef.detach() for coef in member_log_ent_coefs]))
+            self.ent_coef_optimizer = self._stack_optimizer(
+                [member.ent_coef_optimizer for member in members],
+                [StackedParameter(self.log_ent_coef, member_log_ent_coefs, _stack_ent_coefs, _unstack_ent_coef)])
+        else:
+            self.ent_coef_tensor = th.stack([member.ent_coef_tensor for member in members]).reshape(-1, 1, 1)
+
+    def _stack_optimizer(self, member_optimizers, stacked_parameters):
+        optimizer = stack_optimizer(member_optimizers, stacked_parameters)
+        self._optimizers.append((optimizer, member_optimizers, stacked_parameters))
+        return optimizer
+
+    def _stack(self, tensors):
+        return th.stack(tensors).float()
+
+    def _sample_action_free(self):
+        """
+        :return: Per member observations, next observations, actions (only for the acrobot data), dones and
+            rewards of the action-free data, plus the images the visual pusher encoders are trained on
+        """
+        n, batch_size = self.population_size, self.half_batch_size
+        # one sampling call for the whole population from the shared dataset
+        if self.env_name == 'acrobot_continuous':
+            obs_data = self.action_free_replay_buffer.sample(batch_size=n * batch_size)
+            dones = obs_data.dones.reshape(n, batch_size, 1).float()
+            return (obs_data.observations.reshape(n, batch_size, -1).float(),
+                    obs_data.next_observations.reshape(n, batch_size, -1).float(),
+                    obs_data.actions.reshape(n, batch_size, -1).float(), dones,
+                    th.where(dones > 0, th.full_like(dones, 10.), th.full_like(dones, -1.)), None)
+
+        batch = self.action_free_replay_buffer.sample_indices(batch_size=n * batch_size).reshape(n, batch_size)
+        h_obs, h_obs_next, images, dones = [], [], [], []
+        for member, member_batch in zip(self.members, batch):
+            _, obs_img, _, _, next_obs_img, _, done = self.action_free_replay_buffer.get_samples(member_batch)
+            if member.embedding_cache is not None:
+                h_obs.append(member.embedding_cache.lookup(member_batch, member._encode_action_free_images))
+                h_obs_next.append(member.embedding_cache.lookup(member_batch + 1, member._encode_action_free_images))
+            else:
+                with th.no_grad(), self.amp.autocast():
+                    h_obs.append(member.encoder(obs_img.float()))
+                    h_obs_next.append(member.encoder(next_obs_img.float()))
+            images.append(obs_img)
+            dones.append(done.reshape(batch_size, 1))
+        dones = self._stack(dones)
+        return (self._stack(h_obs), self._stack(h_obs_next), None, dones,
+                th.where(dones > 0, th.full_like(dones, 100.), th.full_like(dones, 1.)), images)
+
+    def train(self, gradient_steps: int, batch_size: int = 64) -> None:
+        n = self.population_size
+        optimizers = [self.actor_optimizer, self.critic_optimizer]
+        if self.ent_coef_optimizer is not None:
+            optimizers += [self.ent_coef_optimizer]
+        for member in self.members:
+            member._update_learning_rate(optimizers)
+
+        # per member losses of every gradient step, shape (gradient_steps, N)
+        ent_coef_losses, ent_coefs, actor_losses, critic_losses, inverse_model_losses = [], [], [], [], []
+
+        for gradient_step in range(gradient_steps):
+            data_int = [member.replay_buffer.sample(self.half_batch_size, env=member._vec_normalize_env)
+                        for member in self.members]
+            obs_int = self._stack([data.observations for data in data_int])
+            next_obs_int = self._stack([data.next_observations for data in data_int])
+            action_int = self._stack([data.actions for data in data_int])
+            reward_int = self._stack([data.rewards for data in data_int])
+            done_int = self._stack([data.dones for data in data_int])
+
+            obs, next_obs, target_action_obs, done_obs, reward_obs, images = self._sample_action_free()
+
+            with self.amp.autocast():
+                predicted_obs_action = self.inverse_model(th.cat((obs, next_obs), dim=-1)).float()
+                if self.env_name != 'acrobot_continuous':
+                    predicted_int_action = self.inverse_model(th.cat((obs_int, next_obs_int), dim=-1)).float()
+            if self.env_name == 'acrobot_continuous':
+                inverse_model_loss = ((predicted_obs_action - target_action_obs) ** 2).mean(dim=(1, 2))
+            else:
+                inverse_model_loss = ((predicted_int_action - action_int) ** 2).mean(dim=(1, 2))
+
+            observations = th.cat((obs_int, obs), dim=1)
+            actions = th.cat((action_int, predicted_obs_action.detach()), dim=1)
+            next_observations = th.cat((next_obs_int, next_obs), dim=1)
+            dones = th.cat((done_int, done_obs), dim=1)
+            rewards = th.cat((reward_int, reward_obs), dim=1)
+
+            with self.amp.autocast():
+                actions_pi, log_prob = self.actor.action_log_prob(observations)
+            log_prob = log_prob.unsqueeze(-1)
+
+            if self.ent_coef_optimizer is not None:
+                ent_coef = th.exp(self.log_ent_coef.detach())
+                ent_coef_loss = -(self.log_ent_coef * (log_prob + self.target_entropy).detach()).mean(dim=(1, 2))
+                ent_coef_losses.append(ent_coef_loss.detach())
+                # the members' losses only depend on their own parameters, summing keeps their gradients apart
+                self.ent_coef_optimizer.zero_grad()
+                ent_coef_loss.sum().backward()
+                self.ent_coef_optimizer.step()
+            else:
+                ent_coef = self.ent_coef_tensor
+            ent_coefs.append(ent_coef.reshape(n))
+
+            with th.no_grad(), self.amp.autocast():
+                next_actions, next_log_prob = self.actor.action_log_prob(next_observations)
+                next_q_values = th.cat(self.critic_target(next_observations, next_actions), dim=-1)
+                next_q_values, _ = th.min(next_q_values.float(), dim=-1, keepdim=True)
+                next_q_values = next_q_values - ent_coef * next_log_prob.unsqueeze(-1)
+                target_q_values = rewards + (1 - dones) * self.gamma * next_q_values
+
+            with self.amp.autocast():
+                current_q_values = self.critic(observations, actions)
+            critic_loss = 0.5 * sum([((current_q.float() - target_q_values) ** 2).mean(dim=(1, 2))
+                                     for current_q in current_q_values])
+            critic_losses.append(critic_loss.detach())
+
+            self.critic_optimizer.zero_grad()
+            self.amp.backward(critic_loss.sum())
+            self.amp.step(self.critic_optimizer)
+
+            inverse_model_losses.append(inverse_model_loss.detach())
+            self.inverse_model_optimizer.zero_grad()
+            self.amp.backward(inverse_model_loss.sum())
+            self.amp.step(self.inverse_model_optimizer)
+
+            with self.amp.autocast():
+                q_values_pi = th.cat(self.critic(observations, actions_pi), dim=-1)
+            min_qf_pi, _ = th.min(q_values_pi.float(), dim=-1, keepdim=True)
+            actor_loss = (ent_coef * log_prob - min_qf_pi).mean(dim=(1, 2))
+            actor_losses.append(actor_loss.detach())
+
+            self.actor_optimizer.zero_grad()
+            self.amp.backward(actor_loss.sum())
+            self.amp.step(self.actor_optimizer)
+
+            if gradient_step % self.target_update_interval == 0:
+                polyak_update(self.critic.parameters(), self.critic_target.parameters(), self.tau)
+
+            # the encoders are convolutional and stay per member
+            if images is not None:
+                for i, member in enumerate(self.members):
+                    member.train_encoder(observation=obs_int[i], observation_img=images[i])
+                    member.amp.update()
+
+            self.amp.update()
+
+        self._copy_to_members()
+        self._log(gradient_steps, th.stack(ent_coef_losses).cpu().numpy() if ent_coef_losses else None,
+                  th.stack(ent_coefs).cpu().numpy(), th.stack(actor_losses).cpu().numpy(),
+                  th.stack(critic_losses).cpu().numpy(), th.stack(inverse_model_losses).cpu().numpy())
+
+    def _copy_to_members(self) -> None:
+        self.actor.copy_to([member.actor for member in self.members])
+        self.critic.copy_to([member.critic for member in self.members])
+        self.critic_target.copy_to([member.critic_target for member in self.members])
+        self.inverse_model.copy_to([member.inverse_model for member in self.members])
+        if self.log_ent_coef is not None:
+            with th.no_grad():
+                for i, member in enumerate(self.members):
+                    member.log_ent_coef.copy_(_unstack_ent_coef(self.log_ent_coef, i))
+        for optimizer, member_optimizers, stacked_parameters in self._optimizers:
+            copy_optimizer_to(optimizer, member_optimizers, stacked_parameters)
+
+    def _log(self, gradient_steps, ent_coef_losses, ent_coefs, actor_losses, critic_losses, inverse_model_losses):
+        # every member logs its own metrics, the seeds stay separable
+        for i, member in enumerate(self.members):
+            member._n_updates += gradient_steps
+            member.inverse_model_loss = th.tensor(inverse_model_losses[-1, i])
+            member.logger.record("train/n_updates", member._n_updates, exclude="tensorboard")
+            member.logger.record("train/ent_coef", np.mean(ent_coefs[:, i]))
+            member.logger.record("train/actor_loss", np.mean(actor_losses[:, i]))
+            member.logger.record("train/critic_loss", np.mean(critic_losses[:, i]))
+            member.logger.record("train/inverse_model_loss", inverse_model_losses[-1, i])
+            if ent_coef_losses is not None:
+                member.logger.record("train/ent_coef_loss", np.mean(ent_coef_losses[:, i]))
+            if member.domain_shift:
+                member.logger.record("train/encoder_loss", member.encoder_loss)
+
+            if member.wandb_log:
+                member.wandb_logging_parameters.update({
+                    'inverse_model_loss': inverse_model_losses[-1, i],
+                    'n_updates': member._n_updates,
+                    'ent_coef': np.mean(ent_coefs[:, i]),
+                    'actor_loss': np.mean(actor_losses[:, i]),
+                    'critic_loss': np.mean(critic_losses[:, i]),
+                })
+
+    def learn(self, total_timesteps: int, callbacks=None, log_interval: int = 4) -> "PopulationRLV":
+        callbacks = callbacks or [None] * self.population_size
+        callbacks = [member._setup_learn(total_timesteps, None, callback)[1]
+                     for member, callback in zip(self.members, callbacks)]
+        for member, callback in zip(self.members, callbacks):
+            callback.on_training_start(locals(), globals())
+
+        first = self.members[0]
+        while first.num_timesteps < total_timesteps:
+            # every member steps its own environment, the members stay in lockstep
+            rollouts = [member.collect_rollouts(member.env, train_freq=member.train_freq,
+                                                action_noise=member.action_noise, callback=callback,
+                                                learning_starts=member.learning_starts,
+                                                replay_buffer=member.replay_buffer, log_interval=log_interval)
+                        for member, callback in zip(self.members, callbacks)]
+
+            if any(rollout.continue_training is False for rollout in rollouts):
+                break
+
+            if first.num_timesteps > 0 and first.num_timesteps > first.learning_starts:
+                gradient_steps = first.gradient_steps if first.gradient_steps > 0 else rollouts[0].episode_timesteps
+                self.train(batch_size=first.batch_size, gradient_steps=gradient_steps)
+
+        for callback in callbacks:
+            callback.on_training_end()
+
+        return self
+
+
+class PopulationRlWithVideos:
+    """
+    Runs ``RlWithVideos`` for several seeds as one ``PopulationRLV``.
+    :param members: ``RlWithVideos`` of every seed, their models created with the same ``shared_datasets``
+    """
+
+    def __init__(self, members: List[RlWithVideos]):
+        self.members = members
+        self.total_steps = members[0].total_steps
+        self.population = None
+
+    def warmup(self):
+        for i, member in enumerate(self.members):
+            # the shared acrobot action-free buffer is only filled once
+            member.warmup(fill_action_free_buffer=i == 0)
+        # the warmups trained the members' networks, the population starts from their weights
+        self.population = PopulationRLV([member.model for member in self.members])
+
+    def run(self, total_timesteps=int(1000000)):
+        self.warmup()
+        callbacks = [SaveOnBestTrainingRewardCallback(check_freq=1000, log_dir=member.log_dir)
+                     for member in self.members]
+        self.population.learn(total_timesteps=total_timesteps, callbacks=callbacks, log_interval=4)
+        for i, member in enumerate(self.members):
+            member.model.save(f'/sac_models/trained_for_{self.total_steps}_seed_{i}')
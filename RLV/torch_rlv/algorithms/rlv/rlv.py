@@ -6,7 +6,7 @@ import pickle
 
 from pathlib import Path
 
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 from torch.nn import functional as F
 from torch import autograd
 from RLV.torch_rlv.models.inverse_model_network import InverseModelNetwork
@@ -21,6 +21,10 @@ from RLV.torch_rlv.models.convnet import ConvNet
 from RLV.torch_rlv.models.discriminator import DiscriminatorNetwork
 from RLV.torch_rlv.data.visual_pusher_data.adapter_visual_pusher import AdapterVisualPusher
 from RLV.torch_rlv.utils.action_free_buffer import ActionFreeReplayBuffer, SmallReplayBuffer
+from RLV.torch_rlv.utils.embedding_cache import EmbeddingCache
+from RLV.torch_rlv.utils.action_relabeler import ActionRelabeler
+from RLV.torch_rlv.utils.warmup_cache import WarmupCache
+from RLV.torch_rlv.utils.image_preprocessing import ImagePreprocessor
 from RLV.torch_rlv.utils.paired_buffer import PairedBuffer
 from RLV.torch_rlv.data.visual_pusher_data.adapter_paired_data import AdapterPairedData
 
@@ -31,14 +35,20 @@ class RLV(SAC):
                  tau=0.005, gamma=0.99, train_freq=1, gradient_steps=1, optimize_memory_usage=False, ent_coef='auto',
                  target_update_interval=10, target_entropy='auto', wandb_log=False, project_name='rlv',
                  domain_shift=True, device: Union[th.device, str] = "auto", _init_setup_model: bool = True,
-                 wandb_logging_parameters={}, wandb_config={}, verbose=1):
+                 wandb_logging_parameters={}, wandb_config={}, verbose=1, mixed_precision=None,
+                 embedding_cache_refresh_interval=None, embedding_cache_staleness_budget=None,
+                 action_relabel_interval=None, action_relabel_batch_size=4096, action_relabel_in_background=False,
+                 seed=None, warmup_cache_dir=None, warmup_cache_seed_policy='shared', shared_datasets=None,
+                 prefetch_batches=False, image_crop=None, image_resolution=None, image_channel_layout='reshape',
+                 image_cache_dir=None):
         super(RLV, self).__init__(
             env_name=env_name, total_steps=total_steps, policy=policy, env=env, learning_rate=learning_rate,
             buffer_size=buffer_size, learning_starts=learning_starts, batch_size=batch_size, tau=tau, gamma=gamma,
             train_freq=train_freq, gradient_steps=gradient_steps, optimize_memory_usage=optimize_memory_usage,
             ent_coef=ent_coef, target_update_interval=target_update_interval, wandb_config=wandb_config,
             target_entropy=target_entropy, wandb_log=wandb_log, device=device, _init_setup_model=_init_setup_model,
-            verbose=verbose)
+            verbose=verbose, mixed_precision=mixed_precision, seed=seed,
+            replay_buffer_kwargs={'prefetch': prefetch_batches})
 
         self.half_batch_size = batch_size
         self.target_update_interval = target_update_interval
@@ -54,9 +64,14 @@ class RLV(SAC):
                                                  output_dims=env.action_space.shape[-1], fc1_dims=64, fc2_dims=64,
                                                  fc3_dims=64).to(self.device)
 
+        # preprocessing of the dataset images at load time, the input shape of the encoder follows from it
+        self.image_preprocessor = ImagePreprocessor(crop=image_crop, resolution=image_resolution,
+                                                    channel_layout=image_channel_layout, cache_dir=image_cache_dir)
+
         self.domain_shift = domain_shift
         if self.domain_shift:
-            self.encoder = ConvNet(output_dims=self.env.observation_space.shape[-1]).to(self.device)
+            self.encoder = ConvNet(output_dims=self.env.observation_space.shape[-1],
+                                   input_shape=self.image_preprocessor.output_shape).to(self.device)
             self.discriminator = DiscriminatorNetwork(input_dims=self.env.observation_space.shape[-1],
                                                       beta=3e-8, fc1_dims=64, fc2_dims=64, fc3_dims=64).to(self.device)
             # Optimizers
@@ -67,25 +82,72 @@ class RLV(SAC):
             self.domain_shift_loss = nn.BCELoss()
             self.paired_loss = nn.MSELoss()
 
-            # data
-            simulation_data = AdapterVisualPusher()
-            paired_data = AdapterPairedData()
-            self.paired_buffer = PairedBuffer(observation=paired_data.observation.to(self.device),
-                                              observation_img=paired_data.observation_img.to(self.device),
-                                              observation_img_raw=paired_data.observation_img_raw.to(self.device))
-
-
-        self.action_free_replay_buffer = ReplayBuffer(buffer_size=buffer_size,
-                                                      observation_space=env.observation_space,
-                                                      action_space=env.action_space, device=self.device, n_envs=1,
-                                                      optimize_memory_usage=optimize_memory_usage,
-                                                      handle_timeout_termination=False) \
-            if self.env_name == 'acrobot_continuous' \
-            else ActionFreeReplayBuffer(observation=simulation_data.observation.to(self.device),
-                                        observation_img=simulation_data.observation_img.to(self.device),
-                                        observation_img_raw=simulation_data.observation_img_raw.to(self.device),
-                                        done=simulation_data.done.to(self.device))
-
+        # the static datasets are read-only, a population of agents can share one copy of them
+        self.datasets = shared_datasets if shared_datasets is not None \
+            else self.load_datasets(buffer_size=buffer_size, optimize_memory_usage=optimize_memory_usage)
+        self.action_free_replay_buffer = self.datasets['action_free_replay_buffer']
+        if self.env_name != 'acrobot_continuous':
+            self.inverse_model_warmup_buffer = self.datasets['inverse_model_warmup_buffer']
+            self.paired_buffer = self.datasets['paired_buffer']
+
+        # the action-free images are static, their encodings can be reused between encoder updates
+        self.embedding_cache = None
+        if self.domain_shift and embedding_cache_refresh_interval is not None:
+            self.embedding_cache = EmbeddingCache(n=len(self.action_free_replay_buffer.images),
+                                                  embedding_dim=self.env.observation_space.shape[-1],
+                                                  device=self.device,
+                                                  refresh_interval=embedding_cache_refresh_interval,
+                                                  staleness_budget=embedding_cache_staleness_budget)
+
+        # label the whole action-free dataset every few inverse model updates instead of every batch
+        self.action_relabeler = None
+        if action_relabel_interval is not None:
+            assert self.env_name != 'acrobot_continuous', \
+                "Relabeling is only supported for the static action-free dataset of the visual pusher"
+            self.action_relabeler = ActionRelabeler(buffer=self.action_free_replay_buffer,
+                                                    action_dim=self.env.action_space.shape[-1],
+                                                    label=self._label_action_free_data,
+                                                    device=self.device,
+                                                    relabel_interval=action_relabel_interval,
+                                                    batch_size=action_relabel_batch_size,
+                                                    background=action_relabel_in_background)
+
+        # every seed of a sweep repeats the same warmups on the same static data
+        self.warmup_cache = None
+        if warmup_cache_dir is not None:
+            self.warmup_cache = WarmupCache(cache_dir=warmup_cache_dir, seed_policy=warmup_cache_seed_policy)
+
+    def load_datasets(self, buffer_size=1000000, optimize_memory_usage=False):
+        """
+        :return: The action-free buffer and, for the visual pusher, the buffers of the inverse model warmup
+            and the paired data, by attribute name
+        """
+        if self.env_name == 'acrobot_continuous':
+            # filled by fill_action_free_buffer_acrobot
+            return {'action_free_replay_buffer': ReplayBuffer(buffer_size=buffer_size,
+                                                              observation_space=self.env.observation_space,
+                                                              action_space=self.env.action_space,
+                                                              device=self.device, n_envs=1,
+                                                              optimize_memory_usage=optimize_memory_usage,
+                                                              handle_timeout_termination=False)}
+
+        simulation_data = AdapterVisualPusher(preprocessor=self.image_preprocessor)
+        paired_data = AdapterPairedData(preprocessor=self.image_preprocessor)
+        return {
+            'action_free_replay_buffer': ActionFreeReplayBuffer(
+                observation=simulation_data.observation.to(self.device),
+                observation_img=simulation_data.observation_img.to(self.device),
+                observation_img_raw=simulation_data.observation_img_raw.to(self.device),
+                done=simulation_data.done.to(self.device)),
+            # the inverse model is warmed up on the states and actions of the simulation data
+            'inverse_model_warmup_buffer': SmallReplayBuffer(
+                observation=simulation_data.observation.to(self.device),
+                action=simulation_data.action.to(self.device),
+                next_observation=simulation_data.next_observation.to(self.device)),
+            'paired_buffer': PairedBuffer(observation=paired_data.observation.to(self.device),
+                                          observation_img=paired_data.observation_img.to(self.device),
+                                          observation_img_raw=paired_data.observation_img_raw.to(self.device)),
+        }
 
     def fill_action_free_buffer_acrobot(self, paper_data=False, num_steps=200000, replay_buffer=None):
         data = AcrobotAdapterPaper() if paper_data else AcrobotAdapter()
@@ -105,7 +167,49 @@ class RLV(SAC):
         reward = 10 if done_obs > 0 else -1
         return reward
 
+    def _warmup_cache_entry(self, name):
+        """
+        :param name: ``'inverse_model'`` or ``'encoder'``
+        :return: Key of the warmup cache entry and the modules and optimizers warmed up by the warmup ``name``
+        """
+        hyperparameters = {'warmup_steps': self.warmup_steps, 'batch_size': self.half_batch_size,
+                           'mixed_precision': self.amp.mode}
+        if name == 'inverse_model':
+            modules = {'inverse_model': self.inverse_model, 'inverse_model_optimizer': self.inverse_model.optimizer}
+            if self.env_name == 'acrobot_continuous':
+                buffer, size = self.action_free_replay_buffer, self.action_free_replay_buffer.size()
+                datasets = {'acrobot_action_free': [array[:size] for array in (
+                    buffer.observations, buffer.next_observations, buffer.actions) if array is not None]}
+            else:
+                buffer = self.inverse_model_warmup_buffer
+                datasets = {'visual_pusher_states': [buffer.observation, buffer.action, buffer.next_observation]}
+        else:
+            modules = {'encoder': self.encoder, 'discriminator': self.discriminator,
+                       'encoder_optimizer': self.encoder_optimizer,
+                       'discriminator_optimizer': self.discriminator_optimizer, 'grad_scaler': self.amp.scaler}
+            datasets = {'visual_pusher_images': [self.action_free_replay_buffer.observation,
+                                                 self.action_free_replay_buffer.images],
+                        'visual_pusher_paired': [self.paired_buffer.observation, self.paired_buffer.observation_img]}
+        return self.warmup_cache.key(name, datasets, modules, hyperparameters, seed=self.seed), modules
+
+    def _cached_warmup(self, name, warmup):
+        if self.warmup_cache is None:
+            return warmup()
+
+        key, modules = self._warmup_cache_entry(name)
+        if self.warmup_cache.load(key, modules, device=self.device):
+            print(f"Loaded warmed up {name} from {self.warmup_cache.path(key)}")
+            return
+        warmup()
+        self.warmup_cache.save(key, modules)
+
     def warmup_inverse_model(self):
+        self._cached_warmup('inverse_model', self._warmup_inverse_model)
+
+    def warmup_encoder(self):
+        self._cached_warmup('encoder', self._warmup_encoder)
+
+    def _warmup_inverse_model(self):
         if self.env_name == 'acrobot_continuous':
             for step in range(0, self.warmup_steps):
                 obs_data = self.action_free_replay_buffer.sample(batch_size=self.half_batch_size)
@@ -126,11 +230,7 @@ class RLV(SAC):
                 if step % 100 == 0:
                     print(f"Steps {step}, Loss: {self.inverse_model_loss.item()}")
         else:
-            simulation_data = AdapterVisualPusher()
-            actions = simulation_data.action.to(self.device)
-            observations = simulation_data.observation.to(self.device)
-            next_observations = simulation_data.next_observation.to(self.device)
-            buffer = SmallReplayBuffer(observation=observations, action=actions, next_observation=next_observations)
+            buffer = self.inverse_model_warmup_buffer
 
             for step in range(self.warmup_steps):
                 obs, target_action, next_obs = buffer.sample(self.half_batch_size)
@@ -149,11 +249,12 @@ class RLV(SAC):
                 if step % 100 == 0:
                     print(f"Steps {step}, Loss: {self.inverse_model_loss.item()}")
 
-    def warmup_encoder(self):
+    def _warmup_encoder(self):
         for step in range(0, self.warmup_steps):
             observation, _, _, _, _, _, _ = self.action_free_replay_buffer.sample()
             _, state_obs_img, _, _, _, _, _ = self.action_free_replay_buffer.sample()
             self.train_encoder(observation=observation, observation_img=state_obs_img)
+            self.amp.update()
 
             if step % 300 == 0:
                 print(f"Warmup Step {step} / {self.warmup_steps} Loss {self.encoder_loss}")
@@ -164,38 +265,56 @@ class RLV(SAC):
         input_image, real_state, true_labels = observation_img, observation, \
                                                th.ones((self.half_batch_size,1), device=self.device)
 
-        fake_state = self.encoder(input_image.float())
-
         # add paired data // obs = filtered, int = raw
         paired_obs, paired_img_obs, _ = self.paired_buffer.sample()
-        paired_loss = self.paired_loss(paired_obs.float(), self.encoder(paired_img_obs.float()))
+
+        # BCE is not autocast safe, only the forward passes run in reduced precision
+        with self.amp.autocast():
+            fake_state = self.encoder(input_image.float())
+            paired_state = self.encoder(paired_img_obs.float())
+            true_discriminator_out = self.discriminator(real_state.float())
+            fake_discriminator_out = self.discriminator(fake_state)
+
+        paired_loss = self.paired_loss(paired_obs.float(), paired_state.float())
 
         # Train the discriminator on the true/generated data
         self.discriminator_optimizer.zero_grad()
-        true_discriminator_out = self.discriminator(real_state.float())
         true_discriminator_loss = self.domain_shift_loss(true_discriminator_out.float(), true_labels.float())
 
-        fake_discriminator_out = self.discriminator(fake_state)
-        fake_discriminator_loss = self.domain_shift_loss(fake_discriminator_out,
+        fake_discriminator_loss = self.domain_shift_loss(fake_discriminator_out.float(),
                                                          th.zeros((self.half_batch_size, 1), device=self.device))
 
         # Optimize Discriminator Loss
         discriminator_loss = ((true_discriminator_loss + fake_discriminator_loss) / 2 + paired_loss) * 0.001
 
         # 0.001
-        discriminator_loss.backward(retain_graph=True)
-        self.discriminator_optimizer.step()
+        self.amp.backward(discriminator_loss, retain_graph=True)
+        self.amp.step(self.discriminator_optimizer)
 
-        output = self.discriminator(fake_state)
+        with self.amp.autocast():
+            output = self.discriminator(fake_state)
 
         # Train the generator
         self.encoder_optimizer.zero_grad()
-        generator_loss = self.domain_shift_loss(output, true_labels)
-        generator_loss.backward()
-        self.encoder_optimizer.step()
+        generator_loss = self.domain_shift_loss(output.float(), true_labels)
+        self.amp.backward(generator_loss)
+        self.amp.step(self.encoder_optimizer)
+
+        if self.embedding_cache is not None:
+            self.embedding_cache.step()
 
         self.encoder_loss = generator_loss
 
+    def _encode_action_free_images(self, indices):
+        with self.amp.autocast():
+            return self.encoder(self.action_free_replay_buffer.images[indices].float())
+
+    def _label_action_free_data(self, models, indices):
+        encoder, inverse_model = models
+        images = self.action_free_replay_buffer.images
+        with self.amp.autocast():
+            h_obs, h_obs_next = encoder(images[indices].float()), encoder(images[indices + 1].float())
+            return inverse_model(th.cat((h_obs, h_obs_next), dim=1))
 
     def train(self, gradient_steps: int, batch_size: int = 64) -> None:
         # Update optimizers learning rate
@@ -223,7 +342,9 @@ class RLV(SAC):
 
                 # get predicted action from inverse model
                 input_inverse_model = th.cat((state_obs.detach(), next_state_obs.detach()), dim=1)
-                action_obs = self.inverse_model(input_inverse_model)
+                with self.amp.autocast():
+                    action_obs = self.inverse_model(input_inverse_model)
+                action_obs = action_obs.float()
 
                 # Compute inverse model loss
                 self.inverse_model_loss = self.inverse_model.criterion(action_obs, target_action)
@@ -245,8 +366,12 @@ class RLV(SAC):
 
 
             else:
+                if self.action_relabeler is not None:
+                    self.action_relabeler.maybe_relabel((self.encoder, self.inverse_model))
+
+                batch = self.action_free_replay_buffer.sample_indices(batch_size=self.half_batch_size)
                 state_obs, state_obs_img, state_obs_img_raw, next_state_obs, next_state_obs_img, \
-                next_state_obs_img_raw, done_obs = self.action_free_replay_buffer.sample(batch_size=self.half_batch_size)
+                next_state_obs_img_raw, done_obs = self.action_free_replay_buffer.get_samples(batch)
 
                 obs_int, action_int, next_obs_int, reward_int, done_int = data_int.observations, data_int.actions, \
                                                                           data_int.next_observations, data_int.rewards, \
@@ -255,7 +380,13 @@ class RLV(SAC):
 
                 # Get domain invariant encodings
                 h_int, h_int_next = obs_int, next_obs_int
-                h_obs, h_obs_next = self.encoder(state_obs_img.float()), self.encoder(next_state_obs_img.float())
+                if self.embedding_cache is not None:
+                    h_obs = self.embedding_cache.lookup(batch, self._encode_action_free_images)
+                    h_obs_next = self.embedding_cache.lookup(batch + 1, self._encode_action_free_images)
+                else:
+                    with self.amp.autocast():
+                        h_obs, h_obs_next = self.encoder(state_obs_img.float()), self.encoder(next_state_obs_img.float())
+                    h_obs, h_obs_next = h_obs.float(), h_obs_next.float()
 
 
                 #Inverse Model
@@ -264,8 +395,13 @@ class RLV(SAC):
                 obs_input_inverse_model = th.cat((h_obs, h_obs_next), dim=1)
 
                 #outputs
-                predicted_int_action = self.inverse_model(int_input_inverse_model.detach())
-                predicted_obs_action = self.inverse_model(obs_input_inverse_model.detach())
+                with self.amp.autocast():
+                    predicted_int_action = self.inverse_model(int_input_inverse_model.detach())
+                    if self.action_relabeler is None:
+                        predicted_obs_action = self.inverse_model(obs_input_inverse_model.detach())
+                if self.action_relabeler is not None:
+                    predicted_obs_action = self.action_free_replay_buffer.get_inferred_actions(batch)
+                predicted_int_action, predicted_obs_action = predicted_int_action.float(), predicted_obs_action.float()
 
 
                 self.inverse_model_loss = self.inverse_model.criterion(predicted_int_action, action_int)
@@ -288,7 +424,8 @@ class RLV(SAC):
                 self.actor.reset_noise()
 
             # Action by the current actor for the sampled state
-            actions_pi, log_prob = self.actor.action_log_prob(replay_data.observations)
+            with self.amp.autocast():
+                actions_pi, log_prob = self.actor.action_log_prob(replay_data.observations)
             log_prob = log_prob.reshape(-1, 1)
 
             ent_coef_loss = None
@@ -307,45 +444,49 @@ class RLV(SAC):
                 ent_coef_loss.backward()
                 self.ent_coef_optimizer.step()
 
-            with th.no_grad():
+            with th.no_grad(), self.amp.autocast():
                 # Select action according to policy
                 next_actions, next_log_prob = self.actor.action_log_prob(replay_data.next_observations)
                 # Compute the next Q values: min over all critics targets
                 next_q_values = th.cat(self.critic_target(replay_data.next_observations, next_actions), dim=1)
-                next_q_values, _ = th.min(next_q_values, dim=1, keepdim=True)
+                next_q_values, _ = th.min(next_q_values.float(), dim=1, keepdim=True)
                 # add entropy term
                 next_q_values = next_q_values - ent_coef * next_log_prob.reshape(-1, 1)
                 # td error + entropy term
                 target_q_values = replay_data.rewards + (1 - replay_data.dones) * self.gamma * next_q_values
 
             # Get current Q-values estimates for each critic network - using action from the replay buffer
-            current_q_values = self.critic(replay_data.observations, replay_data.actions)
+            with self.amp.autocast():
+                current_q_values = self.critic(replay_data.observations, replay_data.actions)
 
             # Compute critic loss
-            critic_loss = 0.5 * sum([F.mse_loss(current_q, target_q_values) for current_q in current_q_values])
+            critic_loss = 0.5 * sum([F.mse_loss(current_q.float(), target_q_values) for current_q in current_q_values])
             critic_losses.append(critic_loss.item())
 
             # Optimize Critic
             self.critic.optimizer.zero_grad()
-            critic_loss.backward()
-            self.critic.optimizer.step()
+            self.amp.backward(critic_loss)
+            self.amp.step(self.critic.optimizer)
 
             # Optimize Inverse Model
             # optimize inverse model
             self.inverse_model.optimizer.zero_grad()
-            self.inverse_model_loss.backward()
-            self.inverse_model.optimizer.step()
+            self.amp.backward(self.inverse_model_loss)
+            self.amp.step(self.inverse_model.optimizer)
+            if self.action_relabeler is not None:
+                self.action_relabeler.step()
 
             # Compute actor loss
-            q_values_pi = th.cat(self.critic.forward(replay_data.observations, actions_pi), dim=1)
-            min_qf_pi, _ = th.min(q_values_pi, dim=1, keepdim=True)
+            with self.amp.autocast():
+                q_values_pi = th.cat(self.critic.forward(replay_data.observations, actions_pi), dim=1)
+            min_qf_pi, _ = th.min(q_values_pi.float(), dim=1, keepdim=True)
             actor_loss = (ent_coef * log_prob - min_qf_pi).mean()
             actor_losses.append(actor_loss.item())
 
             # Optimize Actor
             self.actor.optimizer.zero_grad()
-            actor_loss.backward()
-            self.actor.optimizer.step()
+            self.amp.backward(actor_loss)
+            self.amp.step(self.actor.optimizer)
 
             # Update target networks
             if gradient_step % self.target_update_interval == 0:
@@ -354,6 +495,8 @@ class RLV(SAC):
             if not self.env_name == 'acrobot_continuous':
                 self.train_encoder(observation=h_int, observation_img=state_obs_img)
 
+            self.amp.update()
+
         self._n_updates += gradient_steps
 
         # logging
@@ -383,7 +526,25 @@ class RLV(SAC):
         if self.domain_shift:
             self.logger.record("train/encoder_loss", self.encoder_loss)
 
+        if self.embedding_cache is not None:
+            cache_diagnostics = self.embedding_cache.get_diagnostics()
+            for key, value in cache_diagnostics.items():
+                self.logger.record(f"train/{key}", value)
+            if self.wandb_log:
+                self.wandb_logging_parameters.update(cache_diagnostics)
+
+        if self.action_relabeler is not None:
+            relabel_diagnostics = self.action_relabeler.get_diagnostics()
+            for key, value in relabel_diagnostics.items():
+                self.logger.record(f"train/{key}", value)
+            if self.wandb_log:
+                self.wandb_logging_parameters.update(relabel_diagnostics)
+
         if len(ent_coef_losses) > 0:
             self.logger.record("train/ent_coef_loss", np.mean(ent_coef_losses))
             if self.wandb_log:
                 self.wandb_logging_parameters.update({"train/ent_coef_loss":np.mean(ent_coef_losses)})
+
+    def _excluded_save_params(self) -> List[str]:
+        return super(RLV, self)._excluded_save_params() + ["embedding_cache", "action_relabeler", "warmup_cache",
+                                                             "inverse_model_warmup_buffer", "datasets"]
@@ -22,7 +22,11 @@ class RlWithVideos(SoftActorCritic):
                  target_update_interval=1, target_entropy='auto', use_sde=False, sde_sample_freq=- 1,
                  use_sde_at_warmup=False, tensorboard_log=None, create_eval_env=False, policy_kwargs=None, verbose=1,
                  seed=None, device='auto', _init_setup_model=True, project_name='sac_experiment', run_name='test_sac',
-                 acrobot_paper_data=False, log_dir='../output/tmp/gym/', total_steps=1000, algo_name='rlv'):
+                 acrobot_paper_data=False, log_dir='../output/tmp/gym/', total_steps=1000, algo_name='rlv',
+                 mixed_precision=None, embedding_cache_refresh_interval=None, embedding_cache_staleness_budget=None,
+                 action_relabel_interval=None, action_relabel_batch_size=4096, action_relabel_in_background=False,
+                 warmup_cache_dir=None, warmup_cache_seed_policy='shared', shared_datasets=None, prefetch_batches=False,
+                 image_crop=None, image_resolution=None, image_channel_layout='reshape', image_cache_dir=None):
 
         super().__init__(policy=policy, env_name=env_name, env=env, learning_rate=learning_rate, buffer_size=buffer_size,
                          learning_starts=learning_starts, batch_size=batch_size, tau=tau, gamma=gamma,
@@ -48,16 +52,30 @@ class RlWithVideos(SoftActorCritic):
                          train_freq=train_freq, gradient_steps=gradient_steps, optimize_memory_usage=optimize_memory_usage,
                          ent_coef=ent_coef, target_update_interval=target_update_interval, target_entropy=target_entropy,
                          domain_shift=domain_shift, device=device, _init_setup_model=_init_setup_model, wandb_log=wandb_log,
-                         wandb_config={'project_name': project_name, 'run_name': run_name, 'algo_name': self.algo_name})
+                         wandb_config={'project_name': project_name, 'run_name': run_name, 'algo_name': self.algo_name},
+                         mixed_precision=mixed_precision,
+                         embedding_cache_refresh_interval=embedding_cache_refresh_interval,
+                         embedding_cache_staleness_budget=embedding_cache_staleness_budget,
+                         action_relabel_interval=action_relabel_interval,
+                         action_relabel_batch_size=action_relabel_batch_size,
+                         action_relabel_in_background=action_relabel_in_background,
+                         seed=seed, warmup_cache_dir=warmup_cache_dir,
+                         warmup_cache_seed_policy=warmup_cache_seed_policy, shared_datasets=shared_datasets,
+                         prefetch_batches=prefetch_batches, image_crop=image_crop, image_resolution=image_resolution,
+                         image_channel_layout=image_channel_layout, image_cache_dir=image_cache_dir)
 
-    def run(self, total_timesteps=int(1000000), plot=False):
+    def warmup(self, fill_action_free_buffer=True):
         if self.env_name == "acrobot_continuous":
-            self.model.fill_action_free_buffer_acrobot(paper_data=self.acrobot_paper_data)
+            if fill_action_free_buffer:
+                self.model.fill_action_free_buffer_acrobot(paper_data=self.acrobot_paper_data)
             self.model.warmup_inverse_model()
         else:
             self.model.warmup_encoder()
             self.model.warmup_inverse_model()
 
+    def run(self, total_timesteps=int(1000000), plot=False):
+        self.warmup()
+
         callback = SaveOnBestTrainingRewardCallback(check_freq=1000, log_dir=self.log_dir)
         self.model.learn(total_timesteps=total_timesteps, callback=callback, log_interval=4)
         self.model.save(f'/sac_models/trained_for_{self.total_steps}')
@@ -11,6 +11,7 @@ from RLV.torch_rlv.algorithms.base.offpolicyalgorithm import OffPolicyAlgorithm
 from RLV.torch_rlv.utils.type_aliases import GymEnv, MaybeCallback, Schedule
 from stable_baselines3.common.utils import polyak_update
 from RLV.torch_rlv.policies.sac_policy import SACPolicy
+from RLV.torch_rlv.utils.mixed_precision import MixedPrecision
 
 
 class SAC(OffPolicyAlgorithm):
@@ -68,6 +69,8 @@ class SAC(OffPolicyAlgorithm):
     :param device: Device (cpu, cuda, ...) on which the code should be run.
         Setting it to auto, the code will be run on the GPU if possible.
     :param _init_setup_model: Whether or not to build the network at the creation of the instance
+    :param mixed_precision: Run the network updates under autocast, ``None`` for fp32,
+        ``'fp16'`` (CUDA) or ``'bf16'`` (CUDA or CPU). The log prob and the entropy coefficient are always kept in fp32.
     """
 
     def __init__(
@@ -80,7 +83,8 @@ class SAC(OffPolicyAlgorithm):
         use_sde: bool = False, sde_sample_freq: int = -1, use_sde_at_warmup: bool = False,
         tensorboard_log: Optional[str] = None, create_eval_env: bool = False, policy_kwargs: Dict[str, Any] = None,
         verbose: int = 0, seed: Optional[int] = None, device: Union[th.device, str] = "auto",
-        _init_setup_model: bool = True, wandb_log = False, wandb_config = {}):
+        _init_setup_model: bool = True, wandb_log = False, wandb_config = {},
+        mixed_precision: Optional[str] = None):
         super(SAC, self).__init__(
             policy=policy, env=env, env_name=env_name, total_steps=total_steps, learning_rate=learning_rate,
             buffer_size=buffer_size, learning_starts=learning_starts, policy_base=SACPolicy, batch_size=batch_size,
@@ -89,7 +93,7 @@ class SAC(OffPolicyAlgorithm):
             replay_buffer_kwargs=replay_buffer_kwargs, policy_kwargs=policy_kwargs, tensorboard_log=tensorboard_log,
             verbose=verbose, device=device, create_eval_env=create_eval_env, seed=seed, use_sde=use_sde,
             sde_sample_freq=sde_sample_freq, use_sde_at_warmup=use_sde_at_warmup, optimize_memory_usage=optimize_memory_usage,
-            supported_action_spaces=(gym.spaces.Box))
+            support_multi_env=True, supported_action_spaces=(gym.spaces.Box))
 
         self.target_entropy = target_entropy
         self.log_ent_coef = None  # type: Optional[th.Tensor]
@@ -98,6 +102,7 @@ class SAC(OffPolicyAlgorithm):
         self.ent_coef = ent_coef
         self.target_update_interval = target_update_interval
         self.ent_coef_optimizer = None
+        self.mixed_precision = mixed_precision
 
         if _init_setup_model:
             self._setup_model()
@@ -105,6 +110,7 @@ class SAC(OffPolicyAlgorithm):
     def _setup_model(self) -> None:
         super(SAC, self)._setup_model()
         self._create_aliases()
+        self.amp = MixedPrecision(self.mixed_precision, self.device)
         # Target entropy is used when learning the entropy coefficient
         if self.target_entropy == "auto":
             # automatically set target entropy if needed
@@ -156,7 +162,8 @@ class SAC(OffPolicyAlgorithm):
                 self.actor.reset_noise()
 
             # Action by the current actor for the sampled state
-            actions_pi, log_prob = self.actor.action_log_prob(replay_data.observations)
+            with self.amp.autocast():
+                actions_pi, log_prob = self.actor.action_log_prob(replay_data.observations)
             log_prob = log_prob.reshape(-1, 1)
 
             ent_coef_loss = None
@@ -175,39 +182,42 @@ class SAC(OffPolicyAlgorithm):
                 ent_coef_loss.backward()
                 self.ent_coef_optimizer.step()
 
-            with th.no_grad():
+            with th.no_grad(), self.amp.autocast():
                 # Select action according to policy
                 next_actions, next_log_prob = self.actor.action_log_prob(replay_data.next_observations)
                 # Compute the next Q values: min over all critics targets
                 next_q_values = th.cat(self.critic_target(replay_data.next_observations, next_actions), dim=1)
-                next_q_values, _ = th.min(next_q_values, dim=1, keepdim=True)
+                next_q_values, _ = th.min(next_q_values.float(), dim=1, keepdim=True)
                 # add entropy term
                 next_q_values = next_q_values - ent_coef * next_log_prob.reshape(-1, 1)
                 # td error + entropy term
                 target_q_values = replay_data.rewards + (1 - replay_data.dones) * self.gamma * next_q_values
 
             # Get current Q-values estimates for each critic network - using action from the replay buffer
-            current_q_values = self.critic(replay_data.observations, replay_data.actions)
+            with self.amp.autocast():
+                current_q_values = self.critic(replay_data.observations, replay_data.actions)
 
             # Compute critic loss
-            critic_loss = 0.5 * sum([F.mse_loss(current_q, target_q_values) for current_q in current_q_values])
+            critic_loss = 0.5 * sum([F.mse_loss(current_q.float(), target_q_values) for current_q in current_q_values])
             critic_losses.append(critic_loss.item())
 
             # Optimize the critic
             self.critic.optimizer.zero_grad()
-            critic_loss.backward()
-            self.critic.optimizer.step()
+            self.amp.backward(critic_loss)
+            self.amp.step(self.critic.optimizer)
 
             # Compute actor loss
-            q_values_pi = th.cat(self.critic.forward(replay_data.observations, actions_pi), dim=1)
-            min_qf_pi, _ = th.min(q_values_pi, dim=1, keepdim=True)
+            with self.amp.autocast():
+                q_values_pi = th.cat(self.critic.forward(replay_data.observations, actions_pi), dim=1)
+            min_qf_pi, _ = th.min(q_values_pi.float(), dim=1, keepdim=True)
             actor_loss = (ent_coef * log_prob - min_qf_pi).mean()
             actor_losses.append(actor_loss.item())
 
             # Optimize the actor
             self.actor.optimizer.zero_grad()
-            actor_loss.backward()
-            self.actor.optimizer.step()
+            self.amp.backward(actor_loss)
+            self.amp.step(self.actor.optimizer)
+            self.amp.update()
 
             # Update target networks
             if gradient_step % self.target_update_interval == 0:
@@ -258,7 +268,7 @@ class SAC(OffPolicyAlgorithm):
         )
 
     def _excluded_save_params(self) -> List[str]:
-        return super(SAC, self)._excluded_save_params() + ["actor", "critic", "critic_target"]
+        return super(SAC, self)._excluded_save_params() + ["actor", "critic", "critic_target", "amp"]
 
     def _get_torch_save_params(self) -> Tuple[List[str], List[str]]:
         state_dicts = ["policy", "actor.optimizer", "critic.optimizer"]
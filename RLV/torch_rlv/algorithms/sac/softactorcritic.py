@@ -8,6 +8,7 @@ from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.results_plotter import load_results, ts2xy
 from stable_baselines3.common.noise import NormalActionNoise
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
 from datetime import datetime
 
 
@@ -17,14 +18,16 @@ class SoftActorCritic:
                  ent_coef='auto', target_update_interval=1, target_entropy='auto', use_sde=False, sde_sample_freq=- 1,
                  use_sde_at_warmup=False, tensorboard_log=None, create_eval_env=False, policy_kwargs=None, verbose=0,
                  seed=None, device='auto', _init_setup_model=True, project_name='sac_experiment', run_name='test_sac',
-                 log_dir='../output/tmp/gym/', total_steps=250000, wandb_log=False, algo_name='sac'):
+                 log_dir='../output/tmp/gym/', total_steps=250000, wandb_log=False, algo_name='sac',
+                 mixed_precision=None, prefetch_batches=False):
 
         self.log_dir = log_dir
         os.makedirs(self.log_dir, exist_ok=True)
 
         self.env = env
         self.env_name = env_name
-        self.env = Monitor(env, self.log_dir)
+        # the environments of a VecEnv are already wrapped in a Monitor each
+        self.env = env if isinstance(env, VecEnv) else Monitor(env, self.log_dir)
         self.algo_name = algo_name
 
         self.total_steps = total_steps
@@ -40,7 +43,8 @@ class SoftActorCritic:
                          tensorboard_log=tensorboard_log, create_eval_env=create_eval_env,
                          verbose=verbose, seed=seed, device=device, _init_setup_model=_init_setup_model,
                          wandb_log=wandb_log, wandb_config = {'project_name': project_name, 'run_name': run_name,
-                                                              'algo_name': self.algo_name})
+                                                              'algo_name': self.algo_name},
+                         mixed_precision=mixed_precision, replay_buffer_kwargs={'prefetch': prefetch_batches})
 
     def run(self, plot=False, make_dataset=False):
         callback = SaveOnBestTrainingRewardCallback(check_freq=1000, log_dir=self.log_dir)
@@ -1,6 +1,9 @@
+import os
+
 from RLV.torch_rlv.algorithms.sac.softactorcritic import SoftActorCritic
 from RLV.torch_rlv.algorithms.rlv.rlv import RLV
 from RLV.torch_rlv.algorithms.rlv.rlwithvideos import RlWithVideos
+from RLV.torch_rlv.algorithms.rlv.population import PopulationRlWithVideos
 
 def init_algorithm(alg_name, experiment):
     if alg_name == "sac":
@@ -11,15 +14,49 @@ def init_algorithm(alg_name, experiment):
                                gamma=experiment.gamma, tau=experiment.tau, train_freq=experiment.train_freq,
                                gradient_steps=experiment.gradient_steps, project_name=experiment.project_name,
                                run_name=experiment.run_name, log_dir=experiment.log_dir,
-                               total_steps=experiment.total_steps, algo_name=experiment.algo_name)
+                               total_steps=experiment.total_steps, algo_name=experiment.algo_name,
+                               mixed_precision=experiment.mixed_precision,
+                               prefetch_batches=experiment.prefetch_batches)
     if alg_name == "rlv":
-        return RlWithVideos(env_name=experiment.env_name, policy=experiment.policy, wandb_log=experiment.wandb_log,
-                            learning_rate_inverse_model=experiment.lr_inverse_model, env=experiment.env,
-                            learning_rate=experiment.lr_sac, buffer_size=experiment.buffer_size,
-                            learning_starts=experiment.learning_starts, batch_size=experiment.batch_size,
-                            gamma=experiment.gamma, tau=experiment.tau, train_freq=experiment.train_freq,
-                            gradient_steps=experiment.gradient_steps, project_name=experiment.project_name,
-                            run_name=experiment.run_name, acrobot_paper_data=experiment.acrobot_paper_data, verbose=1,
-                            log_dir=experiment.log_dir,  total_steps=experiment.total_steps,
-                            algo_name=experiment.algo_name, device=experiment.device)
+        if experiment.population_size > 1:
+            return init_population(experiment)
+        return init_rlv(experiment, env=experiment.env, seed=experiment.seed, log_dir=experiment.log_dir)
+
+
+def init_rlv(experiment, env, seed, log_dir, shared_datasets=None):
+    return RlWithVideos(env_name=experiment.env_name, policy=experiment.policy, wandb_log=experiment.wandb_log,
+                        learning_rate_inverse_model=experiment.lr_inverse_model, env=env,
+                        learning_rate=experiment.lr_sac, buffer_size=experiment.buffer_size,
+                        learning_starts=experiment.learning_starts, batch_size=experiment.batch_size,
+                        gamma=experiment.gamma, tau=experiment.tau, train_freq=experiment.train_freq,
+                        gradient_steps=experiment.gradient_steps, project_name=experiment.project_name,
+                        run_name=experiment.run_name, acrobot_paper_data=experiment.acrobot_paper_data, verbose=1,
+                        log_dir=log_dir,  total_steps=experiment.total_steps,
+                        algo_name=experiment.algo_name, device=experiment.device,
+                        mixed_precision=experiment.mixed_precision,
+                        embedding_cache_refresh_interval=experiment.embedding_cache_refresh_interval,
+                        embedding_cache_staleness_budget=experiment.embedding_cache_staleness_budget,
+                        action_relabel_interval=experiment.action_relabel_interval,
+                        action_relabel_batch_size=experiment.action_relabel_batch_size,
+                        action_relabel_in_background=experiment.action_relabel_in_background,
+                        seed=seed, warmup_cache_dir=experiment.warmup_cache_dir,
+                        warmup_cache_seed_policy=experiment.warmup_cache_seed_policy,
+                        shared_datasets=shared_datasets, prefetch_batches=experiment.prefetch_batches,
+                        image_crop=experiment.image_crop, image_resolution=experiment.image_resolution,
+                        image_channel_layout=experiment.image_channel_layout,
+                        image_cache_dir=experiment.image_cache_dir)
+
 
+def init_population(experiment):
+    """
+    One RLV agent per seed, with its own environment and log directory, trained together as a population.
+    The members share the static datasets loaded by the first member.
+    """
+    members = []
+    for i in range(experiment.population_size):
+        log_dir = os.path.join(experiment.log_dir, f'seed_{i}')
+        env = experiment.make_env(log_dir=log_dir)
+        seed = experiment.seed + i if experiment.seed is not None else None
+        shared_datasets = members[0].model.datasets if members else None
+        members.append(init_rlv(experiment, env=env, seed=seed, log_dir=log_dir, shared_datasets=shared_datasets))
+    return PopulationRlWithVideos(members)
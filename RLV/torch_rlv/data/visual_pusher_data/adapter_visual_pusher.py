@@ -4,6 +4,8 @@ import os
 import torch as T
 import numpy as np
 from PIL import Image
+from RLV.torch_rlv.utils.dataset_writer import load_dataset
+from RLV.torch_rlv.utils.image_preprocessing import ImagePreprocessor
 import cv2
 
 import matplotlib.pyplot as plt
@@ -11,12 +13,20 @@ import matplotlib.image as mpimg
 
 
 class AdapterVisualPusher:
-    def __init__(self):
+    def __init__(self, preprocessor=None):
+        """
+        :param preprocessor: ``ImagePreprocessor`` of the images, ``None`` keeps the stored 3x120x120 images
+        """
+        preprocessor = preprocessor or ImagePreprocessor()
         current_directory = os.path.dirname(__file__)
-        path = os.path.join(current_directory, '500000_SAC_steps_80000_samples.pickle')
-
-        # get data
-        data = pickle.load(open(path, 'rb'))
+        path = os.path.join(current_directory, '500000_SAC_steps_80000_samples')
+
+        # get data, datasets streamed to disk by the DatasetCreator are memory mapped
+        source = path if os.path.isdir(path) else path + '.pickle'
+        if os.path.isdir(path):
+            data = load_dataset(path)
+        else:
+            data = pickle.load(open(source, 'rb'))
         observation = data['observation']
         observation_img = data['observation_img']
         observation_img_raw = data['observation_img_raw']
@@ -25,14 +35,14 @@ class AdapterVisualPusher:
         reward = data['reward']
         done = data['done']
 
-        # convert to numpy array
-        observation = np.array(observation)
-        observation_img = np.array(observation_img)
-        observation_img_raw = np.array(observation_img_raw)
-        action = np.array(action)
-        next_observation = np.array(next_observation)
-        reward = np.array(reward)
-        done = np.array(done)
+        # convert to numpy array, memory mapped arrays are not copied
+        observation = np.asarray(observation)
+        observation_img = np.asarray(observation_img)
+        observation_img_raw = np.asarray(observation_img_raw)
+        action = np.asarray(action)
+        next_observation = np.asarray(next_observation)
+        reward = np.asarray(reward)
+        done = np.asarray(done)
 
         # img = observation_img[500]
         #
@@ -48,8 +58,9 @@ class AdapterVisualPusher:
         action = np.reshape(action, (self.n, action.shape[1]))
         done = np.reshape(done, (self.n, 1))
 
-        observation_img = np.reshape(observation_img, (self.n, 3, 120, 120))
-        observation_img_raw = np.reshape(observation_img_raw, (self.n, 3, 120, 120))
+        # crop, resize and channel layout of the images, cached on disk
+        observation_img = preprocessor(observation_img, source=source, name='observation_img')
+        observation_img_raw = preprocessor(observation_img_raw, source=source, name='observation_img_raw')
 
         # store tensors
         self.observation = T.from_numpy(observation)
@@ -1,9 +1,35 @@
+import os
+
 import gym
 from gym_framework.mujoco_envs.push_env.push_env import PushMocapCtrl
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+from RLV.torch_rlv.utils.dummy_vec_env import DummyVecEnv
+from RLV.torch_rlv.utils.monitor import Monitor
 
 def get_environment(name):
     if name == "acrobot_continuous":
         return gym.make('AcrobotContinuous100-v1')
 
     if name == "visual_pusher":
-        return PushMocapCtrl(render=True, max_steps=500, nsubsteps=12, random_env=False)
\ No newline at end of file
+        return PushMocapCtrl(render=True, max_steps=500, nsubsteps=12, random_env=False)
+
+
+def get_vec_environment(name, n_envs, log_dir=None, subprocess=False):
+    """
+    :param name: Name of the environment
+    :param n_envs: Number of copies of the environment that are stepped together
+    :param log_dir: Directory the ``Monitor`` of every copy writes its episode statistics to, ``None`` to not write them
+    :param subprocess: Step every copy in its own process instead of sequentially in this process
+    :return: The copies of the environment as one ``VecEnv``
+    """
+    def make_env(rank):
+        def _init():
+            filename = os.path.join(log_dir, str(rank)) if log_dir is not None else None
+            return Monitor(get_environment(name), filename)
+        return _init
+
+    if log_dir is not None:
+        os.makedirs(log_dir, exist_ok=True)
+    env_fns = [make_env(rank) for rank in range(n_envs)]
+    return SubprocVecEnv(env_fns) if subprocess else DummyVecEnv(env_fns)
@@ -10,29 +10,34 @@ class ConvNet(nn.Module):
     """
     Image classifier using convolutional layers with max pooling.
     """
-    def __init__(self, output_dims=20):
+    def __init__(self, output_dims=20, input_shape=(3, 120, 120)):
         """
         Model Constructor, Initialize all the layers to be used
+
+        :param output_dims: size of the output
+        :param input_shape: (channels, height, width) of the input images
         """
         super(ConvNet, self).__init__()
 
-        self.conv1 = nn.Conv2d(3, 16, 5)
+        self.input_shape = tuple(input_shape)
+        self.conv1 = nn.Conv2d(input_shape[0], 16, 5)
         self.conv2 = nn.Conv2d(16, 16, 5)
         self.conv3 = nn.Conv2d(16, 32, 5)
         self.max_pool = nn.MaxPool2d(2, 2)
-        self.fc1 = nn.Linear(32 * 11 * 11, 64)
+        # size of the flattened conv features, 32 * 11 * 11 for 3x120x120 images
+        with T.no_grad():
+            n_flatten = self.features(T.zeros((1,) + self.input_shape)).shape[1]
+        self.fc1 = nn.Linear(n_flatten, 64)
         self.fc2 = nn.Linear(64, 64)
         self.fc3 = nn.Linear(64, output_dims)
         self.criterion = nn.MSELoss()
 
-    def forward(self, x):
+    def features(self, x):
         """
-        This function defines the forward pass of this net model.
-        Once this function is defined, the gradient back-propagation can be
-        automatically computed by PyTorch.
+        Convolutional part of the forward pass.
 
         :param x: input data of this model
-        :return: output data of this model
+        :return: flattened conv features
         """
         x = F.relu(self.conv1(x))
         x = self.max_pool(x)
@@ -43,7 +48,18 @@ class ConvNet(nn.Module):
         x = F.relu(self.conv3(x))
         x = self.max_pool(x)
         #
-        x = T.flatten(x, 1)
+        return T.flatten(x, 1)
+
+    def forward(self, x):
+        """
+        This function defines the forward pass of this net model.
+        Once this function is defined, the gradient back-propagation can be
+        automatically computed by PyTorch.
+
+        :param x: input data of this model
+        :return: output data of this model
+        """
+        x = self.features(x)
 
         x = self.fc1(x)
         x = F.relu(x)
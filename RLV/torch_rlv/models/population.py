@@ -0,0 +1,221 @@
+from typing import Callable, List, NamedTuple, Sequence, Tuple
+
+import torch as th
+from torch import nn
+
+from RLV.torch_rlv.policies.sac_policy import LOG_STD_MAX, LOG_STD_MIN
+
+
+class StackedParameter(NamedTuple):
+    """
+    A parameter of a population module and the parameters of the members it is stacked from.
+    ``stack`` stacks tensors shaped like the member parameters (the parameters themselves or their optimizer
+    state) into the shape of the stacked parameter, ``unstack(tensor, i)`` returns the part of member ``i``.
+    """
+
+    parameter: nn.Parameter
+    member_parameters: List[nn.Parameter]
+    stack: Callable[[Sequence[th.Tensor]], th.Tensor]
+    unstack: Callable[[th.Tensor, int], th.Tensor]
+
+
+def _stack_weights(weights: Sequence[th.Tensor]) -> th.Tensor:
+    return th.stack([weight.t() for weight in weights])
+
+
+def _unstack_weight(weights: th.Tensor, i: int) -> th.Tensor:
+    return weights[i].t()
+
+
+def _stack_biases(biases: Sequence[th.Tensor]) -> th.Tensor:
+    return th.stack([bias[None] for bias in biases])
+
+
+def _unstack_bias(biases: th.Tensor, i: int) -> th.Tensor:
+    return biases[i, 0]
+
+
+class BatchedLinear(nn.Module):
+    """
+    ``N`` independent linear layers, one per population member, applied to inputs of shape
+    ``(N, batch_size, in_features)`` with a single batched matmul.
+    :param population_size: Number of stacked layers
+    :param in_features: Size of every input sample
+    :param out_features: Size of every output sample
+    """
+
+    def __init__(self, population_size: int, in_features: int, out_features: int):
+        super(BatchedLinear, self).__init__()
+        self.population_size = population_size
+        self.in_features = in_features
+        self.out_features = out_features
+        self.weight = nn.Parameter(th.empty(population_size, in_features, out_features))
+        self.bias = nn.Parameter(th.empty(population_size, 1, out_features))
+
+    @classmethod
+    def from_linears(cls, linears: Sequence[nn.Linear]) -> "BatchedLinear":
+        layer = cls(len(linears), linears[0].in_features, linears[0].out_features)
+        layer.to(linears[0].weight.device)
+        with th.no_grad():
+            for stacked in layer.stacked_parameters(linears):
+                stacked.parameter.copy_(stacked.stack(stacked.member_parameters))
+        return layer
+
+    def stacked_parameters(self, linears: Sequence[nn.Linear]) -> List[StackedParameter]:
+        return [
+            StackedParameter(self.weight, [linear.weight for linear in linears], _stack_weights, _unstack_weight),
+            StackedParameter(self.bias, [linear.bias for linear in linears], _stack_biases, _unstack_bias),
+        ]
+
+    def copy_to(self, linears: Sequence[nn.Linear]) -> None:
+        with th.no_grad():
+            for stacked in self.stacked_parameters(linears):
+                for i, member_parameter in enumerate(stacked.member_parameters):
+                    member_parameter.copy_(stacked.unstack(stacked.parameter, i))
+
+    def forward(self, x: th.Tensor) -> th.Tensor:
+        return th.baddbmm(self.bias, x, self.weight)
+
+
+class BatchedSequential(nn.Sequential):
+    """
+    Stack of ``nn.Sequential`` MLPs with the same architecture, the linear layers are replaced by
+    ``BatchedLinear`` layers and the parameterless layers (activations) are shared.
+    """
+
+    @classmethod
+    def from_sequentials(cls, sequentials: Sequence[nn.Sequential]) -> "BatchedSequential":
+        layers = []
+        for member_layers in zip(*sequentials):
+            if isinstance(member_layers[0], nn.Linear):
+                layers.append(BatchedLinear.from_linears(member_layers))
+            elif len(list(member_layers[0].parameters())) == 0:
+                layers.append(member_layers[0])
+            else:
+                raise ValueError(f"Layers of type {type(member_layers[0]).__name__} can't be batched")
+        return cls(*layers)
+
+    def stacked_parameters(self, sequentials: Sequence[nn.Sequential]) -> List[StackedParameter]:
+        return [
+            stacked
+            for i, layer in enumerate(self) if isinstance(layer, BatchedLinear)
+            for stacked in layer.stacked_parameters([sequential[i] for sequential in sequentials])
+        ]
+
+    def copy_to(self, sequentials: Sequence[nn.Sequential]) -> None:
+        for i, layer in enumerate(self):
+            if isinstance(layer, BatchedLinear):
+                layer.copy_to([sequential[i] for sequential in sequentials])
+
+
+def _check_parameterless_features_extractor(model: nn.Module) -> None:
+    if len(list(model.features_extractor.parameters())) > 0:
+        raise ValueError("The population only supports features extractors without parameters (MlpPolicy)")
+
+
+class PopulationActor(nn.Module):
+    """
+    The SAC actors of a population, evaluated for all members at once.
+    Only the unstructured exploration of the actor (``use_sde=False``) is supported.
+    :param actors: Actors of the population members
+    """
+
+    def __init__(self, actors: Sequence[nn.Module]):
+        super(PopulationActor, self).__init__()
+        for actor in actors:
+            assert not actor.use_sde, "The population doesn't support gSDE"
+            _check_parameterless_features_extractor(actor)
+        self.latent_pi = BatchedSequential.from_sequentials([actor.latent_pi for actor in actors])
+        self.mu = BatchedLinear.from_linears([actor.mu for actor in actors])
+        self.log_std = BatchedLinear.from_linears([actor.log_std for actor in actors])
+        # same epsilon as the squashed gaussian of the members
+        self.epsilon = actors[0].action_dist.epsilon
+
+    def stacked_parameters(self, actors: Sequence[nn.Module]) -> List[StackedParameter]:
+        return (self.latent_pi.stacked_parameters([actor.latent_pi for actor in actors])
+                + self.mu.stacked_parameters([actor.mu for actor in actors])
+                + self.log_std.stacked_parameters([actor.log_std for actor in actors]))
+
+    def copy_to(self, actors: Sequence[nn.Module]) -> None:
+        self.latent_pi.copy_to([actor.latent_pi for actor in actors])
+        self.mu.copy_to([actor.mu for actor in actors])
+        self.log_std.copy_to([actor.log_std for actor in actors])
+
+    def action_log_prob(self, obs: th.Tensor) -> Tuple[th.Tensor, th.Tensor]:
+        """
+        :param obs: Observations of shape ``(N, batch_size, obs_dim)``
+        :return: Squashed actions of shape ``(N, batch_size, action_dim)`` and their log probabilities
+            of shape ``(N, batch_size)``
+        """
+        latent_pi = self.latent_pi(obs)
+        mean_actions = self.mu(latent_pi).float()
+        log_std = th.clamp(self.log_std(latent_pi).float(), LOG_STD_MIN, LOG_STD_MAX)
+
+        distribution = th.distributions.Normal(mean_actions, log_std.exp())
+        gaussian_actions = distribution.rsample()
+        actions = th.tanh(gaussian_actions)
+        # squash correction, as in the SquashedDiagGaussianDistribution of the members
+        log_prob = distribution.log_prob(gaussian_actions).sum(dim=-1)
+        log_prob -= th.sum(th.log(1 - actions ** 2 + self.epsilon), dim=-1)
+        return actions, log_prob
+
+
+class PopulationCritic(nn.Module):
+    """
+    The SAC critics of a population, evaluated for all members at once.
+    :param critics: Critics of the population members
+    """
+
+    def __init__(self, critics: Sequence[nn.Module]):
+        super(PopulationCritic, self).__init__()
+        for critic in critics:
+            _check_parameterless_features_extractor(critic)
+        self.q_networks = nn.ModuleList([
+            BatchedSequential.from_sequentials(q_networks)
+            for q_networks in zip(*[critic.q_networks for critic in critics])
+        ])
+
+    def stacked_parameters(self, critics: Sequence[nn.Module]) -> List[StackedParameter]:
+        return [
+            stacked
+            for i, q_network in enumerate(self.q_networks)
+            for stacked in q_network.stacked_parameters([critic.q_networks[i] for critic in critics])
+        ]
+
+    def copy_to(self, critics: Sequence[nn.Module]) -> None:
+        for i, q_network in enumerate(self.q_networks):
+            q_network.copy_to([critic.q_networks[i] for critic in critics])
+
+    def forward(self, obs: th.Tensor, actions: th.Tensor) -> Tuple[th.Tensor, ...]:
+        qvalue_input = th.cat([obs, actions], dim=-1)
+        return tuple(q_network(qvalue_input) for q_network in self.q_networks)
+
+
+class PopulationInverseModel(nn.Module):
+    """
+    The inverse models of a population, evaluated for all members at once.
+    :param inverse_models: ``InverseModelNetwork`` of the population members
+    """
+
+    def __init__(self, inverse_models: Sequence[nn.Module]):
+        super(PopulationInverseModel, self).__init__()
+        self.layer_names = ['fc1', 'fc2', 'fc3', 'q']
+        for name in self.layer_names:
+            self.add_module(name, BatchedLinear.from_linears([getattr(model, name) for model in inverse_models]))
+
+    def stacked_parameters(self, inverse_models: Sequence[nn.Module]) -> List[StackedParameter]:
+        return [
+            stacked
+            for name in self.layer_names
+            for stacked in getattr(self, name).stacked_parameters([getattr(model, name) for model in inverse_models])
+        ]
+
+    def copy_to(self, inverse_models: Sequence[nn.Module]) -> None:
+        for name in self.layer_names:
+            getattr(self, name).copy_to([getattr(model, name) for model in inverse_models])
+
+    def forward(self, x: th.Tensor) -> th.Tensor:
+        x = th.relu(self.fc1(x))
+        x = th.relu(self.fc2(x))
+        x = th.relu(self.fc3(x))
+        return th.tanh(self.q(x))
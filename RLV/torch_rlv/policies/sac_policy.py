@@ -182,6 +182,9 @@ class Actor(BasePolicy):
 
     def action_log_prob(self, obs: th.Tensor) -> Tuple[th.Tensor, th.Tensor]:
         mean_actions, log_std, kwargs = self.get_action_dist_params(obs)
+        # The log prob reduction is precision sensitive, keep it in fp32 when running under autocast
+        if mean_actions.dtype != th.float32:
+            mean_actions, log_std = mean_actions.float(), log_std.float()
         # return action and associated log prob
         return self.action_dist.log_prob_from_params(mean_actions, log_std, **kwargs)
 
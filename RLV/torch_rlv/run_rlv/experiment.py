@@ -1,4 +1,4 @@
-from RLV.torch_rlv.environments.utils import get_environment
+from RLV.torch_rlv.environments.utils import get_environment, get_vec_environment
 from RLV.torch_rlv.algorithms.utils import init_algorithm
 
 
@@ -6,7 +6,10 @@ class Experiment:
     def __init__(self, config):
         self.config = config
         self.env_name = config['env_name']
-        self.env = get_environment(self.env_name)
+        self.log_dir = config['log_dir']
+        self.n_envs = config['n_envs']
+        self.subprocess_envs = config['subprocess_envs']
+        self.env = self.make_env()
         self.algo_name = config['algo_name']
         self.policy = config['policy']
         self.device = config['device']
@@ -24,7 +27,31 @@ class Experiment:
         self.gradient_steps = config['gradient_steps']
         self.project_name = config['project_name']
         self.run_name = config['run_name']
-        self.log_dir = config['log_dir']
+        self.mixed_precision = config['mixed_precision']
+        self.embedding_cache_refresh_interval = config['embedding_cache_refresh_interval']
+        self.embedding_cache_staleness_budget = config['embedding_cache_staleness_budget']
+        self.action_relabel_interval = config['action_relabel_interval']
+        self.action_relabel_batch_size = config['action_relabel_batch_size']
+        self.action_relabel_in_background = config['action_relabel_in_background']
+        self.seed = config['seed']
+        self.warmup_cache_dir = config['warmup_cache_dir']
+        self.warmup_cache_seed_policy = config['warmup_cache_seed_policy']
+        self.population_size = config['population_size']
+        self.prefetch_batches = config['prefetch_batches']
+        self.image_crop = config['image_crop']
+        self.image_resolution = config['image_resolution']
+        self.image_channel_layout = config['image_channel_layout']
+        self.image_cache_dir = config['image_cache_dir']
+
+    def make_env(self, log_dir=None):
+        """
+        :param log_dir: Directory the monitors of a vectorized environment write to, defaults to the experiment's
+        :return: A new environment of the experiment
+        """
+        if self.n_envs == 1:
+            return get_environment(self.env_name)
+        log_dir = log_dir if log_dir is not None else self.log_dir
+        return get_vec_environment(self.env_name, self.n_envs, log_dir=log_dir, subprocess=self.subprocess_envs)
 
     def run_experiment(self):
         algorithm = init_algorithm(self.algo_name, self)
@@ -0,0 +1,64 @@
+"""
+Benchmark the environment steps per second of the SAC rollout collection for different numbers of environments.
+
+Every configuration builds a fresh SAC model and collects the same total number of transitions with the policy
+(``learning_starts=0``), without gradient updates, so the numbers only measure the collection: stepping the
+environments, the batched action prediction and the batched replay buffer ``add``.
+
+Example:
+    python -m RLV.torch_rlv.scripts.benchmark_env_collection --env_name acrobot_continuous \
+        --num_envs 1 4 8 --num_steps 20000
+"""
+import argparse
+import time
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+from RLV.torch_rlv.algorithms.sac.sac import SAC
+from RLV.torch_rlv.environments.utils import get_vec_environment
+from RLV.torch_rlv.utils.type_aliases import TrainFreq, TrainFrequencyUnit
+
+
+class _NoCallback(BaseCallback):
+    def _on_step(self) -> bool:
+        return True
+
+
+def benchmark(env_name, n_envs, num_steps, subprocess, device):
+    env = get_vec_environment(env_name, n_envs, subprocess=subprocess)
+    model = SAC('MlpPolicy', env, env_name, total_steps=num_steps, buffer_size=num_steps, learning_starts=0,
+                device=device)
+    _, callback = model._setup_learn(num_steps, None, _NoCallback())
+    train_freq = TrainFreq(max(num_steps // n_envs, 1), TrainFrequencyUnit.STEP)
+
+    start = time.perf_counter()
+    rollout = model.collect_rollouts(model.env, callback=callback, train_freq=train_freq,
+                                     replay_buffer=model.replay_buffer, learning_starts=0)
+    duration = time.perf_counter() - start
+    env.close()
+    return rollout.episode_timesteps / duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--env_name', type=str, default='acrobot_continuous', help="Name of the environment")
+    parser.add_argument('--num_envs', type=int, nargs='+', default=[1, 4, 8],
+                        help="Numbers of environments to benchmark")
+    parser.add_argument('--num_steps', type=int, default=20000,
+                        help="Transitions collected per configuration, summed over the environments")
+    parser.add_argument('--subprocess', action='store_true',
+                        help="Step every environment in its own process instead of sequentially")
+    parser.add_argument('--device', type=str, default='auto', help="Device of the policy")
+    args = parser.parse_args()
+
+    results = {n_envs: benchmark(args.env_name, n_envs, args.num_steps, args.subprocess, args.device)
+               for n_envs in args.num_envs}
+
+    baseline = results[args.num_envs[0]]
+    print(f"{'n_envs':>8} {'env steps/s':>12} {'speedup':>8}")
+    for n_envs, steps_per_second in results.items():
+        print(f"{n_envs:>8} {steps_per_second:>12.1f} {steps_per_second / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
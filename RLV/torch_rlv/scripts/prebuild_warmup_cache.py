@@ -0,0 +1,94 @@
+"""
+Prebuild the warmup cache for every run of a sweep, so the runs load the warmed up inverse model and
+encoder instead of repeating the warmup.
+
+Example:
+    python -m RLV.torch_rlv.scripts.prebuild_warmup_cache --config RLV/torch_rlv/run_rlv/config.yaml \
+        --experiment visual_pusher --cache_dir ../output/warmup_cache --seeds 0 1 2 3
+"""
+import argparse
+import copy
+import itertools
+
+import yaml
+
+from RLV.torch_rlv.algorithms.utils import init_algorithm
+from RLV.torch_rlv.run_rlv.experiment import Experiment
+
+
+def merge(default, override):
+    merged = copy.deepcopy(default)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def expand_sweep(experiment_config):
+    """
+    :return: The params of every run of an experiment, expanding its ``grid`` (cartesian product) and
+        ``list`` (zipped) parameters like cw2 does
+    """
+    params = experiment_config.get('params', {})
+    grid = experiment_config.get('grid', {})
+    lists = experiment_config.get('list', {})
+
+    grid_values = list(itertools.product(*grid.values())) if grid else [()]
+    list_values = list(zip(*lists.values())) if lists else [()]
+
+    runs = []
+    for grid_run in grid_values:
+        for list_run in list_values:
+            run = copy.deepcopy(params)
+            run.update(zip(grid.keys(), grid_run))
+            run.update(zip(lists.keys(), list_run))
+            runs.append(run)
+    return runs
+
+
+def load_runs(config_path, experiment_name):
+    with open(config_path) as f:
+        documents = [document for document in yaml.safe_load_all(f) if document]
+
+    default = next((document for document in documents if document.get('name') == 'DEFAULT'), {})
+    experiment = next((document for document in documents if document.get('name') == experiment_name), None)
+    if experiment is None:
+        raise ValueError(f"No experiment '{experiment_name}' in {config_path}")
+
+    return expand_sweep(merge(default, experiment))
+
+
+def prebuild(args):
+    runs = load_runs(args.config, args.experiment)
+    for i, params in enumerate(runs):
+        params['warmup_cache_dir'] = args.cache_dir
+        params['wandb_log'] = False
+        if params['algo_name'] != 'rlv':
+            print(f"Skipping run {i}, the '{params['algo_name']}' algorithm has no warmup")
+            continue
+
+        # all seeds share one cache entry unless the seed policy warms up every seed separately
+        seeds = args.seeds if params['warmup_cache_seed_policy'] == 'per_seed' else args.seeds[:1]
+        for seed in seeds:
+            params['seed'] = seed
+            print(f"Warming up run {i + 1} / {len(runs)}, seed {seed}")
+            algorithm = init_algorithm(params['algo_name'], Experiment(params))
+            algorithm.warmup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', type=str, default='config.yaml', help="cw2 config of the sweep")
+    parser.add_argument('--experiment', type=str, required=True, help="Name of the experiment in the config")
+    parser.add_argument('--cache_dir', type=str, required=True, help="Directory of the warmup cache")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[None],
+                        help="Seeds of the runs, only used by the 'per_seed' seed policy")
+    args = parser.parse_args()
+
+    prebuild(args)
+
+
+if __name__ == '__main__':
+    main()
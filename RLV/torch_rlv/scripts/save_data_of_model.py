@@ -1,9 +1,14 @@
+import argparse
+import multiprocessing as mp
+import os
 import numpy as np
 import cv2
 import time
-import pickle
+from stable_baselines3.common.utils import set_random_seed
 from RLV.torch_rlv.environments.utils import get_environment
 from RLV.torch_rlv.algorithms.sac.sac import SAC
+from RLV.torch_rlv.utils.dataset_writer import StreamingDatasetWriter, merge_datasets
+from RLV.torch_rlv.utils.image_filters import RED_TINT, apply_filters
 # from PIL import Image
 # import matplotlib.pyplot as plt
 # import matplotlib.image as mpimg
@@ -11,21 +16,33 @@ from RLV.torch_rlv.algorithms.sac.sac import SAC
 
 class DatasetCreator():
     def __init__(self, env_name, num_steps=40000, model_path="../output/sac_models/acrobot/trained_for_1000000.zip",
-                 max_length_episode=200):
+                 max_length_episode=200, chunk_size=1000, seed=None, output_dir=None, load_model=True):
         self.env = get_environment(env_name)
         self.max_length_episode = max_length_episode
         self.env_name = env_name
         self.num_steps = num_steps
-        self.model = SAC.load(model_path)
-        print(self.model.wandb_config)
-        self.total_steps = self.model.total_steps
-
-        if self.env_name == 'visual_pusher':
-            self.dataset = {'observation': [], 'observation_img': [], 'observation_img_raw': [], 'action': [],
-                            'next_observation': [], 'reward': [],  'done': []}
-            self.paired_dataset = {'observation': [], 'observation_img_raw': [], 'observation_img': []}
-        else:
-            self.dataset = {'observation': [], 'action': [], 'next_observation': [], 'reward': [], 'done': []}
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.model = None
+        self.total_steps = None
+        if load_model:
+            self.model = SAC.load(model_path)
+            print(self.model.wandb_config)
+            self.total_steps = self.model.total_steps
+
+        self.output_dir = output_dir
+        if self.output_dir is None:
+            self.output_dir = f'../data/{self.env_name}_data/{self.total_steps}_SAC_steps_{self.num_steps}_samples'
+
+        if seed is not None:
+            set_random_seed(seed)
+            if hasattr(self.env, 'seed'):
+                self.env.seed(seed)
+
+    @property
+    def paired_output_dir(self):
+        head, tail = os.path.split(self.output_dir)
+        return os.path.join(head, f'paired_{tail}')
 
     def get_image(self, mode="rgb_array", noise=None):
         img = self.env.render()
@@ -39,6 +56,9 @@ class DatasetCreator():
         if mode == "rgb_array":
             return img
 
+    def predict(self, obs):
+        action, state_ = self.model.predict(obs)
+        return action
 
     def save_data_of_model(self):
         global filter
@@ -46,49 +66,37 @@ class DatasetCreator():
         obs = self.env.reset()
         counter = 0
 
+        # samples are staged per episode and streamed to disk in chunks once the episode is kept
+        writer = StreamingDatasetWriter(self.output_dir, chunk_size=self.chunk_size)
+        if self.env_name == 'visual_pusher':
+            paired_writer = StreamingDatasetWriter(self.paired_output_dir, chunk_size=self.chunk_size)
+
         for i in range(self.num_steps):
             if self.env_name == 'visual_pusher':
-                # get the images with and without noise
+                # get the images with and without noise, the noise is applied to the raw render
                 obs_img_raw = self.get_image()
-                obs_img = self.get_image(noise='red')
+                obs_img = apply_filters(obs_img_raw[None], RED_TINT)[0]
 
-            action, state_ = self.model.predict(obs)
+            action = self.predict(obs)
             next_obs, reward, done, _ = self.env.step(action)
             counter += 1
 
-            # build up the data set
-            self.dataset['observation'].append(obs)
-            self.dataset['action'].append(action)
-            self.dataset['next_observation'].append(next_obs)
-            self.dataset['reward'].append(reward)
-            self.dataset['done'].append(done)
-
-            # if visual pusher append image data
+            # build up the data set, if visual pusher add image data
             if self.env_name == 'visual_pusher':
-                self.dataset['observation_img'].append(obs_img)
-                self.dataset['observation_img_raw'].append(obs_img_raw)
+                writer.add(observation=obs, observation_img=obs_img, observation_img_raw=obs_img_raw,
+                           action=action, next_observation=next_obs, reward=reward, done=done)
 
-                # in every 10. step append paired image data
+                # in every 10. step add paired image data
                 if i % 10 == 0:
-                    self.paired_dataset['observation'].append(obs)
-                    self.paired_dataset['observation_img_raw'].append(obs_img_raw)
-                    self.paired_dataset['observation_img'].append(obs_img)
+                    paired_writer.add(observation=obs, observation_img_raw=obs_img_raw, observation_img=obs_img)
+            else:
+                writer.add(observation=obs, action=action, next_observation=next_obs, reward=reward, done=done)
 
             # if not succesfull drop observations
             if self.env_name == 'visual_pusher' and counter >= self.max_length_episode:
                 obs = self.env.reset()
-                n = len(self.dataset['observation'])
-                self.dataset['observation'] = self.dataset['observation'][:n-counter]
-                self.dataset['action'] = self.dataset['action'][:n-counter]
-                self.dataset['next_observation'] = self.dataset['next_observation'][:n-counter]
-                self.dataset['reward'] = self.dataset['reward'][:n-counter]
-                self.dataset['done'] = self.dataset['done'][:n-counter]
-                self.dataset['observation_img'] = self.dataset['observation_img'][:n-counter]
-                self.dataset['observation_img_raw'] = self.dataset['observation_img_raw'][:n-counter]
-                if i % 10 == 0:
-                    self.paired_dataset['observation'] = self.paired_dataset['observation'][:n-counter]
-                    self.paired_dataset['observation_img_raw'] = self.paired_dataset['observation_img_raw'][:n-counter]
-                    self.paired_dataset['observation_img'] = self.paired_dataset['observation_img'][:n-counter]
+                writer.discard_episode()
+                paired_writer.discard_episode()
                 counter = 0
 
             if not done:
@@ -96,23 +104,125 @@ class DatasetCreator():
             else:
                 obs = self.env.reset()
                 counter = 0
+                writer.commit_episode()
+                if self.env_name == 'visual_pusher':
+                    paired_writer.commit_episode()
                 # filter = 'gauss' if filter == 'red' else 'gauss'
 
             if i % 500 == 0:
                 print(f'{(i / self.num_steps * 100)}  % done')
 
-        with open(f'../data/{self.env_name}_data/{self.total_steps}_SAC_steps'
-                  f'_{self.num_steps}_samples.pickle', 'w+b') as df:
-            pickle.dump(self.dataset, df)
-
+        # the last, unfinished episode is kept
+        writer.commit_episode()
+        writer.close()
         if self.env_name == 'visual_pusher':
-            with open(f'../data/{self.env_name}_data/paired_{self.total_steps}_SAC_steps'
-                      f'_{self.num_steps}_samples.pickle', 'w+b') as df:
-                pickle.dump(self.paired_dataset, df)
+            paired_writer.commit_episode()
+            paired_writer.close()
 
 
-if __name__ == '__main__':
-    creator = DatasetCreator(env_name='visual_pusher', num_steps=5000, max_length_episode=200,
-                             model_path="../data/visual_pusher_data/478666_sac_trained_for_500000_steps")
+class RemotePolicy:
+    """
+    Policy of a worker whose actions are predicted by the main process, batched over all workers.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, obs):
+        self.connection.send(obs)
+        return self.connection.recv()
+
+
+def _create_shard(kwargs, connection=None):
+    creator = DatasetCreator(load_model=connection is None, **kwargs)
+    if connection is not None:
+        creator.predict = RemotePolicy(connection)
     creator.save_data_of_model()
+    if connection is not None:
+        # tell the main process that this worker does not need further actions
+        connection.send(None)
+
+
+def _serve_batched_predictions(model, connections):
+    active = list(connections)
+    while active:
+        requests = [(connection, connection.recv()) for connection in active]
+        active = [connection for connection, obs in requests if obs is not None]
+        if not active:
+            break
+        actions, _ = model.predict(np.stack([obs for _, obs in requests if obs is not None]))
+        for connection, action in zip(active, actions):
+            connection.send(action)
+
+
+def create_dataset_in_parallel(env_name, num_steps, model_path, workers, max_length_episode=200, chunk_size=1000,
+                               seed=0, batched_inference=False):
+    """
+    Shard the step budget over ``workers`` processes, each with its own environment and seed ``seed + k``.
+    Every worker writes its own shard, the shards are merged into one dataset afterwards.
+    With ``batched_inference`` the workers only step their environments and the actions of all
+    workers are predicted at once by the model of the main process.
+    """
+    model = SAC.load(model_path)
+    output_dir = f'../data/{env_name}_data/{model.total_steps}_SAC_steps_{num_steps}_samples'
+    steps_per_worker = [num_steps // workers + (k < num_steps % workers) for k in range(workers)]
+
+    # spawned workers do not inherit the simulator or torch state of the main process
+    ctx = mp.get_context('spawn')
+    processes, connections, shard_dirs = [], [], []
+    for k in range(workers):
+        shard_dir = os.path.join(output_dir, 'shards', f'shard_{k}')
+        kwargs = dict(env_name=env_name, num_steps=steps_per_worker[k], model_path=model_path,
+                      max_length_episode=max_length_episode, chunk_size=chunk_size, seed=seed + k,
+                      output_dir=shard_dir)
+        worker_connection = None
+        if batched_inference:
+            connection, worker_connection = ctx.Pipe()
+            connections.append(connection)
+        process = ctx.Process(target=_create_shard, args=(kwargs, worker_connection))
+        process.start()
+        if worker_connection is not None:
+            # only the worker holds this end, so a crashed worker raises EOFError instead of blocking
+            worker_connection.close()
+        processes.append(process)
+        shard_dirs.append(shard_dir)
+
+    start = time.time()
+    if batched_inference:
+        _serve_batched_predictions(model, connections)
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f'Dataset worker exited with code {process.exitcode}, the shards are kept')
+
+    n = merge_datasets(shard_dirs, output_dir)
+    print(f'{n} samples from {workers} workers in {time.time() - start:.1f} s')
+    if env_name == 'visual_pusher':
+        paired_shard_dirs = [os.path.join(os.path.dirname(d), f'paired_{os.path.basename(d)}') for d in shard_dirs]
+        head, tail = os.path.split(output_dir)
+        merge_datasets(paired_shard_dirs, os.path.join(head, f'paired_{tail}'))
+    os.rmdir(os.path.join(output_dir, 'shards'))
+
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--env_name', default='visual_pusher')
+    parser.add_argument('--num_steps', type=int, default=5000)
+    parser.add_argument('--max_length_episode', type=int, default=200)
+    parser.add_argument('--model_path', default="../data/visual_pusher_data/478666_sac_trained_for_500000_steps")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the environment and the policy, worker k of a parallel run uses seed + k')
+    parser.add_argument('--batched_inference', action='store_true',
+                        help='predict the actions of all workers in one batch in the main process')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        create_dataset_in_parallel(env_name=args.env_name, num_steps=args.num_steps, model_path=args.model_path,
+                                   workers=args.workers, max_length_episode=args.max_length_episode, seed=args.seed,
+                                   batched_inference=args.batched_inference)
+    else:
+        creator = DatasetCreator(env_name=args.env_name, num_steps=args.num_steps,
+                                 max_length_episode=args.max_length_episode, model_path=args.model_path,
+                                 seed=args.seed)
+        creator.save_data_of_model()
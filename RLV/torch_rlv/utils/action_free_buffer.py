@@ -7,6 +7,8 @@ class ActionFreeReplayBuffer():
 
         self.observation_img = observation_img
         self.observation_img_raw = observation_img_raw
+        # all images of the dataset, the next observation of index i is the image at index i + 1
+        self.images = observation_img
 
         self.done = done[:-1]
 
@@ -19,8 +21,16 @@ class ActionFreeReplayBuffer():
         self.next_observation_img_raw = self.observation_img_raw[1:]
         self.observation_img_raw = self.observation_img_raw[:-1]
 
+        # actions inferred for the whole dataset by an ActionRelabeler, None until the first relabel pass
+        self.inferred_actions = None
+
     def sample(self, batch_size=256):
-        batch = np.random.choice(self.n, batch_size)
+        return self.get_samples(self.sample_indices(batch_size))
+
+    def sample_indices(self, batch_size=256):
+        return np.random.choice(self.n, batch_size)
+
+    def get_samples(self, batch):
         obs = self.observation[batch]
         obs_img = self.observation_img[batch]
         obs_img_raw = self.observation_img_raw[batch]
@@ -31,6 +41,10 @@ class ActionFreeReplayBuffer():
         done = self.done[batch]
         return obs, obs_img, obs_img_raw, next_obs, next_obs_img, next_obs_img_raw, done
 
+    def get_inferred_actions(self, batch):
+        assert self.inferred_actions is not None, "The action-free dataset was not relabeled yet"
+        return self.inferred_actions[batch]
+
 
 class SmallReplayBuffer():
     def __init__(self, observation, action, next_observation):
@@ -0,0 +1,122 @@
+import copy
+import threading
+import time
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+import torch as th
+from torch import nn
+
+
+class ActionRelabeler:
+    """
+    Labels a static action-free dataset with the actions predicted by the inverse model, so the
+    SAC update can read them from ``buffer.inferred_actions`` like the actions of an ordinary
+    replay buffer instead of running the inverse model on every batch.
+    The version is advanced with ``step()`` after every inverse model update. Once the labels are
+    ``relabel_interval`` updates old, ``maybe_relabel`` labels the whole dataset again in batched
+    passes without gradients. In the background mode the pass runs in a separate thread on a copy
+    of the models and the new labels are swapped in when it is done, the old labels are served
+    until then.
+    :param buffer: Action-free buffer with ``n`` samples whose ``inferred_actions`` are relabeled
+    :param action_dim: Dimension of the inferred actions
+    :param label: Function computing the actions of the given dataset indices with the given models
+    :param device: Device the inferred actions are stored on
+    :param relabel_interval: Number of inverse model updates after which the dataset is relabeled
+    :param batch_size: Number of samples labeled per forward pass
+    :param background: Whether to relabel in a background thread
+    """
+
+    def __init__(
+        self,
+        buffer,
+        action_dim: int,
+        label: Callable[[Sequence[nn.Module], np.ndarray], th.Tensor],
+        device: th.device,
+        relabel_interval: int = 1000,
+        batch_size: int = 4096,
+        background: bool = False,
+    ):
+        assert relabel_interval > 0, "The relabel interval must be at least one inverse model update"
+        self.buffer = buffer
+        self.action_dim = action_dim
+        self.label = label
+        self.device = device
+        self.relabel_interval = relabel_interval
+        self.batch_size = batch_size
+        self.background = background
+
+        self.version = 0
+        # version of the models the served labels were computed with, None before the first pass
+        self.label_version = None
+
+        self._thread = None
+        self._passes = 0
+        self._samples_per_second = []
+
+    def step(self) -> None:
+        """
+        Advance the inverse model version, to be called after every inverse model update.
+        """
+        self.version += 1
+
+    @property
+    def label_age(self) -> int:
+        """
+        Number of inverse model updates since the served labels were computed.
+        """
+        return self.version - self.label_version
+
+    def maybe_relabel(self, models: Sequence[nn.Module]) -> None:
+        """
+        Relabel the dataset if the labels are too old. The first pass always blocks, since there
+        are no labels to serve before it.
+        :param models: Models passed to ``label``
+        """
+        if self.label_version is None:
+            self._relabel(models, self.version)
+        elif self.label_age >= self.relabel_interval:
+            if not self.background:
+                self._relabel(models, self.version)
+            elif self._thread is None or not self._thread.is_alive():
+                snapshot = [copy.deepcopy(model) for model in models]
+                self._thread = threading.Thread(target=self._relabel, args=(snapshot, self.version), daemon=True)
+                self._thread.start()
+
+    def _relabel(self, models: Sequence[nn.Module], version: int) -> None:
+        start = time.perf_counter()
+        n = self.buffer.n
+        inferred_actions = th.empty((n, self.action_dim), dtype=th.float32, device=self.device)
+        with th.no_grad():
+            for batch_start in range(0, n, self.batch_size):
+                indices = np.arange(batch_start, min(batch_start + self.batch_size, n))
+                inferred_actions[batch_start:batch_start + len(indices)] = self.label(models, indices).float()
+        if inferred_actions.is_cuda:
+            th.cuda.synchronize(inferred_actions.device)
+
+        # swap in the new labels in one assignment, lookups never see a partially labeled dataset
+        self.buffer.inferred_actions = inferred_actions
+        self.label_version = version
+        self._passes += 1
+        self._samples_per_second.append(n / (time.perf_counter() - start))
+
+    def wait(self) -> None:
+        """
+        Block until a running background pass is done.
+        """
+        if self._thread is not None:
+            self._thread.join()
+
+    def get_diagnostics(self) -> Dict[str, float]:
+        """
+        Age of the served labels and throughput of the relabel passes since the last call.
+        """
+        diagnostics = {
+            "action_relabel_label_age": float(self.label_age) if self.label_version is not None else 0.0,
+            "action_relabel_samples_per_second": np.mean(self._samples_per_second)
+            if self._samples_per_second else 0.0,
+            "action_relabel_passes": self._passes,
+        }
+        self._passes = 0
+        self._samples_per_second = []
+        return diagnostics
@@ -14,6 +14,7 @@ from RLV.torch_rlv.utils.type_aliases import (
     RolloutBufferSamples,
 )
 from stable_baselines3.common.vec_env import VecNormalize
+from RLV.torch_rlv.utils.pinned_staging import PinnedStagingArena
 
 try:
     # Check memory used by replay buffer when possible
@@ -163,6 +164,11 @@ class ReplayBuffer(BaseBuffer):
     :param handle_timeout_termination: Handle timeout termination (due to timelimit)
         separately and treat the task as infinite horizon task.
         https://github.com/DLR-RM/stable-baselines3/issues/284
+    :param pinned_staging: Gather the sampled batches into pinned host buffers and copy them to the GPU
+        asynchronously, see ``PinnedStagingArena``. Has no effect on a CPU device.
+    :param prefetch: Sample and start the transfer of the next batch when a batch is returned,
+        so the transfer overlaps with the update on the returned batch. The prefetched batch doesn't
+        contain the transitions added after it was sampled.
     """
 
     def __init__(
@@ -174,10 +180,18 @@ class ReplayBuffer(BaseBuffer):
         n_envs: int = 1,
         optimize_memory_usage: bool = False,
         handle_timeout_termination: bool = True,
+        pinned_staging: bool = True,
+        prefetch: bool = False,
     ):
         super(ReplayBuffer, self).__init__(buffer_size, observation_space, action_space, device, n_envs=n_envs)
 
-        assert n_envs == 1, "Replay buffer only support single environment for now"
+        self.pinned_staging = pinned_staging
+        self.prefetch = prefetch
+        self._init_staging()
+
+        # Every step stores one transition per environment,
+        # the buffer keeps holding ``buffer_size`` transitions in total
+        self.buffer_size = max(buffer_size // n_envs, 1)
 
         # Check that the replay buffer can fit into the memory
         if psutil is not None:
@@ -226,17 +240,27 @@ class ReplayBuffer(BaseBuffer):
         done: np.ndarray,
         infos: List[Dict[str, Any]],
     ) -> None:
-        # Copy to avoid modification by reference
-        self.observations[self.pos] = np.array(obs).copy()
+        """
+        Add one transition per environment.
+        :param obs: Observations of shape ``(n_envs, *obs_shape)``
+        :param next_obs: Next observations, the terminal observations for the environments that are done
+        :param action: Actions of shape ``(n_envs, action_dim)``
+        :param reward: Rewards of shape ``(n_envs,)``
+        :param done: Termination signals of shape ``(n_envs,)``
+        :param infos: Additional information about the transition of every environment
+        """
+        # The slice assignments copy the data, no extra copy is needed to avoid modification by reference
+        self.observations[self.pos] = np.asarray(obs).reshape((self.n_envs,) + self.obs_shape)
 
         if self.optimize_memory_usage:
-            self.observations[(self.pos + 1) % self.buffer_size] = np.array(next_obs).copy()
+            self.observations[(self.pos + 1) % self.buffer_size] = np.asarray(next_obs).reshape(
+                (self.n_envs,) + self.obs_shape)
         else:
-            self.next_observations[self.pos] = np.array(next_obs).copy()
+            self.next_observations[self.pos] = np.asarray(next_obs).reshape((self.n_envs,) + self.obs_shape)
 
-        self.actions[self.pos] = np.array(action).copy()
-        self.rewards[self.pos] = np.array(reward).copy()
-        self.dones[self.pos] = np.array(done).copy()
+        self.actions[self.pos] = np.asarray(action).reshape((self.n_envs, self.action_dim))
+        self.rewards[self.pos] = reward
+        self.dones[self.pos] = done
 
         if self.handle_timeout_termination:
             self.timeouts[self.pos] = np.array([info.get("TimeLimit.truncated", False) for info in infos])
@@ -246,6 +270,35 @@ class ReplayBuffer(BaseBuffer):
             self.full = True
             self.pos = 0
 
+    def _init_staging(self) -> None:
+        self.staging_arena = PinnedStagingArena(self.device) if self.pinned_staging else None
+        # batch whose transfer to the device was started by the previous ``sample`` call
+        self._prefetched = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # CUDA streams and events can't be pickled, the arena is created again when the buffer is loaded
+        state = self.__dict__.copy()
+        del state["staging_arena"]
+        del state["_prefetched"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # Buffers saved before the staging arena existed
+        self.pinned_staging = state.get("pinned_staging", False)
+        self.prefetch = state.get("prefetch", False)
+        self._init_staging()
+
+    def _sample_batch_inds(self, batch_size: int) -> np.ndarray:
+        if not self.optimize_memory_usage:
+            upper_bound = self.buffer_size if self.full else self.pos
+            return np.random.randint(0, upper_bound, size=batch_size)
+        # Do not sample the element with index `self.pos` as the transitions is invalid
+        # (we use only one array to store `obs` and `next_obs`)
+        if self.full:
+            return (np.random.randint(1, self.buffer_size, size=batch_size) + self.pos) % self.buffer_size
+        return np.random.randint(0, self.pos, size=batch_size)
+
     def sample(self, batch_size: int, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
         """
         Sample elements from the replay buffer.
@@ -257,31 +310,82 @@ class ReplayBuffer(BaseBuffer):
             to normalize the observations/rewards when sampling
         :return:
         """
-        if not self.optimize_memory_usage:
-            return super().sample(batch_size=batch_size, env=env)
-        # Do not sample the element with index `self.pos` as the transitions is invalid
-        # (we use only one array to store `obs` and `next_obs`)
-        if self.full:
-            batch_inds = (np.random.randint(1, self.buffer_size, size=batch_size) + self.pos) % self.buffer_size
+        # The statistics of a VecNormalize env change between the samples, they are never prefetched
+        if not self.prefetch or self.staging_arena is None or not self.staging_arena.enabled or env is not None:
+            return self._get_samples(self._sample_batch_inds(batch_size), env=env)
+
+        samples = self._prefetched
+        if samples is None or len(samples.observations) != batch_size:
+            samples = self._get_staged_samples(self._sample_batch_inds(batch_size), wait=False)
+        self._prefetched = self._get_staged_samples(self._sample_batch_inds(batch_size), wait=False)
+        self.staging_arena.wait(samples)
+        return samples
+
+    def _get_staged_samples(self, batch_inds: np.ndarray, wait: bool = True) -> ReplayBufferSamples:
+        """
+        Gather the transitions straight into the host buffers of the staging arena
+        and start their transfer to the device.
+        :param wait: Make the current stream wait for the transfer, else ``self.staging_arena.wait``
+            has to be called before the samples are used
+        """
+        # Sample the environment of every transition uniformly
+        env_indices = np.random.randint(0, high=self.n_envs, size=(len(batch_inds),))
+        # Index of every transition in the arrays with the buffer and env axes flattened,
+        # ``np.take`` can then write the gathered transitions into the host buffers directly
+        inds = batch_inds * self.n_envs + env_indices
+        next_inds = ((batch_inds + 1) % self.buffer_size) * self.n_envs + env_indices
+
+        def flat(array: np.ndarray) -> np.ndarray:
+            return array.reshape((self.buffer_size * self.n_envs,) + array.shape[2:])
+
+        batch_size = len(batch_inds)
+        observations, actions, next_observations, dones, rewards = self.staging_arena.host_buffers([
+            ((batch_size,) + self.obs_shape, self.observations.dtype),
+            ((batch_size, self.action_dim), self.actions.dtype),
+            ((batch_size,) + self.obs_shape, self.observations.dtype),
+            ((batch_size, 1), self.dones.dtype),
+            ((batch_size, 1), self.rewards.dtype),
+        ])
+
+        # The indices are always valid, ``mode="clip"`` avoids the intermediate buffer of the bounds check
+        np.take(flat(self.observations), inds, axis=0, out=observations, mode="clip")
+        np.take(flat(self.actions), inds, axis=0, out=actions, mode="clip")
+        if self.optimize_memory_usage:
+            np.take(flat(self.observations), next_inds, axis=0, out=next_observations, mode="clip")
         else:
-            batch_inds = np.random.randint(0, self.pos, size=batch_size)
-        return self._get_samples(batch_inds, env=env)
+            np.take(flat(self.next_observations), inds, axis=0, out=next_observations, mode="clip")
+        # Only use dones that are not due to timeouts
+        # deactivated by default (timeouts is initialized as an array of False)
+        np.multiply(flat(self.dones)[inds], 1 - flat(self.timeouts)[inds], out=dones.reshape(-1))
+        np.take(flat(self.rewards), inds, axis=0, out=rewards.reshape(-1), mode="clip")
+
+        samples = ReplayBufferSamples(*self.staging_arena.to_device(
+            [observations, actions, next_observations, dones, rewards]))
+        if wait:
+            self.staging_arena.wait(samples)
+        return samples
 
     def _get_samples(self, batch_inds: np.ndarray, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
+        # Observations and rewards normalized by a VecNormalize env go through the pageable path
+        if self.staging_arena is not None and env is None:
+            return self._get_staged_samples(batch_inds)
+
+        # Sample the environment of every transition uniformly
+        env_indices = np.random.randint(0, high=self.n_envs, size=(len(batch_inds),))
 
         if self.optimize_memory_usage:
-            next_obs = self._normalize_obs(self.observations[(batch_inds + 1) % self.buffer_size, 0, :], env)
+            next_obs = self._normalize_obs(self.observations[(batch_inds + 1) % self.buffer_size, env_indices, :], env)
         else:
-            next_obs = self._normalize_obs(self.next_observations[batch_inds, 0, :], env)
+            next_obs = self._normalize_obs(self.next_observations[batch_inds, env_indices, :], env)
 
         data = (
-            self._normalize_obs(self.observations[batch_inds, 0, :], env),
-            self.actions[batch_inds, 0, :],
+            self._normalize_obs(self.observations[batch_inds, env_indices, :], env),
+            self.actions[batch_inds, env_indices, :],
             next_obs,
             # Only use dones that are not due to timeouts
             # deactivated by default (timeouts is initialized as an array of False)
-            self.dones[batch_inds] * (1 - self.timeouts[batch_inds]),
-            self._normalize_reward(self.rewards[batch_inds], env),
+            (self.dones[batch_inds, env_indices] * (1 - self.timeouts[batch_inds, env_indices])).reshape(-1, 1),
+            self._normalize_reward(self.rewards[batch_inds, env_indices].reshape(-1, 1), env),
         )
         return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
 
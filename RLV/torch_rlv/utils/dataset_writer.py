@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+
+META_FILE = "meta.json"
+MANIFEST_FILE = "manifest.json"
+COPY_BLOCK_SIZE = 64 * 1024 * 1024
+
+
+class StreamingDatasetWriter:
+    """
+    Writes a dataset to disk in fixed-size chunks while it is generated.
+    Samples are first added to a per-episode staging buffer, which is either committed to
+    the chunk buffer (``commit_episode()``) or dropped (``discard_episode()``). Full chunks
+    are appended to one raw ``<key>.bin`` file per key and ``meta.json`` is rewritten after
+    every chunk, so the data written up to a crash stays loadable with ``load_dataset``.
+    :param directory: Output directory, created if it does not exist
+    :param chunk_size: Number of samples buffered in memory before they are written to disk
+    """
+
+    def __init__(self, directory: str, chunk_size: int = 1000):
+        assert chunk_size > 0, "The chunk size must be at least one sample"
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+        self.n = 0
+        self.meta = {}
+        self._staging = {}
+        self._chunk = {}
+        self._chunk_pos = 0
+
+        # start from empty files, data of a previous run in the same directory is overwritten
+        for file in os.listdir(directory):
+            if file.endswith(".bin") or file == META_FILE:
+                os.remove(os.path.join(directory, file))
+
+    def add(self, **sample) -> None:
+        """
+        Add one sample to the staging buffer of the current episode.
+        """
+        if not self._staging:
+            self._staging = {key: [] for key in sample}
+        assert sample.keys() == self._staging.keys(), "All samples must contain the same keys"
+        for key, value in sample.items():
+            self._staging[key].append(np.asarray(value))
+
+    def discard_episode(self) -> None:
+        for values in self._staging.values():
+            values.clear()
+
+    def commit_episode(self) -> None:
+        """
+        Move the staged samples of the current episode into the chunk buffer,
+        writing every chunk that gets full to disk.
+        """
+        length = len(next(iter(self._staging.values()), []))
+        if length == 0:
+            return
+        if not self._chunk:
+            self._allocate_chunk()
+
+        start = 0
+        while start < length:
+            size = min(length - start, self.chunk_size - self._chunk_pos)
+            for key, values in self._staging.items():
+                self._chunk[key][self._chunk_pos:self._chunk_pos + size] = values[start:start + size]
+            self._chunk_pos += size
+            start += size
+            if self._chunk_pos == self.chunk_size:
+                self.flush()
+
+        self.discard_episode()
+
+    def _allocate_chunk(self) -> None:
+        for key, values in self._staging.items():
+            sample = values[0]
+            self._chunk[key] = np.empty((self.chunk_size,) + sample.shape, dtype=sample.dtype)
+            self.meta[key] = {"dtype": sample.dtype.str, "shape": list(sample.shape)}
+
+    def flush(self) -> None:
+        """
+        Append the buffered samples to the files of the dataset.
+        """
+        if self._chunk_pos == 0:
+            return
+        for key, chunk in self._chunk.items():
+            with open(os.path.join(self.directory, f"{key}.bin"), "ab") as f:
+                f.write(np.ascontiguousarray(chunk[:self._chunk_pos]).tobytes())
+        self.n += self._chunk_pos
+        self._chunk_pos = 0
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        # written to a temporary file first, so a crash never leaves a truncated meta file
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"n": self.n, "keys": self.meta}, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        """
+        Write the remaining buffered samples. Samples of an uncommitted episode are dropped.
+        """
+        self.flush()
+        self.discard_episode()
+
+
+def load_dataset(directory: str, mmap_mode: Optional[str] = "c") -> Dict[str, np.ndarray]:
+    """
+    Load a dataset written by ``StreamingDatasetWriter``.
+    :param directory: Directory of the dataset
+    :param mmap_mode: Mode of the memory maps (see ``np.memmap``), ``None`` to read the arrays into memory.
+        The default ``'c'`` (copy-on-write) gives writable arrays without touching the files.
+    :return: Dictionary of arrays with the samples along the first axis
+    """
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+
+    n = meta["n"]
+    dataset = {}
+    for key, info in meta["keys"].items():
+        path = os.path.join(directory, f"{key}.bin")
+        shape = (n,) + tuple(info["shape"])
+        dtype = np.dtype(info["dtype"])
+        if n == 0:
+            dataset[key] = np.empty(shape, dtype=dtype)
+        elif mmap_mode is None:
+            dataset[key] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        else:
+            dataset[key] = np.memmap(path, dtype=dtype, mode=mmap_mode, shape=shape)
+    return dataset
+
+
+def merge_datasets(directories: List[str], output_dir: str, remove_shards: bool = True) -> int:
+    """
+    Merge datasets written by several ``StreamingDatasetWriter`` into one dataset.
+    The merged shards are recorded in ``manifest.json`` of the output directory, in merge order.
+    :param directories: Directories of the shards, all shards must contain the same keys
+    :param output_dir: Directory of the merged dataset
+    :param remove_shards: Remove the shard files once they are merged
+    :return: Number of samples of the merged dataset
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shards = []
+    for directory in directories:
+        with open(os.path.join(directory, META_FILE)) as f:
+            shards.append((directory, json.load(f)))
+
+    keys = next((meta["keys"] for _, meta in shards if meta["n"] > 0), {})
+    for key in keys:
+        with open(os.path.join(output_dir, f"{key}.bin"), "wb") as out:
+            for directory, meta in shards:
+                if meta["n"] == 0:
+                    continue
+                assert meta["keys"][key] == keys[key], f"Shard {directory} does not match the layout of '{key}'"
+                # only the first n samples are valid, a crashed writer can leave a partial chunk behind
+                n_bytes = meta["n"] * int(np.prod(keys[key]["shape"], dtype=np.int64)) \
+                    * np.dtype(keys[key]["dtype"]).itemsize
+                with open(os.path.join(directory, f"{key}.bin"), "rb") as f:
+                    while n_bytes > 0:
+                        block = f.read(min(n_bytes, COPY_BLOCK_SIZE))
+                        assert block, f"Shard {directory} has less data than recorded for '{key}'"
+                        out.write(block)
+                        n_bytes -= len(block)
+
+    n = sum(meta["n"] for _, meta in shards)
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump({"shards": [{"directory": directory, "n": meta["n"]} for directory, meta in shards]}, f)
+    with open(os.path.join(output_dir, META_FILE), "w") as f:
+        json.dump({"n": n, "keys": keys}, f)
+
+    if remove_shards:
+        for directory, _ in shards:
+            shutil.rmtree(directory)
+    return n
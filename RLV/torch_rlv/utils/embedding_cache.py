@@ -0,0 +1,91 @@
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import torch as th
+
+
+class EmbeddingCache:
+    """
+    Cache of encoder outputs for a static image dataset, keyed by dataset index.
+    Every entry is stamped with the encoder version it was computed with. The version is
+    advanced with ``step()`` after every encoder update. Entries are recomputed lazily on
+    lookup once they are ``refresh_interval`` encoder updates old, or when the mean staleness
+    of the hits of a lookup exceeds ``staleness_budget``.
+    :param n: Number of images in the dataset
+    :param embedding_dim: Dimension of the encoder output
+    :param device: Device the embeddings are stored on
+    :param refresh_interval: Number of encoder updates after which an entry is recomputed
+    :param staleness_budget: Maximum mean staleness (in encoder updates) of the served hits,
+        ``None`` to only rely on ``refresh_interval``
+    """
+
+    def __init__(
+        self,
+        n: int,
+        embedding_dim: int,
+        device: th.device,
+        refresh_interval: int = 100,
+        staleness_budget: Optional[float] = None,
+    ):
+        assert refresh_interval > 0, "The refresh interval must be at least one encoder update"
+        self.n = n
+        self.refresh_interval = refresh_interval
+        self.staleness_budget = staleness_budget
+        self.device = device
+
+        self.embeddings = th.zeros((n, embedding_dim), dtype=th.float32, device=device)
+        # -1 marks entries that were never computed
+        self.versions = th.full((n,), -1, dtype=th.long, device=device)
+        self.version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self._served_staleness = []
+
+    def step(self) -> None:
+        """
+        Advance the encoder version, to be called after every encoder update.
+        """
+        self.version += 1
+
+    def lookup(self, indices: np.ndarray, encode: Callable[[np.ndarray], th.Tensor]) -> th.Tensor:
+        """
+        :param indices: Dataset indices to get the embeddings of
+        :param encode: Function computing the embeddings of the given dataset indices
+        :return: Embeddings for ``indices``, detached from the encoder graph
+        """
+        indices = th.as_tensor(indices, dtype=th.long, device=self.device)
+        versions = self.versions[indices]
+        staleness = self.version - versions
+        miss = (versions < 0) | (staleness >= self.refresh_interval)
+
+        if self.staleness_budget is not None and not miss.all():
+            if staleness[~miss].float().mean().item() > self.staleness_budget:
+                miss[:] = True
+
+        n_miss = int(miss.sum().item())
+        if n_miss > 0:
+            miss_indices = th.unique(indices[miss])
+            with th.no_grad():
+                self.embeddings[miss_indices] = encode(miss_indices.cpu().numpy()).float()
+            self.versions[miss_indices] = self.version
+
+        self.misses += n_miss
+        self.hits += len(indices) - n_miss
+        self._served_staleness.append((self.version - self.versions[indices]).float().mean().item())
+
+        return self.embeddings[indices]
+
+    def get_diagnostics(self) -> Dict[str, float]:
+        """
+        Hit rate and mean staleness of the served embeddings since the last call.
+        """
+        lookups = self.hits + self.misses
+        diagnostics = {
+            "embedding_cache_hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "embedding_cache_staleness": np.mean(self._served_staleness) if self._served_staleness else 0.0,
+            "embedding_cache_filled": (self.versions >= 0).float().mean().item(),
+        }
+        self.hits, self.misses = 0, 0
+        self._served_staleness = []
+        return diagnostics
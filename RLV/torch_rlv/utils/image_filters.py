@@ -0,0 +1,115 @@
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch as th
+from torch.nn import functional as F
+
+# e.g. {'type': 'tint', 'kwargs': {'color': (0, 0, 255), 'alpha': 0.2}}
+FilterSpec = Dict[str, Any]
+
+# the domain shift of the visual pusher dataset, same result as the red cv2.addWeighted overlay
+RED_TINT = [{"type": "tint", "kwargs": {"color": (0, 0, 255), "alpha": 0.2}}]
+
+
+def _gaussian_kernel(kernel_size: int, sigma: float, device: th.device) -> th.Tensor:
+    if sigma <= 0:
+        # same default as cv2.getGaussianKernel
+        sigma = 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
+    x = th.arange(kernel_size, dtype=th.float32, device=device) - (kernel_size - 1) / 2
+    kernel = th.exp(-(x ** 2) / (2 * sigma ** 2))
+    return kernel / kernel.sum()
+
+
+def _tint(images: th.Tensor, color: Sequence[float] = (0, 0, 255), alpha: float = 0.2, generator=None) -> th.Tensor:
+    color = th.as_tensor(color, dtype=th.float32, device=images.device).view(1, -1, 1, 1)
+    return images * (1 - alpha) + color * alpha
+
+
+def _blur(images: th.Tensor, kernel_size: int = 5, sigma: float = 0, generator=None) -> th.Tensor:
+    channels = images.shape[1]
+    kernel = _gaussian_kernel(kernel_size, sigma, images.device)
+    radius = kernel_size // 2
+    images = F.pad(images, (radius, radius, radius, radius), mode="reflect")
+    # separable: one depthwise pass over the rows, one over the columns
+    images = F.conv2d(images, kernel.view(1, 1, -1, 1).repeat(channels, 1, 1, 1), groups=channels)
+    return F.conv2d(images, kernel.view(1, 1, 1, -1).repeat(channels, 1, 1, 1), groups=channels)
+
+
+def _swap_channels(images: th.Tensor, order: Sequence[int] = (2, 1, 0), generator=None) -> th.Tensor:
+    return images[:, list(order)]
+
+
+def _random_crop(images: th.Tensor, pad: int = 4, generator=None) -> th.Tensor:
+    n, _, height, width = images.shape
+    padded = F.pad(images, (pad, pad, pad, pad))
+    offsets = th.randint(0, 2 * pad + 1, (n, 2), generator=generator).to(images.device)
+    rows = offsets[:, 0, None] + th.arange(height, device=images.device)
+    cols = offsets[:, 1, None] + th.arange(width, device=images.device)
+    batch = th.arange(n, device=images.device)[:, None, None]
+    # advanced indexing moves the channel axis to the back
+    cropped = padded.permute(0, 2, 3, 1)[batch, rows[:, :, None], cols[:, None, :]]
+    return cropped.permute(0, 3, 1, 2)
+
+
+FILTER_FUNCTIONS = {
+    "tint": _tint,
+    "blur": _blur,
+    "swap_channels": _swap_channels,
+    "random_crop": _random_crop,
+}
+
+
+def apply_filters(
+    images: Union[np.ndarray, th.Tensor],
+    filters: Optional[List[FilterSpec]],
+    channels_first: bool = False,
+    generator: Optional[th.Generator] = None,
+) -> Union[np.ndarray, th.Tensor]:
+    """
+    Apply image filters (tint, blur, channel swap, random crop) to a whole batch of images in one pass.
+    Works on numpy arrays (offline, e.g. on datasets) and on torch tensors on any device (online, on training batches).
+    Intermediate results are float32, the result is rounded and cast back to the input dtype once.
+    :param images: Batch of images of shape (N, H, W, C), or (N, C, H, W) with ``channels_first``
+    :param filters: List of filter specs ``{'type': ..., 'kwargs': {...}}``, applied in order
+    :param channels_first: Whether the channel axis of ``images`` comes before the spatial axes
+    :param generator: Random number generator of the random filters
+    :return: Filtered images of the same type, shape and dtype as ``images``
+    """
+    if not filters:
+        return images
+
+    is_numpy = isinstance(images, np.ndarray)
+    tensor = th.from_numpy(images) if is_numpy else images
+    result = tensor.float()
+    if not channels_first:
+        result = result.permute(0, 3, 1, 2)
+
+    for image_filter in filters:
+        result = FILTER_FUNCTIONS[image_filter["type"]](result, generator=generator, **image_filter.get("kwargs", {}))
+
+    if not channels_first:
+        result = result.permute(0, 2, 3, 1)
+    if not tensor.dtype.is_floating_point:
+        info = th.iinfo(tensor.dtype)
+        result = result.round().clamp(info.min, info.max)
+    result = result.to(tensor.dtype).contiguous()
+    return result.numpy() if is_numpy else result
+
+
+def apply_filters_in_chunks(
+    images: np.ndarray,
+    filters: Optional[List[FilterSpec]],
+    chunk_size: int = 10000,
+    out: Optional[np.ndarray] = None,
+    channels_first: bool = False,
+) -> np.ndarray:
+    """
+    Apply ``filters`` to a large (e.g. memory mapped) dataset chunk by chunk.
+    :param out: Output array, can be ``images`` itself to filter in place
+    """
+    out = np.empty_like(images) if out is None else out
+    for start in range(0, len(images), chunk_size):
+        out[start:start + chunk_size] = apply_filters(
+            np.ascontiguousarray(images[start:start + chunk_size]), filters, channels_first=channels_first
+        )
+    return out
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch as th
+from torch.nn import functional as F
+
+CHANNEL_LAYOUTS = ("reshape", "transpose")
+PREPROCESSED_DIR = "preprocessed"
+
+
+class ImagePreprocessor:
+    """
+    Crops, resizes and converts the images of a dataset to channels first once, when the dataset is loaded.
+    A lower resolution cuts the FLOPs of the encoder and the memory of the image datasets.
+    The preprocessed images are cached on disk, keyed by the source dataset and the preprocessing parameters,
+    and memory mapped by the following runs.
+    :param image_shape: ``(height, width, channels)`` of the stored images
+    :param crop: ``(top, bottom, left, right)`` bounds of the kept region of the channels first image,
+        ``None`` keeps the whole image
+    :param resolution: ``(height, width)`` or side length of the resized images, ``None`` keeps the cropped size
+    :param channel_layout: How the stored channels last images are made channels first. ``'reshape'`` reshapes
+        the images to ``(channels, height, width)`` like the dataset adapters always did, ``'transpose'`` moves
+        the channel axis to the front.
+    :param cache_dir: Directory of the preprocessed images, ``None`` caches them in a ``preprocessed`` directory
+        next to the source dataset
+    """
+
+    def __init__(
+        self,
+        image_shape: Tuple[int, int, int] = (120, 120, 3),
+        crop: Optional[Sequence[int]] = None,
+        resolution: Optional[Union[int, Sequence[int]]] = None,
+        channel_layout: str = "reshape",
+        cache_dir: Optional[str] = None,
+    ):
+        if channel_layout not in CHANNEL_LAYOUTS:
+            raise ValueError(f"Unknown channel layout '{channel_layout}', expected one of {list(CHANNEL_LAYOUTS)}")
+        if isinstance(resolution, int):
+            resolution = (resolution, resolution)
+        self.image_shape = tuple(image_shape)
+        self.crop = tuple(crop) if crop is not None else None
+        self.resolution = tuple(resolution) if resolution is not None else None
+        self.channel_layout = channel_layout
+        self.cache_dir = cache_dir
+
+    @property
+    def output_shape(self) -> Tuple[int, int, int]:
+        """
+        :return: ``(channels, height, width)`` of the preprocessed images
+        """
+        height, width, channels = self.image_shape
+        if self.crop is not None:
+            top, bottom, left, right = self.crop
+            height, width = bottom - top, right - left
+        if self.resolution is not None:
+            height, width = self.resolution
+        return channels, height, width
+
+    @property
+    def is_identity(self) -> bool:
+        return self.crop is None and self.resolution is None and self.channel_layout == "reshape"
+
+    def _preprocess_chunk(self, images: np.ndarray) -> np.ndarray:
+        n = len(images)
+        images = images.reshape((n,) + self.image_shape)
+        if self.channel_layout == "reshape":
+            images = images.reshape((n, self.image_shape[2]) + self.image_shape[:2])
+        else:
+            images = images.transpose(0, 3, 1, 2)
+
+        if self.crop is not None:
+            top, bottom, left, right = self.crop
+            images = images[:, :, top:bottom, left:right]
+
+        if self.resolution is not None:
+            # area interpolation averages the pixels of every output pixel, no aliasing when downsampling
+            result = F.interpolate(th.from_numpy(np.ascontiguousarray(images)).float(), size=self.resolution,
+                                   mode="area")
+            if not np.issubdtype(images.dtype, np.floating):
+                info = np.iinfo(images.dtype)
+                result = result.round().clamp(info.min, info.max)
+            images = result.numpy().astype(images.dtype)
+        return np.ascontiguousarray(images)
+
+    def _cache_path(self, source: str, name: str, dtype: np.dtype) -> str:
+        # a dataset streamed to disk by the DatasetCreator is a directory, its meta file changes with every chunk
+        stat = os.stat(os.path.join(source, "meta.json") if os.path.isdir(source) else source)
+        description = json.dumps({
+            "source": os.path.abspath(source),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "name": name,
+            "dtype": np.dtype(dtype).str,
+            "image_shape": self.image_shape,
+            "crop": self.crop,
+            "resolution": self.resolution,
+            "channel_layout": self.channel_layout,
+        }, sort_keys=True)
+        key = hashlib.sha1(description.encode()).hexdigest()[:16]
+        cache_dir = self.cache_dir or os.path.join(os.path.dirname(os.path.abspath(source)), PREPROCESSED_DIR)
+        return os.path.join(cache_dir, f"{name}-{key}.npy")
+
+    def __call__(self, images: np.ndarray, source: Optional[str] = None, name: str = "images",
+                 chunk_size: int = 10000) -> np.ndarray:
+        """
+        :param images: Stored images, ``height * width * channels`` values per image
+        :param source: Path of the dataset the images are loaded from, ``None`` to not cache the result
+        :param name: Name of the images in the dataset, part of the cache key
+        :param chunk_size: Number of images preprocessed at once
+        :return: Preprocessed images of shape ``(n, *output_shape)``, memory mapped when cached
+        """
+        if self.is_identity:
+            return np.reshape(images, (len(images),) + self.output_shape)
+        if source is None:
+            return self._preprocess_chunk(np.asarray(images))
+
+        path = self._cache_path(source, name, images.dtype)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written to a temporary file first, so concurrent runs never load a partially written cache
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+            os.close(fd)
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=images.dtype,
+                                            shape=(len(images),) + self.output_shape)
+            for start in range(0, len(images), chunk_size):
+                out[start:start + chunk_size] = self._preprocess_chunk(np.asarray(images[start:start + chunk_size]))
+            out.flush()
+            del out
+            os.replace(tmp_path, path)
+        # copy-on-write like the memory mapped datasets, the arrays are writable without touching the cache
+        return np.load(path, mmap_mode="c")
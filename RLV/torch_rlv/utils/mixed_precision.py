@@ -0,0 +1,65 @@
+from contextlib import nullcontext
+from typing import Optional, Union
+
+import torch as th
+
+AUTOCAST_DTYPES = {
+    None: None,
+    False: None,
+    "fp32": None,
+    "bf16": th.bfloat16,
+    "fp16": th.float16,
+}
+
+# ``th.autocast`` with a device type and a dtype, and with it bf16 and CPU autocast, only exists from torch 1.10,
+# which the requirements pin. Older installs only have the fp16 ``th.cuda.amp.autocast``
+HAS_DEVICE_AUTOCAST = hasattr(th, "autocast")
+
+
+class MixedPrecision:
+    """
+    Autocast and gradient scaling shared by the SAC/RLV updates.
+    Forward passes run inside ``autocast()``, losses are back-propagated with ``backward()``
+    and optimizers are stepped through ``step()``. ``update()`` has to be called once per
+    gradient step, after all the optimizers of that step have been stepped.
+    :param mode: ``None``/``'fp32'`` to disable autocast, ``'bf16'`` or ``'fp16'``.
+        ``'fp16'`` requires a CUDA device. ``'bf16'`` runs on CUDA and on CPU.
+    :param device: Device the networks are trained on
+    """
+
+    def __init__(self, mode: Optional[Union[str, bool]] = None, device: Union[th.device, str] = "cpu"):
+        if mode not in AUTOCAST_DTYPES:
+            raise ValueError(f"Unknown mixed precision mode '{mode}', expected one of {list(AUTOCAST_DTYPES)}")
+
+        self.mode = mode
+        self.device_type = th.device(device).type
+        self.dtype = AUTOCAST_DTYPES[mode]
+        self.enabled = self.dtype is not None
+
+        if self.dtype == th.float16 and self.device_type != "cuda":
+            raise ValueError("fp16 autocast is only supported on CUDA devices")
+        if self.dtype == th.bfloat16 and not HAS_DEVICE_AUTOCAST:
+            raise ValueError(f"bf16 autocast requires torch >= 1.10, found {th.__version__}, use 'fp16' on CUDA instead")
+
+        # bf16 has the exponent range of fp32, loss scaling is only needed for fp16
+        self.scaler = th.cuda.amp.GradScaler(enabled=self.dtype == th.float16)
+
+    def autocast(self):
+        """
+        :return: context manager running the enclosed forward passes in reduced precision
+        """
+        if not self.enabled:
+            return nullcontext()
+        if not HAS_DEVICE_AUTOCAST:
+            # only fp16 on CUDA gets past the checks of the constructor
+            return th.cuda.amp.autocast()
+        return th.autocast(device_type=self.device_type, dtype=self.dtype)
+
+    def backward(self, loss: th.Tensor, **kwargs) -> None:
+        self.scaler.scale(loss).backward(**kwargs)
+
+    def step(self, optimizer: th.optim.Optimizer) -> None:
+        self.scaler.step(optimizer)
+
+    def update(self) -> None:
+        self.scaler.update()
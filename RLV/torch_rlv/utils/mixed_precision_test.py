@@ -0,0 +1,23 @@
+import gym
+import pytest
+import torch as th
+
+from RLV.torch_rlv.algorithms.sac.sac import SAC
+from RLV.torch_rlv.utils.mixed_precision import HAS_DEVICE_AUTOCAST
+
+
+@pytest.mark.skipif(not HAS_DEVICE_AUTOCAST, reason="bf16 autocast requires torch >= 1.10")
+def test_sac_bf16_update_on_cpu():
+    model = SAC("MlpPolicy", gym.make("Pendulum-v0"), env_name="Pendulum-v0", total_steps=32, learning_starts=16,
+                batch_size=8, policy_kwargs=dict(net_arch=[16, 16]), device="cpu", seed=0, mixed_precision="bf16")
+    actor_parameters = [parameter.detach().clone() for parameter in model.actor.parameters()]
+    critic_parameters = [parameter.detach().clone() for parameter in model.critic.parameters()]
+
+    model.learn(total_timesteps=32)
+
+    assert model._n_updates > 0
+    for old, new in ((actor_parameters, model.actor.parameters()), (critic_parameters, model.critic.parameters())):
+        new = [parameter.detach() for parameter in new]
+        # the parameters stay in fp32, only the forward passes are autocast
+        assert all(parameter.dtype == th.float32 and th.isfinite(parameter).all() for parameter in new)
+        assert any(not th.equal(old_parameter, parameter) for old_parameter, parameter in zip(old, new))
@@ -0,0 +1,76 @@
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+import torch as th
+
+from stable_baselines3.common.utils import get_device
+
+
+class PinnedStagingArena:
+    """
+    Page-locked host buffers that sampled batches are gathered into, and copied to the GPU from with
+    ``non_blocking=True`` on a side CUDA stream. The copies don't block the host and can overlap with the
+    kernels of the previous batch.
+    The buffers are reused round robin over ``num_slots`` slots, a slot is only written again once its
+    previous copy has finished.
+    On a CPU device there is nothing to transfer: every batch gets fresh (pageable) arrays that are
+    converted with ``th.as_tensor`` without copying.
+    :param device: Device the batches are transferred to
+    :param num_slots: Number of batches that can be in flight at once
+    """
+
+    def __init__(self, device: Union[th.device, str] = "cpu", num_slots: int = 2):
+        self.device = get_device(device)
+        self.enabled = self.device.type == "cuda"
+        self.num_slots = num_slots
+        self.stream = th.cuda.Stream(device=self.device) if self.enabled else None
+
+        self._host_buffers = [[] for _ in range(num_slots)]
+        self._copy_done = [None] * num_slots
+        self._slot = 0
+
+    def host_buffers(self, specs: Sequence[Tuple[Tuple[int, ...], np.dtype]]) -> List[np.ndarray]:
+        """
+        Move to the next slot and return its host buffers, to gather the fields of a batch into.
+        :param specs: Shape and dtype of every field of the batch
+        :return: One array per field, backed by pinned memory on a CUDA device
+        """
+        if not self.enabled:
+            return [np.empty(shape, dtype=dtype) for shape, dtype in specs]
+
+        self._slot = (self._slot + 1) % self.num_slots
+        if self._copy_done[self._slot] is not None:
+            # the previous copy out of the slot has to finish before the slot is overwritten
+            self._copy_done[self._slot].synchronize()
+
+        buffers = self._host_buffers[self._slot]
+        if [(buffer.shape, buffer.dtype) for buffer in buffers] != [(tuple(shape), np.dtype(dtype))
+                                                                    for shape, dtype in specs]:
+            buffers[:] = [th.from_numpy(np.empty(shape, dtype=dtype)).pin_memory().numpy() for shape, dtype in specs]
+        return buffers
+
+    def to_device(self, arrays: Sequence[np.ndarray]) -> List[th.Tensor]:
+        """
+        Start the transfer of the host buffers of the current slot to the device.
+        The tensors may only be used once ``wait`` has been called on them.
+        """
+        if not self.enabled:
+            return [th.as_tensor(array) for array in arrays]
+
+        with th.cuda.stream(self.stream):
+            tensors = [th.from_numpy(array).to(self.device, non_blocking=True) for array in arrays]
+            self._copy_done[self._slot] = th.cuda.Event()
+            self._copy_done[self._slot].record(self.stream)
+        return tensors
+
+    def wait(self, tensors: Sequence[th.Tensor]) -> None:
+        """
+        Make the current stream wait for the transfer of ``tensors``, before it uses them.
+        """
+        if not self.enabled:
+            return
+        current_stream = th.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.stream)
+        for tensor in tensors:
+            # the memory was allocated on the side stream, it mustn't be reused before the current stream is done
+            tensor.record_stream(current_stream)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import torch as th
+
+SEED_POLICIES = ("shared", "per_seed")
+
+
+def hash_arrays(arrays: Sequence[Union[th.Tensor, np.ndarray]]) -> str:
+    """
+    :param arrays: Tensors or arrays of a dataset
+    :return: sha256 of the shapes, dtypes and contents of ``arrays``
+    """
+    digest = hashlib.sha256()
+    for array in arrays:
+        if isinstance(array, th.Tensor):
+            array = array.detach().cpu().contiguous().numpy()
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype}".encode())
+        digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+class WarmupCache:
+    """
+    Content addressed cache of warmed up weights. An entry is keyed by the hash of the warmup
+    datasets, the architecture of the warmed up modules, the warmup hyperparameters and, depending
+    on the seed policy, the seed. Runs that would repeat an identical warmup load the cached state
+    dicts of the modules and optimizers instead.
+    :param cache_dir: Directory the entries are stored in
+    :param seed_policy: ``'shared'`` to reuse one warm start for all seeds, ``'per_seed'`` to warm
+        up every seed separately
+    """
+
+    def __init__(self, cache_dir: str, seed_policy: str = "shared"):
+        if seed_policy not in SEED_POLICIES:
+            raise ValueError(f"Unknown seed policy '{seed_policy}', expected one of {list(SEED_POLICIES)}")
+        self.cache_dir = cache_dir
+        self.seed_policy = seed_policy
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # hashing the datasets is the expensive part of a key, every dataset is only hashed once
+        self._dataset_hashes = {}
+
+    def key(
+        self,
+        name: str,
+        datasets: Dict[str, Sequence[Union[th.Tensor, np.ndarray]]],
+        modules: Dict[str, Any],
+        hyperparameters: Dict[str, Any],
+        seed: Optional[int] = None,
+    ) -> str:
+        """
+        :param name: Name of the warmup phase, e.g. ``'encoder'``
+        :param datasets: Arrays of every dataset the warmup samples from, by dataset name
+        :param modules: Modules and optimizers that are warmed up, by attribute name
+        :param hyperparameters: JSON serializable warmup hyperparameters
+        :param seed: Seed of the run, only part of the key for the ``'per_seed'`` policy
+        :return: Key of the cache entry
+        """
+        for dataset_name, arrays in datasets.items():
+            if dataset_name not in self._dataset_hashes:
+                self._dataset_hashes[dataset_name] = hash_arrays(arrays)
+
+        description = {
+            "name": name,
+            "datasets": {dataset_name: self._dataset_hashes[dataset_name] for dataset_name in datasets},
+            "architecture": {
+                module_name: repr(module) if isinstance(module, (th.nn.Module, th.optim.Optimizer))
+                else type(module).__name__
+                for module_name, module in modules.items()
+            },
+            "hyperparameters": hyperparameters,
+            "seed": seed if self.seed_policy == "per_seed" else None,
+        }
+        description = json.dumps(description, sort_keys=True, default=str)
+        return f"{name}-{hashlib.sha256(description.encode()).hexdigest()[:32]}"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def load(self, key: str, modules: Dict[str, Any], device: Union[th.device, str] = "cpu") -> bool:
+        """
+        Load the state dicts of a cache entry into ``modules``.
+        :return: Whether the entry exists
+        """
+        if not os.path.exists(self.path(key)):
+            return False
+        state_dicts = th.load(self.path(key), map_location=device)
+        for module_name, module in modules.items():
+            module.load_state_dict(state_dicts[module_name])
+        return True
+
+    def save(self, key: str, modules: Dict[str, Any]) -> None:
+        """
+        Store the state dicts of ``modules`` under ``key``. The entry is written to a temporary
+        file first, so concurrent runs of a sweep never load a partially written entry.
+        """
+        state_dicts = {module_name: module.state_dict() for module_name, module in modules.items()}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            th.save(state_dicts, f)
+        os.replace(tmp_path, self.path(key))
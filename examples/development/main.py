@@ -15,6 +15,7 @@ from rl_with_videos.samplers.utils import get_sampler_from_variant
 from rl_with_videos.value_functions.utils import get_Q_function_from_variant
 
 from rl_with_videos.misc.utils import set_seed, initialize_tf_variables
+from rl_with_videos.utils.profiler import Profiler
 from examples.instrument import run_example_local
 
 
@@ -31,6 +32,10 @@ class ExperimentRunner(tune.Trainable):
 
         self.train_generator = None
         self._built = False
+        # Checkpoints are saved after the diagnostics of their epoch were
+        # reported, they are timed apart from the algorithm's phases and
+        # reported with the next epoch under `checkpoint/`.
+        self._checkpoint_profiler = Profiler()
 
     def _stop(self):
         tf.reset_default_graph()
@@ -80,6 +85,10 @@ class ExperimentRunner(tune.Trainable):
             self.train_generator = self.algorithm.train()
 
         diagnostics = next(self.train_generator)
+        checkpoint_diagnostics = self._checkpoint_profiler.get_diagnostics()
+        diagnostics.update(
+            (f'checkpoint/{key}', value)
+            for key, value in checkpoint_diagnostics.items())
 
         return diagnostics
 
@@ -122,18 +131,20 @@ class ExperimentRunner(tune.Trainable):
             `tf.train.Checkpoint` and `pickle.dump` in very unorganized way
             which makes things not so usable.
         """
-        pickle_path = self._pickle_path(checkpoint_dir)
-        with open(pickle_path, 'wb') as f:
-            pickle.dump(self.picklables, f)
+        with self._checkpoint_profiler.phase('save'):
+            pickle_path = self._pickle_path(checkpoint_dir)
+            with open(pickle_path, 'wb') as f:
+                pickle.dump(self.picklables, f)
 
-        if self._variant['run_params'].get('checkpoint_replay_pool', False):
-            self._save_replay_pool(checkpoint_dir)
+            if self._variant['run_params'].get(
+                    'checkpoint_replay_pool', False):
+                self._save_replay_pool(checkpoint_dir)
 
-        tf_checkpoint = self._get_tf_checkpoint()
+            tf_checkpoint = self._get_tf_checkpoint()
 
-        tf_checkpoint.save(
-            file_prefix=self._tf_checkpoint_prefix(checkpoint_dir),
-            session=self._session)
+            tf_checkpoint.save(
+                file_prefix=self._tf_checkpoint_prefix(checkpoint_dir),
+                session=self._session)
 
         return os.path.join(checkpoint_dir, '')
 
@@ -237,6 +237,7 @@ def get_variant_spec_base(universe, domain, task, policy, algorithm):
                     {
                         'SimpleReplayPool': int(1e6),
                         'TrajectoryReplayPool': int(1e4),
+                        'FlatTrajectoryReplayPool': int(1e4),
                     }.get(
                         spec.get('config', spec)
                         ['replay_pool_params']
@@ -321,4 +322,8 @@ def get_variant_spec(args):
         variant_spec['run_params']['checkpoint_replay_pool'] = (
             args.checkpoint_replay_pool)
 
+    if args.policy_inference == 'numpy':
+        variant_spec['policy_params']['inference'] = 'numpy'
+        variant_spec['sampler_params']['type'] = 'RemoteSampler'
+
     return variant_spec
@@ -1,6 +1,7 @@
 import os
 import copy
 import glob
+import hashlib
 import pickle
 import sys
 
@@ -23,16 +24,51 @@ from rl_with_videos.misc.utils import set_seed, initialize_tf_variables
 from examples.instrument import run_example_local
 from examples.development.main import ExperimentRunner
 
+
+STATIC_POOLS = ('action_free_replay_pool', 'paired_data_pool')
+FINGERPRINT_BLOCK_SIZE = 1 << 20
+FINGERPRINT_NUM_BLOCKS = 16
+
+
+def _file_fingerprint(path):
+    """Hash the size and a few evenly spaced blocks of a (large) file.
+
+    Cheap enough to run on every checkpoint, while still catching a dataset
+    that was replaced or truncated between a save and a restore.
+    """
+    size = os.path.getsize(path)
+    fingerprint = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        for i in range(FINGERPRINT_NUM_BLOCKS):
+            f.seek(size * i // FINGERPRINT_NUM_BLOCKS)
+            fingerprint.update(f.read(FINGERPRINT_BLOCK_SIZE))
+
+    return fingerprint.hexdigest()
+
+
 class ExperimentRunnerRL(ExperimentRunner):
 
     def _build(self):
         variant = copy.deepcopy(self._variant)
 
-
         training_environment = self.training_environment = (
             get_goal_example_environment_from_variant(variant))
         evaluation_environment = self.evaluation_environment = (
             get_goal_example_environment_from_variant(variant))
+        sampler = self.sampler = get_sampler_from_variant(variant)
+
+        self._build_algorithm(variant)
+
+        initialize_tf_variables(self._session, only_uninitialized=True)
+
+        self._built = True
+
+    def _build_algorithm(self, variant):
+        """Build the pools, networks and algorithm on top of the environments
+        and sampler of the runner."""
+        training_environment = self.training_environment
+        sampler = self.sampler
+        shared_preprocessor = None
 
         if self._variant['shared_preprocessor']['use']:
             print("shared preprocessor:", variant['shared_preprocessor'])
@@ -47,7 +83,6 @@ class ExperimentRunnerRL(ExperimentRunner):
         print("\n\n\n\nFinished env/shared preprocessor setup\n\n\n")
         replay_pool = self.replay_pool = (
             get_replay_pool_from_variant(variant, training_environment))
-        sampler = self.sampler = get_sampler_from_variant(variant)
         Qs = self.Qs = get_Q_function_from_variant(variant, training_environment)
         policy = self.policy = get_policy_from_variant(variant, training_environment, Qs)
         initial_exploration_policy = self.initial_exploration_policy = (
@@ -81,9 +116,29 @@ class ExperimentRunnerRL(ExperimentRunner):
 
         self.algorithm = get_algorithm_from_variant(**algorithm_kwargs)
 
-        initialize_tf_variables(self._session, only_uninitialized=True)
-
-        self._built = True
+    def _static_pool_references(self):
+        """Reference the offline datasets instead of copying them into the
+        checkpoint. They are reloaded from `data_path` on restore."""
+        references = {}
+        for name in STATIC_POOLS:
+            if self._variant.get(name) is None:
+                continue
+            data_path = (
+                self._variant[name]['replay_pool_params']['kwargs']['data_path'])
+            references[name] = {
+                'data_path': data_path,
+                'fingerprint': _file_fingerprint(data_path),
+            }
+
+        return references
+
+    def _check_static_pool_references(self, references):
+        for name, reference in references.items():
+            fingerprint = _file_fingerprint(reference['data_path'])
+            if fingerprint != reference['fingerprint']:
+                raise ValueError(
+                    f"The data of '{name}' at {reference['data_path']} changed"
+                    " since the checkpoint was saved.")
 
     def _restore(self, checkpoint_dir):
         assert isinstance(checkpoint_dir, str), checkpoint_dir
@@ -100,6 +155,9 @@ class ExperimentRunnerRL(ExperimentRunner):
         evaluation_environment = self.evaluation_environment = picklable[
             'evaluation_environment']
 
+        if self._variant['algorithm_params']['type'] in ['RLV']:
+            return self._restore_rlv(checkpoint_dir, picklable)
+
         replay_pool = self.replay_pool = (
             get_replay_pool_from_variant(self._variant, training_environment))
 
@@ -127,12 +185,6 @@ class ExperimentRunnerRL(ExperimentRunner):
             'session': self._session,
         }
 
-
-        print("algorithm type:", self._variant['algorithm_params']['type'])
-        if self._variant['algorithm_params']['type'] in ['RLV']:
-            print("does not currently restore inverse model or action free replay pool")
-            raise NotImplementedError
-
         self.algorithm = get_algorithm_from_variant(**algorithm_kwargs)
         self.algorithm.__setstate__(picklable['algorithm'].__getstate__())
 
@@ -149,6 +201,37 @@ class ExperimentRunnerRL(ExperimentRunner):
 
         self._built = True
 
+    def _restore_rlv(self, checkpoint_dir, picklable):
+        """Restore RLV by rebuilding its graph from the variant.
+
+        The networks share the preprocessor, which would be duplicated by
+        unpickling them one by one. Instead, the Qs, target Qs, inverse model,
+        domain shift discriminator, shared preprocessor and all optimizer
+        slots come from the tensorflow checkpoint (see `RLV.tf_saveables`),
+        the static pools are reloaded from their data paths and only the
+        interaction pool is restored from the checkpointed experience.
+        """
+        self._check_static_pool_references(picklable['static_pools'])
+
+        self.sampler = picklable['sampler']
+        self._build_algorithm(copy.deepcopy(self._variant))
+
+        if self._variant['run_params'].get('checkpoint_replay_pool', False):
+            self._restore_replay_pool(checkpoint_dir)
+
+        self.algorithm.__setstate__(picklable['algorithm'].__getstate__())
+
+        tf_checkpoint = self._get_tf_checkpoint()
+        status = tf_checkpoint.restore(tf.train.latest_checkpoint(
+            os.path.split(self._tf_checkpoint_prefix(checkpoint_dir))[0]))
+
+        status.assert_consumed().run_restore_ops(self._session)
+        initialize_tf_variables(self._session, only_uninitialized=True)
+
+        self.policy.set_weights(picklable['policy_weights'])
+
+        self._built = True
+
     @property
     def picklables(self):
         picklables = {
@@ -161,6 +244,9 @@ class ExperimentRunnerRL(ExperimentRunner):
             'policy_weights': self.policy.get_weights(),
         }
 
+        if self._variant['algorithm_params']['type'] in ['RLV']:
+            picklables['static_pools'] = self._static_pool_references()
+
         return picklables
 
 def main(argv=None):
@@ -274,12 +274,58 @@ def get_parser(allow_policy_list=False):
         default=0.1,
         )
 
+    parser.add_argument(
+        "--share_datasets",
+        action="store_true",
+        help="Attach the action-free and paired datasets read-only from shared memory, one copy per node. A dataset"
+             " that changed on disk replaces its older copy, DatasetRegistry().clear() removes all of them.")
+
+    parser.add_argument(
+        "--relabel_interval",
+        type=int,
+        default=None,
+        help="Infer the actions of the whole action-free pool every this many training steps instead of every batch.")
+
+    parser.add_argument(
+        "--relabel_batch_size",
+        type=int,
+        default=4096,
+        help="Number of action-free samples labeled per session call of a relabel pass.")
+
+    parser.add_argument(
+        "--relabel_in_background",
+        action="store_true",
+        help="Relabel the action-free pool in a background thread.")
+
     parser.add_argument(
         "--n_train_repeat",
         type=int,
         default=1
         )
 
+    parser.add_argument(
+        "--fused_train_steps",
+        type=int,
+        default=1,
+        help="Number of training steps run in one session call.")
+
+    parser.add_argument(
+        "--eval_n_workers",
+        type=int,
+        default=0,
+        help="Number of ray actors for the evaluation rollouts, 0 evaluates in the training process.")
+
+    parser.add_argument(
+        "--eval_async",
+        action="store_true",
+        help="Overlap the evaluation of an epoch with the training of the next one.")
+
+    parser.add_argument(
+        "--profile_trace_path",
+        type=str,
+        default=None,
+        help="Write the profiled training phases to this Chrome trace file.")
+
     parser.add_argument(
         '--algorithm',
         type=str,
@@ -176,6 +176,7 @@ def get_variant_spec(args):
                     'remove_rewards': args.remove_rewards,
                     'max_demo_length': args.max_demo_length,
                     'use_ground_truth_actions': args.use_ground_truth_actions,
+                    'shared_memory': args.share_datasets,
                 }
             }
         }
@@ -189,6 +190,7 @@ def get_variant_spec(args):
                             'remove_rewards': True,
                             'max_demo_length': args.max_demo_length,
                             'use_ground_truth_actions': False,
+                            'shared_memory': args.share_datasets,
                         }
                     }
                 }
@@ -212,6 +214,9 @@ def get_variant_spec(args):
             variant_spec['algorithm_params']['kwargs']['domain_shift'] = args.domain_shift
             variant_spec['algorithm_params']['kwargs']['domain_shift_generator_weight'] = args.domain_shift_generator_weight
             variant_spec['algorithm_params']['kwargs']['domain_shift_discriminator_weight'] = args.domain_shift_discriminator_weight
+            variant_spec['algorithm_params']['kwargs']['relabel_interval'] = args.relabel_interval
+            variant_spec['algorithm_params']['kwargs']['relabel_batch_size'] = args.relabel_batch_size
+            variant_spec['algorithm_params']['kwargs']['relabel_in_background'] = args.relabel_in_background
 
 
 
@@ -221,6 +226,10 @@ def get_variant_spec(args):
     variant_spec['algorithm_params']['kwargs']['should_augment'] = False
     variant_spec['algorithm_params']['kwargs']['trans_dist'] = args.trans_dist
     variant_spec['algorithm_params']['kwargs']['n_train_repeat'] = args.n_train_repeat
+    variant_spec['algorithm_params']['kwargs']['fused_train_steps'] = args.fused_train_steps
+    variant_spec['algorithm_params']['kwargs']['eval_n_workers'] = args.eval_n_workers
+    variant_spec['algorithm_params']['kwargs']['eval_async'] = args.eval_async
+    variant_spec['algorithm_params']['kwargs']['profile_trace_path'] = args.profile_trace_path
 
 
     if 'Image48' in task:
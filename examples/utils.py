@@ -202,6 +202,15 @@ def get_parser(allow_policy_list=False):
             choices=('gaussian', ),
             default='gaussian')
 
+    parser.add_argument(
+        '--policy-inference',
+        type=str,
+        choices=('tensorflow', 'numpy'),
+        default='tensorflow',
+        help=("How the rollouts evaluate the policy. 'numpy' collects the"
+              " samples with a RemoteSampler running a tensorflow-free"
+              " copy of the policy."))
+
     parser.add_argument(
         '--exp-name',
         type=str,
@@ -1 +1,6 @@
-from .sac import SAC
+def __getattr__(name):
+    # SAC pulls in TensorFlow, it is only imported once it is used
+    if name == 'SAC':
+        from .sac import SAC
+        return SAC
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -10,7 +10,9 @@ from tensorflow.python.training import training_util
 import numpy as np
 
 from rl_with_videos.samplers import rollouts
+from rl_with_videos.samplers.remote_evaluator import RemoteEvaluator
 from rl_with_videos.misc.utils import save_video
+from rl_with_videos.utils.profiler import Profiler
 
 
 class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
@@ -33,8 +35,11 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
             eval_n_episodes=10,
             eval_deterministic=True,
             eval_render_mode=None,
+            eval_n_workers=0,
+            eval_async=False,
             video_save_frequency=0,
             path_save_frequency=0,
+            profile_trace_path=None,
             session=None,
     ):
         """
@@ -50,6 +55,18 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
                 deterministic mode when evaluating policy.
             eval_render_mode (`str`): Mode to render evaluation rollouts in.
                 None to disable rendering.
+            eval_n_workers (`int`): Number of ray actors running the
+                evaluation rollouts with a snapshot of the policy weights.
+                0 runs them serially in the training process.
+            eval_async (`bool`): Whether the evaluation of an epoch runs
+                while the next epoch trains. Its metrics are reported with
+                the first epoch that ends after it finished, together with
+                `evaluation/epoch`. The evaluation still running when the
+                training ends is reported with the final diagnostics.
+                Requires `eval_n_workers > 0`.
+            profile_trace_path (`str`): Optional path of a Chrome trace file
+                for the phases timed by the profiler. The per-phase summary
+                is always reported under `profiler/` in the diagnostics.
         """
         self.sampler = sampler
 
@@ -64,6 +81,12 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
 
         self._eval_n_episodes = eval_n_episodes
         self._eval_deterministic = eval_deterministic
+        self._eval_n_workers = eval_n_workers
+        self._eval_async = eval_async
+        self._evaluator = None
+        self._pending_evaluation = None
+        assert not eval_async or eval_n_workers > 0, (
+            "Asynchronous evaluation requires eval_n_workers > 0.")
         self._video_save_frequency = video_save_frequency
         self._path_save_frequency = path_save_frequency
 
@@ -75,6 +98,11 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
             self._eval_render_mode = eval_render_mode
 
         self._session = session or tf.keras.backend.get_session()
+        self._profiler = Profiler(trace_path=profile_trace_path)
+
+        # Number of training steps `_do_fused_training` runs at once, set by
+        # the algorithms that implement it.
+        self._fused_train_steps = 1
 
         self._epoch = 0
         self._timestep = 0
@@ -96,7 +124,7 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
 
         self.sampler.initialize(env, initial_exploration_policy, pool)
         while pool.size < self._n_initial_exploration_steps:
-            self.sampler.sample(,
+            self.sampler.sample()
 
     def _training_before_hook(self):
         """Method called before the actual training loops."""
@@ -164,6 +192,10 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
 
         self.sampler.initialize(training_environment, policy, pool)
 
+        if self._eval_n_workers > 0 and self._evaluator is None:
+            self._evaluator = RemoteEvaluator(
+                evaluation_environment, policy, self._eval_n_workers)
+
         gt.reset_root()
         gt.rename_root('RLAlgorithm')
         gt.set_def_unique(False)
@@ -184,23 +216,29 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
                     break
 
                 self._timestep_before_hook()
-                gt.stamp('timestep_before_hook')
 
-                self._do_sampling(timestep=self._total_timestep)
-                gt.stamp('sample')
+                with self._profiler.phase('sample'):
+                    self._do_sampling(timestep=self._total_timestep)
 
                 if self.ready_to_train:
-                    self._do_training_repeats(timestep=self._total_timestep)
-                gt.stamp('train')
+                    with self._profiler.phase('train'):
+                        self._do_training_repeats(
+                            timestep=self._total_timestep)
 
                 self._timestep_after_hook()
-                gt.stamp('timestep_after_hook')
+            gt.stamp('timesteps')
 
             training_paths = self.sampler.get_last_n_paths(
                 math.ceil(self._epoch_length / self.sampler._max_path_length))
             gt.stamp('training_paths')
-            evaluation_paths = self._evaluation_paths(
-                policy, evaluation_environment)
+            with self._profiler.phase('evaluation'):
+                if self._eval_async:
+                    evaluation_epoch, evaluation_paths = (
+                        self._async_evaluation_paths(policy))
+                else:
+                    evaluation_epoch = self._epoch
+                    evaluation_paths = self._evaluation_paths(
+                        policy, evaluation_environment)
             gt.stamp('evaluation_paths')
 
             training_metrics = self._evaluate_rollouts(
@@ -225,6 +263,8 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
             if evaluation_paths:
                 evaluation_metrics = self._evaluate_rollouts(
                     evaluation_paths, evaluation_environment)
+                if self._eval_async:
+                    evaluation_metrics['epoch'] = evaluation_epoch
                 gt.stamp('evaluation_metrics')
             else:
                 evaluation_metrics = {}
@@ -241,6 +281,7 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
                 evaluation_paths=evaluation_paths)
 
             time_diagnostics = gt.get_times().stamps.itrs
+            profiler_diagnostics = self._profiler.get_diagnostics()
 
             diagnostics.update(OrderedDict((
                 *(
@@ -255,6 +296,10 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
                     (f'times/{key}', time_diagnostics[key][-1])
                     for key in sorted(time_diagnostics.keys())
                 ),
+                *(
+                    (f'profiler/{key}', profiler_diagnostics[key])
+                    for key in profiler_diagnostics.keys()
+                ),
                 *(
                     (f'sampler/{key}', sampler_diagnostics[key])
                     for key in sorted(sampler_diagnostics.keys())
@@ -273,6 +318,18 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
 
             yield diagnostics
 
+        if self._pending_evaluation is not None:
+            # the evaluation submitted last would otherwise be lost
+            evaluation_epoch, evaluation_paths = (
+                self._collect_pending_evaluation())
+            evaluation_metrics = self._evaluate_rollouts(
+                evaluation_paths, evaluation_environment)
+            evaluation_metrics['epoch'] = evaluation_epoch
+            diagnostics.update(OrderedDict(
+                (f'evaluation/{key}', evaluation_metrics[key])
+                for key in sorted(evaluation_metrics.keys())
+            ))
+
         self.sampler.terminate()
 
         self._training_after_hook()
@@ -282,28 +339,79 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
     def _evaluation_paths(self, policy, evaluation_env):
         if self._eval_n_episodes < 1: return ()
 
-        with policy.set_deterministic(self._eval_deterministic):
-            paths = rollouts(
-                self._eval_n_episodes,
-                evaluation_env,
-                policy,
-                self.sampler._max_path_length,
-                render_mode=self._eval_render_mode)
+        if self._evaluator is not None:
+            paths = self._evaluator.collect(
+                self._submit_evaluation(policy))
+        else:
+            with policy.set_deterministic(self._eval_deterministic):
+                paths = rollouts(
+                    self._eval_n_episodes,
+                    evaluation_env,
+                    policy,
+                    self.sampler._max_path_length,
+                    render_mode=self._eval_render_mode)
+
+        self._save_evaluation_videos(paths, self._epoch)
 
+        return paths
+
+    def _submit_evaluation(self, policy):
+        return self._evaluator.submit(
+            policy.get_weights(),
+            self._eval_n_episodes,
+            self.sampler._max_path_length,
+            deterministic=self._eval_deterministic,
+            render_mode=self._eval_render_mode)
+
+    def _async_evaluation_paths(self, policy):
+        """Start the evaluation of this epoch and return a finished one.
+
+        Only one evaluation runs at a time, epochs that end while the
+        previous evaluation is still running are not evaluated.
+
+        Returns:
+            The epoch and paths of the evaluation that finished since the
+            last call, or `(None, ())`.
+        """
+        if self._eval_n_episodes < 1: return None, ()
+
+        epoch, paths = None, ()
+        if (self._pending_evaluation is not None
+            and self._evaluator.ready(self._pending_evaluation[1])):
+            epoch, paths = self._collect_pending_evaluation()
+
+        if self._pending_evaluation is None:
+            self._pending_evaluation = (
+                self._epoch, self._submit_evaluation(policy))
+
+        return epoch, paths
+
+    def _collect_pending_evaluation(self):
+        """Block until the pending evaluation is done.
+
+        Returns:
+            The epoch and paths of the evaluation.
+        """
+        epoch, handle = self._pending_evaluation
+        self._pending_evaluation = None
+        paths = self._evaluator.collect(handle)
+        self._save_evaluation_videos(paths, epoch)
+
+        return epoch, paths
+
+    def _save_evaluation_videos(self, paths, epoch):
         should_save_video = (
             self._video_save_frequency > 0
-            and self._epoch % self._video_save_frequency == 0)
+            and epoch % self._video_save_frequency == 0)
 
         if should_save_video:
             for i, path in enumerate(paths):
                 video_frames = path.pop('images')
-                video_file_name = f'evaluation_path_{self._epoch}_{i}.avi'
+                video_file_name = f'evaluation_path_{epoch}_{i}.avi'
                 video_file_path = os.path.join(
                     os.getcwd(), 'videos', video_file_name)
                 save_video(video_frames, video_file_path)
 
-        return paths
-
     def _evaluate_rollouts(self, paths, env):
         """Compute evaluation metrics for the given rollouts."""
 
@@ -340,7 +448,7 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
         return self.sampler.batch_ready()
 
     def _do_sampling(self, timestep):
-        self.sampler.sample(,
+        self.sampler.sample()
 
     def _do_training_repeats(self, timestep):
         """Repeat training _n_train_repeat times every _train_every_n_steps"""
@@ -350,14 +458,29 @@ class RLAlgorithm(tf.contrib.checkpoint.Checkpointable):
             > self._max_train_repeat_per_timestep * self._timestep)
         if trained_enough: return
 
-        for i in range(self._n_train_repeat):
-            self._do_training(
-                iteration=timestep,
-                batch=self._training_batch())
+        num_fused, num_single = (
+            divmod(self._n_train_repeat, self._fused_train_steps)
+            if self._fused_train_steps > 1
+            else (0, self._n_train_repeat))
+        for i in range(num_fused):
+            self._do_fused_training(
+                iteration=timestep, num_steps=self._fused_train_steps)
+
+        for i in range(num_single):
+            with self._profiler.phase('batch'):
+                batch = self._training_batch()
+            self._do_training(iteration=timestep, batch=batch)
 
         self._num_train_steps += self._n_train_repeat
         self._train_steps_this_epoch += self._n_train_repeat
 
+    def _do_fused_training(self, iteration, num_steps):
+        """Run `num_steps` training steps, each on a new training batch."""
+        for i in range(num_steps):
+            with self._profiler.phase('batch'):
+                batch = self._training_batch()
+            self._do_training(iteration=iteration, batch=batch)
+
     @abc.abstractmethod
     def _do_training(self, iteration, batch):
         raise NotImplementedError
@@ -3,6 +3,8 @@ import tensorflow_probability as tfp
 import numpy as np
  
 from collections import OrderedDict
+import threading
+import time
 
 
 from rl_with_videos.algorithms.sac import SAC
@@ -23,7 +25,24 @@ class RLV(SAC):
                  paired_loss_scale=1.0,
                  paired_data_pool=None,
                  shared_preprocessor_model=None,
+                 relabel_interval=None,
+                 relabel_batch_size=4096,
+                 relabel_in_background=False,
                  **kwargs):
+        """
+        Args:
+            relabel_interval (`int`): If given, the actions of the whole
+                action-free pool are inferred every `relabel_interval`
+                training steps and stored in its `inferred_actions` field,
+                which the actor and critic then read like ordinary actions
+                instead of running the inverse model on every batch.
+            relabel_batch_size (`int`): Number of samples labeled per
+                session call of a relabel pass.
+            relabel_in_background (`bool`): Run the relabel passes after the
+                first one in a background thread. The pass then overlaps
+                with training, so its labels may mix the inverse model
+                weights of consecutive training steps.
+        """
         print("\n\n\n\n\nkwargs in rlv:", kwargs)
         print("\n\n\n\n\n\n")
         print("paired_data pool", paired_data_pool)
@@ -51,6 +70,15 @@ class RLV(SAC):
 
         self._preprocessor_for_inverse = preprocessor_for_inverse
 
+        self._relabel_interval = relabel_interval
+        self._relabel_batch_size = relabel_batch_size
+        self._relabel_in_background = relabel_in_background
+        self._relabel_thread = None
+        # training step the inferred actions were computed at, None before
+        # the first relabel pass
+        self._relabel_train_steps = None
+        self._relabel_passes = 0
+        self._relabel_samples_per_second = []
 
         super(RLV, self).__init__(**kwargs)
 
@@ -66,11 +94,16 @@ class RLV(SAC):
             self._init_reward_generation()
 
         self._init_inverse_model()
+        if self._relabel_interval is not None:
+            self._init_relabeling()
 
         self._init_actor_update()
         self._init_critic_update()
         self._init_diagnostics_ops()
 
+        if self._fused_train_steps > 1:
+            self._init_fused_training()
+
     def _init_placeholders(self):
         action_conditioned_placeholders = {
             'observations_no_aug': tf.placeholder(tf.float32,
@@ -129,6 +162,12 @@ class RLV(SAC):
                 shape=(None, *self._action_shape),
                 name='actions',
             )
+        if self._relabel_interval is not None:
+            action_free_placeholders['inferred_actions'] = tf.placeholder(
+                dtype=tf.float32,
+                shape=(None, *self._action_shape),
+                name='inferred_actions',
+            )
 
 
         self._placeholders = {
@@ -226,6 +265,9 @@ class RLV(SAC):
             self._policy.get_diagnostics(batch['action_conditioned']['observations']).items()
         ]))
 
+        if self._relabel_interval is not None:
+            diagnostics.update(self._get_relabel_diagnostics())
+
         if self._plotter:
             self._plotter.draw()
 
@@ -233,6 +275,25 @@ class RLV(SAC):
 
 
 
+    def _get_relabel_diagnostics(self):
+        """Label age (in training steps) and relabel throughput since the
+        last call."""
+        label_age = (
+            self._num_train_steps - self._relabel_train_steps
+            if self._relabel_train_steps is not None
+            else 0)
+        diagnostics = OrderedDict((
+            ('relabel/label-age', label_age),
+            ('relabel/samples-per-second', (
+                np.mean(self._relabel_samples_per_second)
+                if self._relabel_samples_per_second
+                else 0.0)),
+            ('relabel/passes', self._relabel_passes),
+        ))
+        self._relabel_passes = 0
+        self._relabel_samples_per_second = []
+        return diagnostics
+
     def _init_reward_generation(self):
         print("Removed rewards.  Running reward generation")
         self._placeholders['action_free']['rewards'] = tf.math.multiply(self._replace_rewards_scale,
@@ -248,6 +309,47 @@ class RLV(SAC):
         `self._training_ops` attribute.
 
         """
+        losses = self._get_inverse_model_losses()
+
+        if 'paired_loss' in losses:
+            self._paired_optimizer = tf.compat.v1.train.AdamOptimizer(
+                    learning_rate=self._paired_loss_lr,
+                    name='paired_loss_optimizer')
+        if 'domain_shift_discriminator' in losses:
+            self._domain_shift_discrim_optimizer = tf.compat.v1.train.AdamOptimizer(
+                learning_rate=self._domain_shift_discrim_lr,
+                name='domain_shift_discrim_optimizer')
+        self._inverse_model_optimizer = tf.compat.v1.train.AdamOptimizer(
+                learning_rate=self._inverse_model_lr,
+                name='inverse_model_optimizer')
+
+        for name, (optimizer, loss, var_list) in self._get_inverse_model_updates(
+                losses).items():
+            self._training_ops.update({
+                name: optimizer.minimize(loss=loss, var_list=var_list)})
+
+    def _get_inverse_model_updates(self, losses):
+        optimizers = {
+            'paired_loss': getattr(self, '_paired_optimizer', None),
+            'domain_shift_discriminator': getattr(
+                self, '_domain_shift_discrim_optimizer', None),
+            'inverse_model': self._inverse_model_optimizer,
+        }
+        return OrderedDict(
+            (name, (optimizers[name], loss, var_list))
+            for name, (loss, var_list) in losses.items())
+
+    def _get_inverse_model_losses(self):
+        """Build the inverse model losses and the combined SAC inputs.
+
+        Sets the observations, actions, rewards and terminals that the actor
+        and critic are trained on, with the actions of the action-free data
+        predicted by the inverse model.
+
+        Returns:
+            OrderedDict from the training op names to `(loss, var_list)`.
+        """
+        losses = OrderedDict()
 
         next_states = tf.concat([self._placeholders['action_conditioned']['next_observations'],
                                  self._placeholders['action_free']['next_observations']], axis=0)
@@ -267,12 +369,17 @@ class RLV(SAC):
             action_con_next_obs = tf.reshape(action_con_next_obs, (-1, 48, 48, 3))
             action_free_obs = tf.reshape(action_free_obs, (-1, 48, 48, 3))
             action_free_next_obs = tf.reshape(action_free_next_obs, (-1, 48, 48, 3))
-        combined_first_obs = tf.concat([action_con_obs, action_free_obs], axis=0)
-        combined_next_obs = tf.concat([action_con_next_obs, action_free_next_obs], axis=0)
-        combined_pred_actions = self._inverse_model([combined_first_obs, combined_next_obs])
+        if self._relabel_interval is not None:
+            # the action-free actions come from the last relabel pass
+            pred_seen_actions = self._inverse_model([action_con_obs, action_con_next_obs])
+            pred_unseen_actions = self._placeholders['action_free']['inferred_actions']
+        else:
+            combined_first_obs = tf.concat([action_con_obs, action_free_obs], axis=0)
+            combined_next_obs = tf.concat([action_con_next_obs, action_free_next_obs], axis=0)
+            combined_pred_actions = self._inverse_model([combined_first_obs, combined_next_obs])
 
-        pred_seen_actions = combined_pred_actions[:256]
-        pred_unseen_actions = combined_pred_actions[256:]
+            pred_seen_actions = combined_pred_actions[:256]
+            pred_unseen_actions = combined_pred_actions[256:]
 
 
         inverse_model_loss = tf.compat.v1.losses.mean_squared_error(
@@ -288,13 +395,9 @@ class RLV(SAC):
                 interaction_encodings = paired_encodings[:256]
                 observation_encodings = paired_encodings[256:]
                 self._paired_loss = self._paired_loss_scale * tf.keras.losses.MeanSquaredError()(interaction_encodings, observation_encodings)
-                
-                self._paired_optimizer = tf.compat.v1.train.AdamOptimizer(
-                        learning_rate=self._paired_loss_lr,
-                        name='paired_loss_optimizer')
-                paired_train_op = self._paired_optimizer.minimize(loss=self._paired_loss,
-                                                                           var_list=self._shared_preprocessor_model.trainable_variables)
-                self._training_ops.update({'paired_loss': paired_train_op})
+                losses['paired_loss'] = (
+                    self._paired_loss,
+                    self._shared_preprocessor_model.trainable_variables)
 
             pred_domains = self._domain_shift_model(prev_states)
             discriminator_loss = tf.keras.losses.BinaryCrossentropy()(self._domains_ph, pred_domains)
@@ -308,22 +411,12 @@ class RLV(SAC):
 
             inverse_model_loss = inverse_model_loss + generator_loss * self._domain_shift_generator_weight
             self._domain_shift_discriminator_loss = discriminator_loss * self._domain_shift_discriminator_weight
+            losses['domain_shift_discriminator'] = (
+                self._domain_shift_discriminator_loss,
+                self._domain_shift_model.trainable_variables)
 
-            self._domain_shift_discrim_optimizer = tf.compat.v1.train.AdamOptimizer(
-                learning_rate=self._domain_shift_discrim_lr,
-                name='domain_shift_discrim_optimizer')
-            domain_shift_discrim_train_op = self._domain_shift_discrim_optimizer.minimize(loss=self._domain_shift_discriminator_loss,
-                                                                                var_list=self._domain_shift_model.trainable_variables)
-            self._training_ops.update({'domain_shift_discriminator': domain_shift_discrim_train_op})
-
-
-        self._inverse_model_optimizer = tf.compat.v1.train.AdamOptimizer(
-                learning_rate=self._inverse_model_lr,
-                name='inverse_model_optimizer')
-
-        inverse_train_op = self._inverse_model_optimizer.minimize(loss=inverse_model_loss, var_list=self._inverse_model.trainable_variables)
-
-        self._training_ops.update({'inverse_model': inverse_train_op})
+        losses['inverse_model'] = (
+            inverse_model_loss, self._inverse_model.trainable_variables)
         self._inverse_model_loss = inverse_model_loss
 
         self._observations_ph = prev_states
@@ -341,6 +434,157 @@ class RLV(SAC):
                                         self._placeholders['action_free']['terminals']], axis=0)
         self._iteration_ph = self._placeholders['action_conditioned']['iteration']
 
+        return losses
+
+
+    def _init_relabeling(self):
+        """Create the op that infers the actions of the action-free pool."""
+        self._action_free_pool.add_fields({
+            'inferred_actions': {
+                'shape': self._action_shape,
+                'dtype': 'float32',
+            },
+        })
+
+        self._relabel_observations_ph = tf.placeholder(
+            tf.float32,
+            shape=(None, *self._observation_shape),
+            name='relabel_observations')
+        self._relabel_next_observations_ph = tf.placeholder(
+            tf.float32,
+            shape=(None, *self._observation_shape),
+            name='relabel_next_observations')
+
+        observations = self._relabel_observations_ph
+        next_observations = self._relabel_next_observations_ph
+        if observations.shape[-1] == 6912 and not self._preprocessor_for_inverse:
+            # 3 channel, 48x48 image
+            observations = tf.reshape(observations, (-1, 48, 48, 3))
+            next_observations = tf.reshape(next_observations, (-1, 48, 48, 3))
+        self._relabel_actions = self._inverse_model(
+            [observations, next_observations])
+
+    def _relabel_action_free_pool(self, train_steps):
+        """Infer the actions of the whole action-free pool in large batches.
+
+        The labels are written to a new array that replaces the
+        `inferred_actions` field once it's complete, so batches sampled
+        during a background pass never see a partially labeled pool.
+        """
+        start = time.perf_counter()
+        pool = self._action_free_pool
+        size = pool.size
+        inferred_actions = np.zeros_like(pool.fields['inferred_actions'])
+        for batch_start in range(0, size, self._relabel_batch_size):
+            batch_end = min(batch_start + self._relabel_batch_size, size)
+            inferred_actions[batch_start:batch_end] = self._session.run(
+                self._relabel_actions, feed_dict={
+                    self._relabel_observations_ph: (
+                        pool.fields['observations'][batch_start:batch_end]),
+                    self._relabel_next_observations_ph: (
+                        pool.fields['next_observations'][batch_start:batch_end]),
+                })
+
+        pool.fields['inferred_actions'] = inferred_actions
+        self._relabel_train_steps = train_steps
+        self._relabel_passes += 1
+        self._relabel_samples_per_second.append(
+            size / (time.perf_counter() - start))
+
+    def _maybe_relabel_action_free_pool(self):
+        if self._relabel_train_steps is None:
+            self._relabel_action_free_pool(self._num_train_steps)
+            return
+
+        label_age = self._num_train_steps - self._relabel_train_steps
+        if label_age < self._relabel_interval:
+            return
+
+        if not self._relabel_in_background:
+            self._relabel_action_free_pool(self._num_train_steps)
+        elif self._relabel_thread is None or not self._relabel_thread.is_alive():
+            self._relabel_thread = threading.Thread(
+                target=self._relabel_action_free_pool,
+                args=(self._num_train_steps, ),
+                daemon=True)
+            self._relabel_thread.start()
+
+    def _do_training_repeats(self, timestep):
+        if self._relabel_interval is not None:
+            with self._profiler.phase('relabel'):
+                self._maybe_relabel_action_free_pool()
+        return super(RLV, self)._do_training_repeats(timestep)
+
+    def _get_gradient_updates(self):
+        # the inverse model builds the inputs of the actor and critic losses
+        inverse_model_updates = self._get_inverse_model_updates(
+            self._get_inverse_model_losses())
+        return [
+            *inverse_model_updates.values(),
+            *super(RLV, self)._get_gradient_updates(),
+        ]
+
+    def _input_placeholders(self):
+        placeholders = [
+            placeholder
+            for placeholders in self._placeholders.values()
+            for placeholder in placeholders.values()
+            if placeholder.op.type == 'Placeholder'
+        ]
+        if self._domain_shift:
+            placeholders.append(self._domains_ph)
+
+        return placeholders
+
+    def _set_input_placeholders(self, inputs):
+        self._placeholders = {
+            key: {
+                name: inputs[placeholder]
+                for name, placeholder in placeholders.items()
+                if placeholder in inputs
+            }
+            for key, placeholders in self._placeholders.items()
+        }
+        if self._domain_shift:
+            self._domains_ph = inputs[self._domains_ph]
+
+        self._alpha = tf.exp(self._log_alpha)
+        self._init_augmentation()
+        if self._remove_rewards:
+            self._init_reward_generation()
+
+    @property
+    def tf_saveables(self):
+        """Checkpoint the whole RLV graph.
+
+        Unlike SAC, whose Qs are pickled, the Qs and target Qs are included
+        here because they share the preprocessor with the policy and the
+        inverse model.
+        """
+        saveables = super(RLV, self).tf_saveables
+        saveables.update({
+            **{f'Q_{i}': Q for i, Q in enumerate(self._Qs)},
+            **{
+                f'Q_target_{i}': Q_target
+                for i, Q_target in enumerate(self._Q_targets)
+            },
+            '_inverse_model': self._inverse_model,
+            '_inverse_model_optimizer': self._inverse_model_optimizer,
+        })
+
+        if self._domain_shift_model is not None:
+            saveables['_domain_shift_model'] = self._domain_shift_model
+        if hasattr(self, '_domain_shift_discrim_optimizer'):
+            saveables['_domain_shift_discrim_optimizer'] = (
+                self._domain_shift_discrim_optimizer)
+        if self._shared_preprocessor_model is not None:
+            saveables['_shared_preprocessor_model'] = (
+                self._shared_preprocessor_model)
+        if hasattr(self, '_paired_optimizer'):
+            saveables['_paired_optimizer'] = self._paired_optimizer
+
+        return saveables
+
     def _init_diagnostics_ops(self): 
         diagnosables = OrderedDict(( 
             ('Q_value', self._Q_values), 
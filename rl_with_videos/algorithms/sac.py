@@ -1,4 +1,5 @@
 from collections import OrderedDict
+from contextlib import contextmanager
 from numbers import Number
 
 import numpy as np
@@ -7,6 +8,8 @@ import tensorflow_probability as tfp
 
 from scipy import ndimage
 
+from rl_with_videos.utils.image_filters import tf_apply_filters
+
 from .rl_algorithm import RLAlgorithm
 
 
@@ -46,6 +49,8 @@ class SAC(RLAlgorithm):
 
             should_augment=False,
             trans_dist=4,
+            image_filters=None,
+            fused_train_steps=1,
 
             save_full_state=False,
             **kwargs,
@@ -70,6 +75,16 @@ class SAC(RLAlgorithm):
             reparameterize ('bool'): If True, we use a gradient estimator for
                 the policy derived using the reparameterization trick. We use
                 a likelihood ratio based estimator otherwise.
+            image_filters ('list'): Filter specs (see
+                `rl_with_videos.utils.image_filters`) applied to the image
+                observations of every training batch, after the random crop
+                of `should_augment`.
+            fused_train_steps ('int'): Number of training steps that are
+                stacked into one `session.run`. If larger than 1, a
+                `tf.while_loop` applies the gradient and target updates of
+                `fused_train_steps` minibatches sequentially in the graph,
+                which saves the python and session overhead of the separate
+                calls for small networks.
         """
 
         super(SAC, self).__init__(**kwargs)
@@ -107,6 +122,9 @@ class SAC(RLAlgorithm):
 
         self._should_augment = should_augment
         self._trans_dist = trans_dist
+        self._image_filters = list(image_filters or ())
+        self._fused_train_steps = fused_train_steps
+        self._fused_feed_arrays = {}
 
         observation_shape = self._training_environment.active_observation_shape
         action_shape = self._training_environment.action_space.shape
@@ -129,6 +147,9 @@ class SAC(RLAlgorithm):
         self._init_critic_update()
         self._init_diagnostics_ops()
 
+        if self._fused_train_steps > 1:
+            self._init_fused_training()
+
     def _init_placeholders(self):
         """Create input placeholders for the SAC algorithm.
 
@@ -208,30 +229,35 @@ class SAC(RLAlgorithm):
 
         return Q_target
 
-    def _init_critic_update(self):
-        """Create minimization operation for critic Q-function.
-
-        Creates a `tf.optimizer.minimize` operation for updating
-        critic Q-function with gradient descent, and appends it to
-        `self._training_ops` attribute.
-
-        See Equations (5, 6) in [1], for further information of the
-        Q-function update rule.
-        """
+    def _get_Q_losses(self):
         Q_target = tf.stop_gradient(self._get_Q_target())
 
 #        assert Q_target.shape.as_list() == [None, 1]
 
-        Q_values = self._Q_values = tuple(
+        Q_values = tuple(
             Q([self._observations_ph, self._actions_ph])
             for Q in self._Qs)
 
-
         Q_losses  = tuple(
             tf.losses.mean_squared_error(
                 labels=Q_target, predictions=Q_value, weights=0.5)
             for Q_value in Q_values)
 
+        return Q_values, Q_losses
+
+    def _init_critic_update(self):
+        """Create minimization operation for critic Q-function.
+
+        Creates a `tf.optimizer.minimize` operation for updating
+        critic Q-function with gradient descent, and appends it to
+        `self._training_ops` attribute.
+
+        See Equations (5, 6) in [1], for further information of the
+        Q-function update rule.
+        """
+        Q_values, Q_losses = self._get_Q_losses()
+
+        self._Q_values = Q_values
         self._Q_losses = Q_losses
         self._Q_optimizers = tuple(
             tf.train.AdamOptimizer(
@@ -256,21 +282,15 @@ class SAC(RLAlgorithm):
         See Section 4.2 in [1], for further information of the policy update,
         and Section 5 in [1] for further information of the entropy update.
         """
-        actions = self._policy.actions([self._observations_ph])
-        log_pis = self._policy.log_pis([self._observations_ph], actions)
-
-#        assert log_pis.shape.as_list() == [None, 1]
-
         log_alpha = self._log_alpha = tf.get_variable(
             'log_alpha',
             dtype=tf.float32,
             initializer=0.0)
-        alpha = tf.exp(log_alpha)
+        alpha = self._alpha = tf.exp(log_alpha)
 
-        if isinstance(self._target_entropy, Number):
-            alpha_loss = -tf.reduce_mean(
-                log_alpha * tf.stop_gradient(log_pis + self._target_entropy))
+        policy_kl_losses, alpha_loss = self._get_policy_losses()
 
+        if alpha_loss is not None:
             self._alpha_optimizer = tf.train.AdamOptimizer(
                 self._policy_lr, name='alpha_optimizer')
             self._alpha_train_op = self._alpha_optimizer.minimize(
@@ -280,7 +300,38 @@ class SAC(RLAlgorithm):
                 'temperature_alpha': self._alpha_train_op
             })
 
-        self._alpha = alpha
+        self._policy_losses = policy_kl_losses
+        policy_loss = tf.reduce_mean(policy_kl_losses)
+
+        self._policy_optimizer = tf.train.AdamOptimizer(
+            learning_rate=self._policy_lr,
+            name="policy_optimizer")
+
+        policy_train_op = self._policy_optimizer.minimize(
+            loss=policy_loss,
+            var_list=self._policy.trainable_variables)
+
+        self._training_ops.update({'policy_train_op': policy_train_op})
+
+    def _get_policy_losses(self):
+        """Build the policy and temperature losses.
+
+        Returns:
+            The per-sample policy losses and the temperature loss, which is
+            None if the temperature is not learned.
+        """
+        actions = self._policy.actions([self._observations_ph])
+        log_pis = self._policy.log_pis([self._observations_ph], actions)
+
+#        assert log_pis.shape.as_list() == [None, 1]
+
+        alpha_loss = None
+        if isinstance(self._target_entropy, Number):
+            alpha_loss = -tf.reduce_mean(
+                self._log_alpha * tf.stop_gradient(
+                    log_pis + self._target_entropy))
+
+        alpha = self._alpha
 
         if self._action_prior == 'normal':
             policy_prior = tfp.distributions.MultivariateNormalDiag(
@@ -307,18 +358,158 @@ class SAC(RLAlgorithm):
 
 #        assert policy_kl_losses.shape.as_list() == [None, 1]
 
-        self._policy_losses = policy_kl_losses
-        policy_loss = tf.reduce_mean(policy_kl_losses)
+        return policy_kl_losses, alpha_loss
 
-        self._policy_optimizer = tf.train.AdamOptimizer(
-            learning_rate=self._policy_lr,
-            name="policy_optimizer")
+    def _get_gradient_updates(self):
+        """Build the losses of one training step on the current inputs.
 
-        policy_train_op = self._policy_optimizer.minimize(
-            loss=policy_loss,
-            var_list=self._policy.trainable_variables)
+        Returns:
+            List of `(optimizer, loss, var_list)` tuples, one per entry of
+            `self._training_ops` (apart from the global step).
+        """
+        policy_kl_losses, alpha_loss = self._get_policy_losses()
+        _, Q_losses = self._get_Q_losses()
+
+        updates = [(
+            self._policy_optimizer,
+            tf.reduce_mean(policy_kl_losses),
+            self._policy.trainable_variables,
+        )]
+        if alpha_loss is not None:
+            updates.append((self._alpha_optimizer, alpha_loss, [self._log_alpha]))
+        updates.extend(
+            (Q_optimizer, Q_loss, Q.trainable_variables)
+            for Q, Q_loss, Q_optimizer
+            in zip(self._Qs, Q_losses, self._Q_optimizers))
+
+        return updates
+
+    def _input_placeholders(self):
+        """Return the placeholders fed by `_get_feed_dict`."""
+        placeholders = [
+            self._observations_no_aug_ph,
+            self._next_observations_no_aug_ph,
+            self._actions_ph,
+            self._rewards_ph,
+            self._terminals_ph,
+            self._iteration_ph,
+        ]
+        if self._store_extra_policy_info:
+            placeholders += [self._log_pis_ph, self._raw_actions_ph]
 
-        self._training_ops.update({'policy_train_op': policy_train_op})
+        return placeholders
+
+    def _set_input_placeholders(self, inputs):
+        """Rebuild the inputs of the losses from the tensors in `inputs`.
+
+        Args:
+            inputs: Dict from the placeholders of `_input_placeholders` to the
+                tensors that replace them.
+        """
+        for name in ('_observations_no_aug_ph',
+                     '_next_observations_no_aug_ph',
+                     '_actions_ph',
+                     '_rewards_ph',
+                     '_terminals_ph',
+                     '_iteration_ph',
+                     '_log_pis_ph',
+                     '_raw_actions_ph'):
+            if getattr(self, name, None) in inputs:
+                setattr(self, name, inputs[getattr(self, name)])
+
+        # read the temperature inside the loop, it changes between the steps
+        self._alpha = tf.exp(self._log_alpha)
+        self._init_augmentation()
+
+    @contextmanager
+    def _replaced_inputs(self, inputs):
+        """Context manager that builds the losses from the tensors in `inputs`.
+
+        The loss builders read their inputs from the attributes set by
+        `_set_input_placeholders`, so all the attributes are restored when
+        the context exits, also if building the graph raised.
+
+        Args:
+            inputs: Dict from the placeholders of `_input_placeholders` to the
+                tensors that replace them.
+        """
+        attributes = self.__dict__.copy()
+        try:
+            self._set_input_placeholders(inputs)
+            yield
+        finally:
+            self.__dict__.clear()
+            self.__dict__.update(attributes)
+
+    def _init_fused_training(self):
+        """Create the op that runs `fused_train_steps` training steps.
+
+        Every placeholder of `_input_placeholders` gets a stacked counterpart
+        with a leading `fused_train_steps` dimension. The body of the while
+        loop rebuilds the losses on one slice of the stacked inputs, applies
+        all the gradients computed from the same parameters, like the
+        single `session.run` of `_training_ops` does, and then updates the
+        target Qs with `self._fused_tau_ph`.
+        """
+        num_steps = self._fused_train_steps
+        self._fused_inputs = {
+            placeholder: tf.placeholder(
+                placeholder.dtype,
+                shape=tf.TensorShape([num_steps]).concatenate(
+                    placeholder.shape),
+                name=f'{placeholder.op.name}_fused')
+            for placeholder in self._input_placeholders()
+        }
+        self._fused_tau_ph = tf.placeholder(
+            tf.float32, shape=(), name='fused_tau')
+
+        def body(step):
+            with self._replaced_inputs({
+                    placeholder: stacked[step]
+                    for placeholder, stacked in self._fused_inputs.items()
+            }):
+                updates = self._get_gradient_updates()
+
+            grads_and_vars = [
+                [(gradient, variable)
+                 for gradient, variable in optimizer.compute_gradients(
+                         loss, var_list=var_list)
+                 if gradient is not None]
+                for optimizer, loss, var_list in updates
+            ]
+            gradients = [
+                gradient
+                for optimizer_grads_and_vars in grads_and_vars
+                for gradient, _ in optimizer_grads_and_vars
+            ]
+            with tf.control_dependencies(gradients):
+                train_ops = [
+                    optimizer.apply_gradients(optimizer_grads_and_vars)
+                    for (optimizer, _, _), optimizer_grads_and_vars
+                    in zip(updates, grads_and_vars)
+                ]
+
+            with tf.control_dependencies(train_ops):
+                tau = self._fused_tau_ph
+                target_update_ops = [
+                    tf.assign(target, tau * source + (1.0 - tau) * target)
+                    for Q, Q_target in zip(self._Qs, self._Q_targets)
+                    for source, target in zip(Q.weights, Q_target.weights)
+                ]
+
+            with tf.control_dependencies(target_update_ops):
+                return step + 1
+
+        fused_steps = tf.while_loop(
+            lambda step: step < num_steps,
+            body,
+            (tf.constant(0), ),
+            parallel_iterations=1,
+            back_prop=False)
+
+        with tf.control_dependencies([fused_steps]):
+            self._fused_training_op = tf.assign_add(
+                self.global_step, num_steps)
 
     def _init_diagnostics_ops(self):
         diagnosables = OrderedDict((
@@ -353,30 +544,56 @@ class SAC(RLAlgorithm):
                 for source, target in zip(source_params, target_params)
             ])
 
+    def _do_fused_training(self, iteration, num_steps):
+        if num_steps != self._fused_train_steps:
+            return super(SAC, self)._do_fused_training(iteration, num_steps)
+
+        for step in range(num_steps):
+            with self._profiler.phase('batch'):
+                batch = self._training_batch()
+            with self._profiler.phase('feed_dict'):
+                feed_dict = self._get_feed_dict(iteration, batch)
+                for placeholder, value in feed_dict.items():
+                    if placeholder not in self._fused_feed_arrays:
+                        self._fused_feed_arrays[placeholder] = np.empty(
+                            (num_steps, *np.shape(value)),
+                            dtype=placeholder.dtype.as_numpy_dtype)
+                    self._fused_feed_arrays[placeholder][step] = value
+
+        should_update_target = iteration % self._target_update_interval == 0
+        fused_feed_dict = {
+            self._fused_inputs[placeholder]: values
+            for placeholder, values in self._fused_feed_arrays.items()
+        }
+        fused_feed_dict[self._fused_tau_ph] = (
+            self._tau if should_update_target else 0.0)
+
+        with self._profiler.phase('session_run'):
+            self._session.run(self._fused_training_op, fused_feed_dict)
+
     def _do_training(self, iteration, batch):
         """Runs the operations for updating training and target ops."""
 
-        feed_dict = self._get_feed_dict(iteration, batch)
+        with self._profiler.phase('feed_dict'):
+            feed_dict = self._get_feed_dict(iteration, batch)
 #        print("training ops:", self._training_ops)
-        self._session.run(self._training_ops, feed_dict)
+        with self._profiler.phase('session_run'):
+            self._session.run(self._training_ops, feed_dict)
 
         if iteration % self._target_update_interval == 0:
             # Run target ops here.
-            self._update_target()
+            with self._profiler.phase('target_update'):
+                self._update_target()
 
     def _augment_image(self, flat_image):
-        original_shape = flat_image.shape[1]
-        if not self._should_augment:
-            return flat_image
-        image = tf.reshape(flat_image, (-1, 48, 48, 3))
-
+        filters = self._image_filters
         if self._should_augment:
-            padding = tf.constant([[0, 0], [self._trans_dist, self._trans_dist], [self._trans_dist, self._trans_dist], [0, 0]])
-            image = tf.pad(image, padding)
-            image = tf.image.random_crop(image, (256, 48, 48, 3))
+            filters = [{
+                'type': 'random_crop',
+                'kwargs': {'pad': self._trans_dist},
+            }] + filters
 
-        flattened_image = tf.reshape(image, (-1, original_shape))
-        return flattened_image
+        return tf_apply_filters(flat_image, filters, image_shape=(48, 48, 3))
 
     def _get_feed_dict(self, iteration, batch):
         """Construct TensorFlow feed_dict from sample batch."""
@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+
+import numpy as np
+import tensorflow as tf
+
+from rl_with_videos.algorithms.sac import SAC
+from rl_with_videos.value_functions.vanilla import (
+    create_feedforward_Q_function)
+
+
+OBSERVATION_SHAPE = (3, )
+ACTION_SHAPE = (2, )
+BATCH_SIZE = 8
+NUM_STEPS = 3
+
+
+class DeterministicPolicy(object):
+    """Tanh policy without sampling noise, so that the training steps of the
+    fused and the single `session.run`s can be compared exactly."""
+
+    def __init__(self):
+        self._model = tf.keras.Sequential((
+            tf.keras.layers.Dense(
+                ACTION_SHAPE[0], input_shape=OBSERVATION_SHAPE), ))
+
+    @property
+    def trainable_variables(self):
+        return self._model.trainable_variables
+
+    def actions(self, conditions):
+        return tf.tanh(self._model(conditions[0]))
+
+    def log_pis(self, conditions, actions):
+        return -tf.reduce_sum(actions ** 2, axis=-1, keepdims=True)
+
+
+class FixedBatchSampler(object):
+    def __init__(self, batches):
+        self.batches = batches
+        self.index = 0
+
+    def random_batch(self, batch_size=None):
+        batch = self.batches[self.index % len(self.batches)]
+        self.index += 1
+        return batch
+
+
+def create_batch(random_state):
+    return {
+        'observations': random_state.uniform(
+            -1, 1, (BATCH_SIZE, *OBSERVATION_SHAPE)).astype(np.float32),
+        'next_observations': random_state.uniform(
+            -1, 1, (BATCH_SIZE, *OBSERVATION_SHAPE)).astype(np.float32),
+        'actions': random_state.uniform(
+            -1, 1, (BATCH_SIZE, *ACTION_SHAPE)).astype(np.float32),
+        'rewards': random_state.uniform(
+            -1, 1, (BATCH_SIZE, 1)).astype(np.float32),
+        'terminals': (
+            random_state.uniform(0, 1, (BATCH_SIZE, 1)) < 0.2
+        ).astype(np.float32),
+    }
+
+
+class SACFusedTrainingTest(tf.test.TestCase):
+    def test_fused_training_matches_single_steps(self):
+        random_state = np.random.RandomState(0)
+        sampler = FixedBatchSampler([
+            create_batch(random_state) for _ in range(NUM_STEPS)])
+
+        with tf.Graph().as_default(), tf.Session() as session:
+            tf.keras.backend.set_session(session)
+            environment = SimpleNamespace(
+                active_observation_shape=OBSERVATION_SHAPE,
+                action_space=SimpleNamespace(shape=ACTION_SHAPE))
+            Qs = tuple(
+                create_feedforward_Q_function(
+                    OBSERVATION_SHAPE,
+                    ACTION_SHAPE,
+                    hidden_layer_sizes=(8, 8),
+                    name=f'Q_{i}')
+                for i in range(2))
+            algorithm = SAC(
+                training_environment=environment,
+                evaluation_environment=environment,
+                policy=DeterministicPolicy(),
+                Qs=Qs,
+                pool=None,
+                sampler=sampler,
+                session=session,
+                reparameterize=True,
+                fused_train_steps=NUM_STEPS)
+
+            session.run(tf.global_variables_initializer())
+            algorithm._init_training()
+
+            variables = tf.global_variables()
+            initial_values = session.run(variables)
+
+            sampler.index = 0
+            for _ in range(NUM_STEPS):
+                algorithm._do_training(
+                    iteration=0, batch=algorithm._training_batch())
+            single_values = session.run(variables)
+
+            for variable, value in zip(variables, initial_values):
+                variable.load(value, session)
+
+            sampler.index = 0
+            algorithm._do_fused_training(iteration=0, num_steps=NUM_STEPS)
+            fused_values = session.run(variables)
+
+        self.assertEqual(sampler.index, NUM_STEPS)
+        self.assertFalse(all(
+            np.allclose(single_value, initial_value)
+            for single_value, initial_value
+            in zip(single_values, initial_values)))
+        for variable, single_value, fused_value in zip(
+                variables, single_values, fused_values):
+            self.assertAllClose(
+                fused_value, single_value, rtol=1e-5, atol=1e-5,
+                msg=variable.name)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -1,5 +1,7 @@
 """Implements a GymAdapter that converts Gym envs into SoftlearningEnv."""
 
+import functools
+
 import numpy as np
 import gym
 from gym import spaces, wrappers
@@ -9,8 +11,6 @@ from rl_with_videos.environments.gym import register_environments
 from rl_with_videos.environments.gym.wrappers import NormalizeActionWrapper
 from collections import defaultdict
 
-import tensorflow as tf
-from rl_with_videos.utils.keras import PicklableKerasModel
 
 def parse_domain_task(gym_id):
     domain_task_parts = gym_id.split('-')
@@ -20,24 +20,51 @@ def parse_domain_task(gym_id):
     return domain, task
 
 
-CUSTOM_GYM_ENVIRONMENT_IDS = register_environments()
-CUSTOM_GYM_ENVIRONMENTS = defaultdict(list)
+def _group_by_domain(gym_ids):
+    environments = defaultdict(list)
+    for gym_id in gym_ids:
+        domain, task = parse_domain_task(gym_id)
+        environments[domain].append(task)
+    return dict(environments)
+
+
+# The custom environments are registered and the gym registry is walked on
+# first use instead of at import time, so that importing the adapter stays
+# cheap for every worker that never needs them. Gym refuses to register an id
+# twice, the registration runs once per process.
+@functools.lru_cache(maxsize=None)
+def register_custom_environments():
+    return register_environments()
+
+
+@functools.lru_cache(maxsize=None)
+def get_custom_gym_environments():
+    return _group_by_domain(register_custom_environments())
+
+
+def get_gym_environment_ids():
+    register_custom_environments()
+    return tuple(gym.envs.registry.env_specs.keys())
 
-for gym_id in CUSTOM_GYM_ENVIRONMENT_IDS:
-    domain, task = parse_domain_task(gym_id)
-    CUSTOM_GYM_ENVIRONMENTS[domain].append(task)
 
-CUSTOM_GYM_ENVIRONMENTS = dict(CUSTOM_GYM_ENVIRONMENTS)
+@functools.lru_cache(maxsize=None)
+def get_gym_environments():
+    return _group_by_domain(get_gym_environment_ids())
 
-GYM_ENVIRONMENT_IDS = tuple(gym.envs.registry.env_specs.keys())
-GYM_ENVIRONMENTS = defaultdict(list)
 
+_LAZY_ATTRIBUTES = {
+    'CUSTOM_GYM_ENVIRONMENT_IDS': register_custom_environments,
+    'CUSTOM_GYM_ENVIRONMENTS': get_custom_gym_environments,
+    'GYM_ENVIRONMENT_IDS': get_gym_environment_ids,
+    'GYM_ENVIRONMENTS': get_gym_environments,
+}
 
-for gym_id in GYM_ENVIRONMENT_IDS:
-    domain, task = parse_domain_task(gym_id)
-    GYM_ENVIRONMENTS[domain].append(task)
 
-GYM_ENVIRONMENTS = dict(GYM_ENVIRONMENTS)
+def __getattr__(name):
+    """Compute the former module level environment tables on access."""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class GymAdapter(SoftlearningEnv):
@@ -64,6 +91,7 @@ class GymAdapter(SoftlearningEnv):
 
         if env is None:
             assert (domain is not None and task is not None), (domain, task)
+            register_custom_environments()
             env_id = f"{domain}-{task}"
             env = gym.envs.make(env_id, **kwargs)
         else:
@@ -1,29 +1,46 @@
-from .adapters.gym_adapter import GymAdapter
+import functools
+
+
+# The adapters are imported on first use: dm_control and robosuite are slow
+# to import and most experiments only ever create gym environments.
+def create_gym_adapter(*args, **kwargs):
+    from .adapters.gym_adapter import GymAdapter
+
+    return GymAdapter(*args, **kwargs)
+
+
+def create_dm_control_adapter(*args, **kwargs):
+    try:
+        from .adapters.dm_control_adapter import DmControlAdapter
+    except ModuleNotFoundError as e:
+        if 'dm_control' not in e.msg:
+            raise
+        raise ModuleNotFoundError(
+            "dm_control package not found. Run"
+            " `pip install git+https://github.com/deepmind/dm_control.git`"
+            " to use dm_control environments.") from e
+
+    return DmControlAdapter(*args, **kwargs)
 
-ADAPTERS = {
-    'gym': GymAdapter,
-}
 
-try:
-    from .adapters.dm_control_adapter import DmControlAdapter
-    ADAPTERS['dm_control'] = DmControlAdapter
-except ModuleNotFoundError as e:
-    if 'dm_control' not in e.msg:
-        raise
+def create_robosuite_adapter(*args, **kwargs):
+    try:
+        from .adapters.robosuite_adapter import RobosuiteAdapter
+    except ModuleNotFoundError as e:
+        if 'robosuite' not in e.msg:
+            raise
+        raise ModuleNotFoundError(
+            "robosuite package not found. Run `pip install robosuite`"
+            " to use robosuite environments.") from e
 
-    print("Warning: dm_control package not found. Run"
-          " `pip install git+https://github.com/deepmind/dm_control.git`"
-          " to use dm_control environments.")
+    return RobosuiteAdapter(*args, **kwargs)
 
-try:
-    from .adapters.robosuite_adapter import RobosuiteAdapter
-    ADAPTERS['robosuite'] = RobosuiteAdapter
-except ModuleNotFoundError as e:
-    if 'robosuite' not in e.msg:
-        raise
 
-    print("Warning: robosuite package not found. Run `pip install robosuite`"
-          " to use robosuite environments.")
+ADAPTERS = {
+    'gym': create_gym_adapter,
+    'dm_control': create_dm_control_adapter,
+    'robosuite': create_robosuite_adapter,
+}
 
 UNIVERSES = set(ADAPTERS.keys())
 
@@ -36,20 +53,31 @@ def get_environment_from_params(environment_params):
     domain = environment_params['domain']
     environment_kwargs = environment_params.get('kwargs', {}).copy()
 
-    return get_environment(universe, domain, task, env_params)
+    return get_environment(universe, domain, task, environment_kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def register_goal_example_environments(manip):
+    """Register the goal example environments of multiworld and metaworld,
+    or of manip_envs, once per process."""
+    if manip:
+        import manip_envs
+    else:
+        from multiworld.envs.mujoco import register_goal_example_envs
+        register_goal_example_envs()
+        from metaworld.envs.mujoco import register_rl_with_videos_custom_envs
+        register_rl_with_videos_custom_envs()
+#        import mj_envs.hand_manipulation_suite
+
+#        from metaworld.envs.mujoco.sawyer_xyz import register_environments; register_environments()
+
 
 def get_goal_example_environment_from_variant(variant):
     import gym
-    
-    if variant['task'] not in [env.id for env  in gym.envs.registry.all()]:
-        if 'Manip' in variant['task']:
-            import manip_envs
-        else:
-            from multiworld.envs.mujoco import register_goal_example_envs
-            register_goal_example_envs()
-            from metaworld.envs.mujoco import register_rl_with_videos_custom_envs
-            register_rl_with_videos_custom_envs()
-#            import mj_envs.hand_manipulation_suite
-
-    #        from metaworld.envs.mujoco.sawyer_xyz import register_environments; register_environments()
+    from .adapters.gym_adapter import GymAdapter, register_custom_environments
+
+    register_custom_environments()
+    if variant['task'] not in gym.envs.registry.env_specs:
+        register_goal_example_environments('Manip' in variant['task'])
+
     return GymAdapter(env=gym.make(variant['task']))
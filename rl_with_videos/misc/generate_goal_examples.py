@@ -1,3 +1,7 @@
+import multiprocessing
+import os
+import tempfile
+
 import numpy as np
 
 from rl_with_videos.environments.utils import get_goal_example_environment_from_variant
@@ -22,27 +26,122 @@ PUSH_TASKS = [
     ]
 
 def get_goal_example_from_variant(variant):
-    
-    env = get_goal_example_environment_from_variant(variant)
-    total_goal_examples = variant['data_params']['n_goal_examples'] \
-        + variant['data_params']['n_goal_examples_validation_max']
-
-    if variant['task'] in DOOR_TASKS:
-        goal_examples = generate_door_goal_examples(total_goal_examples, env)
-    elif variant['task'] in PUSH_TASKS:
-        goal_examples = generate_push_goal_examples(total_goal_examples, env)
-    elif variant['task'] in PICK_TASKS:
-        goal_examples = generate_pick_goal_examples(total_goal_examples, env, variant['task'])
-    else:
-        raise NotImplementedError
-
-    n_goal_examples = variant['data_params']['n_goal_examples']
+    """Return the train and validation goal examples of `variant['task']`.
+
+    Reads `n_goal_examples`, `n_goal_examples_validation_max`,
+    `goal_examples_cache_dir` and `goal_example_workers` from
+    `variant['data_params']`, see `load_or_generate_goal_examples`. The
+    parallel workers are seeded from `variant['run_params']['seed']`.
+    """
+    data_params = variant['data_params']
+    total_goal_examples = data_params['n_goal_examples'] \
+        + data_params.get('n_goal_examples_validation_max', 0)
+
+    goal_examples = load_or_generate_goal_examples(
+        variant['task'],
+        total_goal_examples,
+        cache_dir=data_params.get('goal_examples_cache_dir'),
+        n_workers=data_params.get('goal_example_workers', 1),
+        seed=variant.get('run_params', {}).get('seed'))
+
+    n_goal_examples = data_params['n_goal_examples']
 
     goal_examples_train = goal_examples[:n_goal_examples]
     goal_examples_validation = goal_examples[n_goal_examples:]
 
     return goal_examples_train, goal_examples_validation
 
+def generate_goal_examples(task, total_goal_examples, env):
+    if task in DOOR_TASKS:
+        return generate_door_goal_examples(total_goal_examples, env)
+    elif task in PUSH_TASKS:
+        return generate_push_goal_examples(total_goal_examples, env)
+    elif task in PICK_TASKS:
+        return generate_pick_goal_examples(total_goal_examples, env, task)
+    raise NotImplementedError(task)
+
+def _generate_goal_examples_with_seed(task, total_goal_examples, seed):
+    """Generate goal examples in a fresh environment of a worker process."""
+    np.random.seed(seed)
+    env = get_goal_example_environment_from_variant({'task': task})
+    env.seed(seed)
+    return generate_goal_examples(task, total_goal_examples, env)
+
+def generate_goal_examples_in_parallel(task,
+                                       total_goal_examples,
+                                       n_workers,
+                                       seed=None):
+    """Split the goal examples over `n_workers` processes with independent
+    seeds, every process simulating its own environment. The workers are
+    seeded with `seed + i`, a `seed` of `None` draws it from the global
+    random state."""
+    n_workers = max(min(n_workers, total_goal_examples), 1)
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 31 - n_workers)
+    counts = [
+        total_goal_examples // n_workers
+        + (1 if i < total_goal_examples % n_workers else 0)
+        for i in range(n_workers)
+    ]
+
+    # Spawned instead of forked, the parent may already hold a mujoco or
+    # TensorFlow context that must not be shared with the children.
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(n_workers) as pool:
+        goal_examples = pool.starmap(
+            _generate_goal_examples_with_seed,
+            [(task, count, seed + i) for i, count in enumerate(counts)])
+
+    return np.concatenate(goal_examples, axis=0)
+
+def goal_examples_cache_path(cache_dir, task, total_goal_examples):
+    return os.path.join(cache_dir, f'{task}-{total_goal_examples}.npy')
+
+def load_or_generate_goal_examples(task,
+                                   total_goal_examples,
+                                   cache_dir=None,
+                                   n_workers=1,
+                                   seed=None):
+    """Load the goal examples of `task` from the cache, or generate them.
+
+    The examples of a task are statistically identical in every run, they are
+    cached on disk keyed by the task and the number of examples. Without a
+    cache and with a single worker, the examples are generated in this
+    process, from the global random state, as before.
+
+    Args:
+        task: Gym id of the goal example task.
+        total_goal_examples: Number of goal examples, including the
+            validation examples.
+        cache_dir: Directory of the cached goal examples, `None` disables the
+            cache.
+        n_workers: Number of processes generating the examples.
+        seed: Seed of the first worker process, e.g. the seed of the run.
+    """
+    if cache_dir is not None:
+        cache_path = goal_examples_cache_path(
+            cache_dir, task, total_goal_examples)
+        if os.path.exists(cache_path):
+            return np.load(cache_path)
+
+    if n_workers > 1:
+        goal_examples = generate_goal_examples_in_parallel(
+            task, total_goal_examples, n_workers, seed=seed)
+    else:
+        env = get_goal_example_environment_from_variant({'task': task})
+        goal_examples = generate_goal_examples(task, total_goal_examples, env)
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to a temporary file and renamed, so that concurrent trials
+        # never load a partially written cache.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, goal_examples)
+        os.replace(tmp_path, cache_path)
+
+    return goal_examples
+
 def generate_pick_goal_examples(total_goal_examples, env, task_name):
     max_attempt = 50
     top_level_attempts = 10*total_goal_examples
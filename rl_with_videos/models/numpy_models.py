@@ -0,0 +1,170 @@
+"""NumPy-only inference versions of the feedforward and convnet models.
+
+The models mirror `feedforward_model` and `convnet_preprocessor` and take
+their weights in the order of the corresponding keras `get_weights()`, i.e.
+alternating kernels and biases layer by layer. They don't import tensorflow,
+so they can be used in processes that only run inference.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+}
+
+POOL_FUNCTIONS = {
+    'MaxPool2D': np.max,
+    'MaxPooling2D': np.max,
+    'AvgPool2D': np.mean,
+    'AveragePooling2D': np.mean,
+}
+
+
+def _pair(value):
+    return tuple(value) if isinstance(value, (tuple, list)) else (value, value)
+
+
+def conv2d_same(images, kernel, bias):
+    """Stride 1 convolution with 'SAME' padding of (N, H, W, C) images."""
+    kernel_height, kernel_width = kernel.shape[:2]
+    # same split of the padding as tensorflow, the extra row/column goes last
+    padded = np.pad(images, (
+        (0, 0),
+        ((kernel_height - 1) // 2, kernel_height // 2),
+        ((kernel_width - 1) // 2, kernel_width // 2),
+        (0, 0)))
+    windows = sliding_window_view(
+        padded, (kernel_height, kernel_width), axis=(1, 2))
+    # windows: (N, H, W, C, kernel_height, kernel_width)
+    return np.tensordot(windows, kernel, axes=([4, 5, 3], [0, 1, 2])) + bias
+
+
+def pool2d(images, pool_size, strides, pool_type='MaxPool2D'):
+    """Pooling with 'VALID' padding of (N, H, W, C) images."""
+    pool_height, pool_width = _pair(pool_size)
+    stride_height, stride_width = _pair(strides)
+    windows = sliding_window_view(
+        images, (pool_height, pool_width), axis=(1, 2)
+    )[:, ::stride_height, ::stride_width]
+    return POOL_FUNCTIONS[pool_type](windows, axis=(-2, -1))
+
+
+class NumpyFeedforwardModel(object):
+    def __init__(self,
+                 hidden_layer_sizes,
+                 activation='relu',
+                 output_activation='linear',
+                 output_size=None):
+        self._activations = (
+            [ACTIVATIONS[activation]] * len(hidden_layer_sizes)
+            + [ACTIVATIONS[output_activation]])
+        # the output size is only known to the caller, None skips its check
+        self._layer_sizes = (*hidden_layer_sizes, output_size)
+        self.num_weights = 2 * len(self._activations)
+        self._weights = None
+
+    def set_weights(self, weights):
+        assert len(weights) == self.num_weights, (
+            len(weights), self.num_weights)
+        for kernel, units in zip(weights[::2], self._layer_sizes):
+            assert units is None or np.shape(kernel)[-1] == units, (
+                np.shape(kernel), units)
+        self._weights = weights
+
+    def __call__(self, inputs):
+        out = np.concatenate(inputs, axis=-1)
+        for i, activation in enumerate(self._activations):
+            kernel, bias = self._weights[2 * i], self._weights[2 * i + 1]
+            out = activation(out @ kernel + bias)
+        return out
+
+
+class NumpyConvnetPreprocessor(object):
+    def __init__(self,
+                 image_shape,
+                 output_size=None,
+                 conv_filters=(32, 32),
+                 conv_kernel_sizes=((5, 5), (5, 5)),
+                 pool_type='MaxPool2D',
+                 pool_sizes=((2, 2), (2, 2)),
+                 pool_strides=(2, 2),
+                 dense_hidden_layer_sizes=(64, 64),
+                 **kwargs):
+        self._image_shape = tuple(image_shape)
+        self._image_size = int(np.prod(image_shape))
+        self._pool_type = pool_type
+        # zipped like `conv_layers`, the shortest of the lists sets the depth
+        self._conv_layers = list(zip(
+            conv_filters, conv_kernel_sizes, pool_sizes, pool_strides))
+        self._num_conv_weights = 2 * len(self._conv_layers)
+
+        self._dense = (
+            NumpyFeedforwardModel(
+                dense_hidden_layer_sizes, output_size=output_size)
+            if dense_hidden_layer_sizes
+            else None)
+        self.num_weights = self._num_conv_weights + (
+            self._dense.num_weights if self._dense is not None else 0)
+        self._weights = None
+
+    def set_weights(self, weights):
+        assert len(weights) == self.num_weights, (
+            len(weights), self.num_weights)
+        for kernel, (filters, kernel_size, _, _) in zip(
+                weights[:self._num_conv_weights:2], self._conv_layers):
+            assert np.shape(kernel)[:2] == _pair(kernel_size), (
+                np.shape(kernel), kernel_size)
+            assert np.shape(kernel)[-1] == filters, (
+                np.shape(kernel), filters)
+        self._weights = weights[:self._num_conv_weights]
+        if self._dense is not None:
+            self._dense.set_weights(weights[self._num_conv_weights:])
+
+    def __call__(self, inputs):
+        concatenated = np.concatenate(inputs, axis=-1)
+        images = concatenated[..., :self._image_size].reshape(
+            (-1, *self._image_shape))
+        input_raw = concatenated[..., self._image_size:]
+
+        out = images
+        for i, (_, _, pool_size, strides) in enumerate(self._conv_layers):
+            kernel, bias = self._weights[2 * i], self._weights[2 * i + 1]
+            out = np.maximum(conv2d_same(out, kernel, bias), 0)
+            out = pool2d(out, pool_size, strides, self._pool_type)
+
+        out = np.concatenate(
+            (out.reshape(out.shape[0], -1), input_raw), axis=-1)
+        if self._dense is not None:
+            out = self._dense([out])
+        return out
+
+
+NUMPY_PREPROCESSORS = {
+    'convnet_preprocessor': NumpyConvnetPreprocessor,
+    'feedforward_preprocessor': NumpyFeedforwardModel,
+}
+
+
+def get_numpy_preprocessor_from_params(preprocessor_params):
+    if preprocessor_params is None:
+        return None
+    preprocessor_type = preprocessor_params.get('type', None)
+    if preprocessor_type is None:
+        return None
+
+    preprocessor_kwargs = dict(preprocessor_params.get('kwargs', {}))
+    if preprocessor_type == 'feedforward_preprocessor':
+        preprocessor_kwargs = {
+            key: preprocessor_kwargs[key]
+            for key in ('hidden_layer_sizes',
+                        'activation',
+                        'output_activation',
+                        'output_size')
+            if key in preprocessor_kwargs
+        }
+    return NUMPY_PREPROCESSORS[preprocessor_type](**preprocessor_kwargs)
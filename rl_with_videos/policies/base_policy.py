@@ -29,6 +29,22 @@ class BasePolicy(Serializable):
         """Compute (numeric) log probs for given observations and actions."""
         raise NotImplementedError
 
+    def actions_and_log_pis_np(self, conditions, return_raw_actions=False):
+        """Compute (numeric) actions and their log probs in one call.
+
+        Policies that can compute both with a single forward pass override
+        this, the default runs `actions_np` followed by `log_pis_np`.
+
+        Returns:
+            actions, log_pis and, if `return_raw_actions`, the actions before
+            squashing (None if the policy doesn't provide them).
+        """
+        actions = self.actions_np(conditions)
+        log_pis = self.log_pis_np(conditions, actions)
+        if return_raw_actions:
+            return actions, log_pis, None
+        return actions, log_pis
+
     @contextmanager
     def set_deterministic(self, deterministic=True):
         """Context manager for changing the determinism of the policy.
@@ -189,6 +189,36 @@ class GaussianPolicy(LatentSpacePolicy):
         assert not self._deterministic, self._deterministic
         return self.log_pis_model.predict([*conditions, actions])
 
+    def actions_and_log_pis_np(self, conditions, return_raw_actions=False):
+        """Sample actions and their log probs with one `predict` call.
+
+        Uses `diagnostics_model`, which evaluates the preprocessor and the
+        shift and scale network only once for both outputs. Smoothed latents
+        are not part of that model, so smoothing policies fall back to the
+        separate calls and recover the raw actions by inverting the squash.
+        """
+        assert not self._deterministic, self._deterministic
+        if self._smoothing_alpha != 0:
+            actions, log_pis = super(
+                GaussianPolicy, self).actions_and_log_pis_np(conditions)
+            if not return_raw_actions:
+                return actions, log_pis
+
+            if self._squash:
+                # tanh saturates at +-1 in float32, keep the inverse finite
+                bound = 1.0 - np.finfo(actions.dtype).eps
+                raw_actions = np.arctanh(np.clip(actions, -bound, bound))
+            else:
+                raw_actions = actions
+            return actions, log_pis, raw_actions
+
+        (_, _, log_pis, raw_actions, actions) = (
+            self.diagnostics_model.predict(conditions))
+
+        if return_raw_actions:
+            return actions, log_pis, raw_actions
+        return actions, log_pis
+
     def get_diagnostics(self, conditions):
         """Return diagnostic information of the policy.
 
@@ -0,0 +1,205 @@
+"""NumPy-only inference version of `FeedforwardGaussianPolicy`."""
+
+from copy import deepcopy
+
+import numpy as np
+
+from rl_with_videos.models.numpy_models import (
+    NumpyFeedforwardModel,
+    get_numpy_preprocessor_from_params)
+
+from .base_policy import BasePolicy
+
+
+SCALE_DIAG_MIN_MAX = (-20, 2)
+
+
+def flatten_weights(weights):
+    """Concatenate a list of weight arrays into one flat float32 array."""
+    return np.concatenate([
+        np.asarray(weight, dtype=np.float32).ravel() for weight in weights
+    ])
+
+
+class NumpyGaussianPolicy(BasePolicy):
+    """Mirror of `FeedforwardGaussianPolicy` that runs without tensorflow.
+
+    Takes the weights of `FeedforwardGaussianPolicy.get_weights()`, i.e.
+    the weights of the preprocessor followed by the weights of the shift and
+    log scale network. The first `set_weights` call fixes the weight shapes,
+    afterwards all weights live in one flat buffer and can be updated with a
+    single copy through `set_flat_weights`.
+
+    Stochastic actions are sampled like the tensorflow policy:
+    `tanh(shift + exp(log_scale_diag) * latents)` with standard normal
+    latents, deterministic actions are `tanh(shift)`.
+    """
+
+    def __init__(self,
+                 input_shapes,
+                 output_shape,
+                 hidden_layer_sizes,
+                 activation='relu',
+                 output_activation='linear',
+                 squash=True,
+                 preprocessor_params=None,
+                 smoothing_coefficient=None,
+                 seed=None,
+                 name=None):
+        self._Serializable__initialize(locals())
+        super(NumpyGaussianPolicy, self).__init__()
+
+        self._input_shapes = input_shapes
+        self._output_shape = output_shape
+        self._squash = squash
+        self._name = name
+
+        self._preprocessor = get_numpy_preprocessor_from_params(
+            preprocessor_params)
+        self._shift_and_log_scale_diag_net = NumpyFeedforwardModel(
+            hidden_layer_sizes,
+            activation=activation,
+            output_activation=output_activation,
+            output_size=output_shape[0] * 2)
+
+        assert (smoothing_coefficient is None
+                or 0 <= smoothing_coefficient <= 1)
+        self._smoothing_alpha = smoothing_coefficient or 0
+        self._smoothing_beta = (
+            np.sqrt(1.0 - np.power(self._smoothing_alpha, 2.0))
+            / (1.0 - self._smoothing_alpha))
+        self._reset_smoothing_x()
+
+        self._random_state = np.random.RandomState(seed)
+        self._flat_weights = None
+        self._weights = None
+
+    def _reset_smoothing_x(self):
+        self._smoothing_x = np.zeros((1, *self._output_shape))
+
+    def reset(self):
+        self._reset_smoothing_x()
+
+    def get_weights(self):
+        if self._weights is None:
+            return None
+        return [weight.copy() for weight in self._weights]
+
+    def set_weights(self, weights):
+        if self._flat_weights is None:
+            shapes = [np.shape(weight) for weight in weights]
+            sizes = [int(np.prod(shape)) for shape in shapes]
+            self._flat_weights = np.zeros(sum(sizes), dtype=np.float32)
+            offsets = np.cumsum([0] + sizes)
+            # views into the flat buffer, updated in place by set_flat_weights
+            self._weights = [
+                self._flat_weights[start:end].reshape(shape)
+                for start, end, shape in zip(offsets[:-1], offsets[1:], shapes)
+            ]
+
+            num_preprocessor_weights = (
+                self._preprocessor.num_weights
+                if self._preprocessor is not None
+                else 0)
+            if self._preprocessor is not None:
+                self._preprocessor.set_weights(
+                    self._weights[:num_preprocessor_weights])
+            self._shift_and_log_scale_diag_net.set_weights(
+                self._weights[num_preprocessor_weights:])
+
+        self.set_flat_weights(flatten_weights(weights))
+
+    def get_flat_weights(self):
+        return self._flat_weights.copy()
+
+    def set_flat_weights(self, flat_weights):
+        assert self._flat_weights is not None, (
+            "set_weights has to be called once before set_flat_weights.")
+        np.copyto(self._flat_weights, flat_weights)
+
+    def _shift_and_log_scale_diag(self, conditions):
+        conditions = [np.asarray(condition, dtype=np.float32)
+                      for condition in conditions]
+        if self._preprocessor is not None:
+            conditions = [self._preprocessor(conditions)]
+        out = self._shift_and_log_scale_diag_net(conditions)
+        shift, log_scale_diag = np.split(out, 2, axis=-1)
+        return shift, np.clip(log_scale_diag, *SCALE_DIAG_MIN_MAX)
+
+    def _latents(self, batch_size):
+        latents = self._random_state.standard_normal(
+            (batch_size, *self._output_shape))
+        if self._smoothing_alpha == 0:
+            return latents
+
+        alpha, beta = self._smoothing_alpha, self._smoothing_beta
+        self._smoothing_x = (
+            alpha * self._smoothing_x + (1.0 - alpha) * latents)
+        return beta * self._smoothing_x
+
+    def _squash_fn(self, raw_actions):
+        return np.tanh(raw_actions) if self._squash else raw_actions
+
+    def actions_np(self, conditions):
+        shift, log_scale_diag = self._shift_and_log_scale_diag(conditions)
+        if self._deterministic:
+            return self._squash_fn(shift)
+
+        raw_actions = (
+            shift + np.exp(log_scale_diag) * self._latents(shift.shape[0]))
+        return self._squash_fn(raw_actions)
+
+    def log_pis_np(self, conditions, actions):
+        assert not self._deterministic, self._deterministic
+        shift, log_scale_diag = self._shift_and_log_scale_diag(conditions)
+
+        raw_actions = np.arctanh(actions) if self._squash else actions
+        latents = (raw_actions - shift) * np.exp(-log_scale_diag)
+        return self._log_pis(latents, raw_actions, log_scale_diag)
+
+    def actions_and_log_pis_np(self, conditions, return_raw_actions=False):
+        assert not self._deterministic, self._deterministic
+        shift, log_scale_diag = self._shift_and_log_scale_diag(conditions)
+
+        latents = self._latents(shift.shape[0])
+        raw_actions = shift + np.exp(log_scale_diag) * latents
+        actions = self._squash_fn(raw_actions)
+        log_pis = self._log_pis(latents, raw_actions, log_scale_diag)
+
+        if return_raw_actions:
+            return actions, log_pis, raw_actions
+        return actions, log_pis
+
+    def _log_pis(self, latents, raw_actions, log_scale_diag):
+        log_pis = np.sum(
+            -0.5 * latents ** 2 - 0.5 * np.log(2 * np.pi) - log_scale_diag,
+            axis=-1)
+        if self._squash:
+            log_pis -= np.sum(
+                2. * (np.log(2.) - raw_actions
+                      - np.logaddexp(0, -2. * raw_actions)),
+                axis=-1)
+        return log_pis[:, None]
+
+    def __setstate__(self, state):
+        # the weights are only known after the first set_weights call
+        pickled_weights = state.pop('pickled_weights')
+        super(BasePolicy, self).__setstate__(state)
+        if pickled_weights is not None:
+            self.set_weights(pickled_weights)
+
+
+def get_numpy_gaussian_policy_from_params(policy_params, env):
+    """Create the `NumpyGaussianPolicy` matching `get_policy_from_variant`."""
+    assert policy_params['type'] == 'GaussianPolicy', policy_params['type']
+    policy_kwargs = deepcopy(policy_params['kwargs'])
+
+    return NumpyGaussianPolicy(
+        input_shapes=(env.active_observation_shape, ),
+        output_shape=env.action_space.shape,
+        **policy_kwargs)
+
+
+def get_numpy_gaussian_policy_from_variant(variant, env):
+    return get_numpy_gaussian_policy_from_params(
+        variant['policy_params'], env)
@@ -0,0 +1,87 @@
+import numpy as np
+import tensorflow as tf
+
+from rl_with_videos.policies.gaussian_policy import FeedforwardGaussianPolicy
+from rl_with_videos.policies.numpy_gaussian_policy import NumpyGaussianPolicy
+from rl_with_videos.preprocessors.convnet import convnet_preprocessor
+
+
+IMAGE_SHAPE = (8, 8, 3)
+CONVNET_PARAMS = {
+    'type': 'convnet_preprocessor',
+    'kwargs': {
+        'image_shape': IMAGE_SHAPE,
+        'output_size': 16,
+        'conv_filters': (4, 4),
+        'conv_kernel_sizes': ((3, 3), (3, 3)),
+        'pool_type': 'MaxPool2D',
+        'pool_sizes': ((2, 2), (2, 2)),
+        'pool_strides': (2, 2),
+        'dense_hidden_layer_sizes': (16, ),
+    },
+}
+
+
+class NumpyGaussianPolicyTest(tf.test.TestCase):
+    def _create_policies(self, input_shape, preprocessor_params=None):
+        preprocessor = (
+            convnet_preprocessor(
+                input_shapes=(input_shape, ),
+                **preprocessor_params['kwargs'])
+            if preprocessor_params is not None
+            else None)
+        policy = FeedforwardGaussianPolicy(
+            input_shapes=(input_shape, ),
+            output_shape=(2, ),
+            hidden_layer_sizes=(16, 16),
+            squash=True,
+            preprocessor=preprocessor)
+        numpy_policy = NumpyGaussianPolicy(
+            input_shapes=(input_shape, ),
+            output_shape=(2, ),
+            hidden_layer_sizes=(16, 16),
+            squash=True,
+            preprocessor_params=preprocessor_params)
+        numpy_policy.set_weights(policy.get_weights())
+
+        return policy, numpy_policy
+
+    def _assert_policies_match(self, policy, numpy_policy, observations):
+        with policy.set_deterministic(True), \
+             numpy_policy.set_deterministic(True):
+            self.assertAllClose(
+                numpy_policy.actions_np([observations]),
+                policy.actions_np([observations]),
+                atol=1e-5)
+
+        actions = np.random.uniform(
+            -0.9, 0.9, (observations.shape[0], 2)).astype(np.float32)
+        self.assertAllClose(
+            numpy_policy.log_pis_np([observations], actions),
+            policy.log_pis_np([observations], actions),
+            atol=1e-4)
+
+    def test_matches_tensorflow_policy(self):
+        policy, numpy_policy = self._create_policies((5, ))
+        observations = np.random.uniform(-1, 1, (4, 5)).astype(np.float32)
+        self._assert_policies_match(policy, numpy_policy, observations)
+
+    def test_matches_tensorflow_policy_with_convnet(self):
+        input_shape = (int(np.prod(IMAGE_SHAPE)) + 2, )
+        policy, numpy_policy = self._create_policies(
+            input_shape, preprocessor_params=CONVNET_PARAMS)
+        observations = np.random.uniform(
+            0, 1, (4, *input_shape)).astype(np.float32)
+        self._assert_policies_match(policy, numpy_policy, observations)
+
+    def test_stochastic_actions_are_squashed(self):
+        _, numpy_policy = self._create_policies((5, ))
+        observations = np.random.uniform(-1, 1, (4, 5)).astype(np.float32)
+        actions, log_pis = numpy_policy.actions_and_log_pis_np([observations])
+        self.assertEqual(actions.shape, (4, 2))
+        self.assertEqual(log_pis.shape, (4, 1))
+        self.assertTrue(np.all(np.abs(actions) <= 1.0))
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -2,3 +2,4 @@ from .simple_replay_pool import SimpleReplayPool
 from .extra_policy_info_replay_pool import ExtraPolicyInfoReplayPool
 from .union_pool import UnionPool
 from .trajectory_replay_pool import TrajectoryReplayPool
+from .flat_trajectory_replay_pool import FlatTrajectoryReplayPool
@@ -1,8 +1,14 @@
 from gym.spaces import Dict
+import numpy as np
 
 from .flexible_replay_pool import FlexibleReplayPool
 from .simple_replay_pool import normalize_observation_fields
 
+def _unallocated(shape, dtype):
+    """Field initializer of pools whose fields are attached later."""
+    return np.empty((0, *shape[1:]), dtype=dtype)
+
+
 class ActionFreeReplayPool(FlexibleReplayPool):
     def __init__(self,
                  observation_space,
@@ -13,7 +19,14 @@ class ActionFreeReplayPool(FlexibleReplayPool):
                  remove_rewards=False,
                  use_ground_truth_actions=False,
                  max_demo_length=-1,
+                 shared_memory=False,
                  **kwargs):
+        """
+        Args:
+            shared_memory (`bool`): Attach the dataset read-only from the
+                node-wide `DatasetRegistry` instead of loading a private copy,
+                so concurrent trials on a node share one copy of it.
+        """
         extra_fields = extra_fields or {}
 #        action_space = environment.action_space
 #        assert isinstance(observation_space, Dict), observation_space
@@ -51,10 +64,19 @@ class ActionFreeReplayPool(FlexibleReplayPool):
             }
         }
 
+        if shared_memory:
+            fields = {
+                field_name: {**field_attrs, 'initializer': _unallocated}
+                for field_name, field_attrs in fields.items()
+            }
+
         super(ActionFreeReplayPool, self).__init__(
             *args, fields_attrs=fields, **kwargs)
         print("about to load replay pool")
-        self.load_experience(data_path)
+        if shared_memory:
+            self.attach_experience(data_path)
+        else:
+            self.load_experience(data_path)
         print("loaded experience of size:", self.size) 
         if not use_ground_truth_actions:
             self.fields.pop('actions')
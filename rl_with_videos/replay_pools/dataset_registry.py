@@ -0,0 +1,120 @@
+"""Node-wide registry of static datasets in shared memory.
+
+The first pool on a node that loads a dataset unpickles it once and writes
+every field to a `.npy` file under the registry root, which defaults to
+`/dev/shm`. Every pool, including later trials on the same node, then maps
+these files read-only with `np.load(mmap_mode='r')`. The trials share the
+page cache of the files instead of holding their own copy of the dataset.
+"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+
+DEFAULT_ROOT = (
+    '/dev/shm/rl_with_videos_datasets'
+    if os.path.isdir('/dev/shm')
+    else os.path.join(tempfile.gettempdir(), 'rl_with_videos_datasets'))
+
+
+class DatasetRegistry(object):
+    def __init__(self, root=None):
+        """
+        Args:
+            root (`str`): Directory the datasets are stored in. Should be on a
+                memory backed file system to get the loading speed of RAM.
+                Defaults to the `RLV_DATASET_REGISTRY` environment variable
+                or `DEFAULT_ROOT`.
+        """
+        self._root = root or os.environ.get(
+            'RLV_DATASET_REGISTRY', DEFAULT_ROOT)
+        os.makedirs(self._root, exist_ok=True)
+
+    def _key(self, data_path, dtypes):
+        """Identify a dataset by its file and the dtypes it is stored as.
+
+        Returns:
+            The key of the file and dtypes, and the key of its current
+            version. The size and modification time of the file make up the
+            version, so a dataset that is replaced on disk is registered
+            again and evicts the older versions.
+        """
+        description = json.dumps({
+            'data_path': os.path.abspath(data_path),
+            'dtypes': {
+                field_name: np.dtype(dtype).str
+                for field_name, dtype in sorted(dtypes.items())
+            },
+        }, sort_keys=True)
+        stat = os.stat(data_path)
+        version = f'{stat.st_size}-{stat.st_mtime_ns}'
+        return hashlib.sha1(description.encode()).hexdigest(), version
+
+    def get(self, data_path, dtypes):
+        """Return the fields of the dataset at `data_path` as read-only
+        memory maps, registering the dataset first if needed.
+
+        Args:
+            data_path (`str`): Path of a gzipped pickle of a dict from field
+                names to arrays, as written by `FlexibleReplayPool`.
+            dtypes: Dict from field names to the dtypes the fields are
+                stored as. Fields of the dataset that aren't in `dtypes` keep
+                their dtype.
+        """
+        key, version = self._key(data_path, dtypes)
+        dataset_dir = os.path.join(self._root, f'{key}-{version}')
+
+        if not os.path.isdir(dataset_dir):
+            # Concurrent trials wait for the first one instead of loading the
+            # same dataset in parallel.
+            with open(os.path.join(self._root, f'{key}.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if not os.path.isdir(dataset_dir):
+                    self._register(data_path, dtypes, dataset_dir)
+                    self._evict(key, keep=dataset_dir)
+
+        return {
+            file_name[:-len('.npy')]: np.load(
+                os.path.join(dataset_dir, file_name), mmap_mode='r')
+            for file_name in sorted(os.listdir(dataset_dir))
+        }
+
+    def _register(self, data_path, dtypes, dataset_dir):
+        # Written to a temporary directory and renamed, so a dataset
+        # directory is always complete.
+        tmp_dir = tempfile.mkdtemp(dir=self._root)
+        try:
+            with gzip.open(data_path, 'rb') as f:
+                samples = pickle.load(f)
+
+            for field_name, values in samples.items():
+                values = np.asarray(values, dtype=dtypes.get(field_name))
+                np.save(os.path.join(tmp_dir, f'{field_name}.npy'), values)
+                del values
+            os.rename(tmp_dir, dataset_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def _evict(self, key, keep):
+        """Remove the older versions of the dataset with `key`.
+
+        Pools that still map the files of an older version keep reading
+        them, the memory is only freed once the last of them is closed.
+        """
+        for dir_name in os.listdir(self._root):
+            dataset_dir = os.path.join(self._root, dir_name)
+            if dir_name.startswith(f'{key}-') and dataset_dir != keep:
+                shutil.rmtree(dataset_dir, ignore_errors=True)
+
+    def clear(self):
+        """Remove all the registered datasets of the node."""
+        shutil.rmtree(self._root, ignore_errors=True)
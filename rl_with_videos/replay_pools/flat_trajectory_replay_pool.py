@@ -0,0 +1,258 @@
+import gzip
+import pickle
+
+import numpy as np
+
+from rl_with_videos.utils.numpy import softmax
+from .replay_pool import ReplayPool
+
+
+class FlatTrajectoryReplayPool(ReplayPool):
+    """Trajectory pool backed by one contiguous array per field.
+
+    Trajectories are appended back to back to the field arrays, and the
+    start offset and length of every trajectory is kept in an index. A
+    batch is gathered with a single fancy-index per field, sampling
+    trajectories only takes a `searchsorted` over the cumulative sampling
+    distribution, which is updated in `add_paths` instead of on every
+    `random_batch` call.
+
+    Args:
+        max_size: Maximum number of trajectories, the oldest trajectories
+            are dropped first (same as `TrajectoryReplayPool`).
+        trajectory_weighting: 'uniform' samples uniformly over all stored
+            samples. 'softmax_length' samples a trajectory with the softmax
+            of the normalized trajectory lengths and then a step uniformly
+            within it, like `TrajectoryReplayPool.random_batch`.
+    """
+
+    def __init__(self,
+                 observation_space,
+                 action_space,
+                 max_size,
+                 trajectory_weighting='uniform'):
+        super(FlatTrajectoryReplayPool, self).__init__()
+
+        assert trajectory_weighting in ('uniform', 'softmax_length'), (
+            trajectory_weighting)
+
+        max_size = int(max_size)
+        self._max_size = max_size
+        self._trajectory_weighting = trajectory_weighting
+
+        self.fields = None
+        self._capacity = 0
+        # flat offsets of the oldest stored sample and behind the newest one
+        self._start = 0
+        self._end = 0
+
+        # trajectory index, the live trajectories are [self._first, self._count)
+        self._trajectory_starts = np.zeros(0, dtype=np.int64)
+        self._trajectory_lengths = np.zeros(0, dtype=np.int64)
+        self._first = 0
+        self._count = 0
+        self._cumulative_probabilities = None
+
+        self._size = 0
+        self._num_samples = 0
+        self._trajectories_since_save = 0
+
+    @property
+    def num_trajectories(self):
+        return self._count - self._first
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def num_samples(self):
+        return self._num_samples
+
+    @property
+    def field_names(self):
+        return list(self.fields.keys()) if self.fields is not None else []
+
+    def _reserve(self, num_samples, num_trajectories):
+        """Make room for new samples and trajectories behind the live ones."""
+        if self._end + num_samples > self._capacity:
+            live = self._end - self._start
+            capacity = max(self._capacity, live + num_samples)
+            if capacity > self._capacity or self._start > 0:
+                capacity = max(capacity, 2 * live)
+                self.fields = {
+                    field_name: self._moved(values, capacity)
+                    for field_name, values in self.fields.items()
+                }
+                self._trajectory_starts[self._first:self._count] -= (
+                    self._start)
+                self._end -= self._start
+                self._start = 0
+                self._capacity = capacity
+
+        if self._count + num_trajectories > len(self._trajectory_starts):
+            live = self._count - self._first
+            index_size = max(2 * live, live + num_trajectories, 16)
+            starts = np.zeros(index_size, dtype=np.int64)
+            lengths = np.zeros(index_size, dtype=np.int64)
+            starts[:live] = self._trajectory_starts[self._first:self._count]
+            lengths[:live] = self._trajectory_lengths[self._first:self._count]
+            self._trajectory_starts, self._trajectory_lengths = starts, lengths
+            self._first, self._count = 0, live
+
+    def _moved(self, values, capacity):
+        result = np.empty((capacity, *values.shape[1:]), dtype=values.dtype)
+        live = self._end - self._start
+        result[:live] = values[self._start:self._end]
+        return result
+
+    def add_paths(self, trajectories):
+        if len(trajectories) == 0:
+            return
+
+        lengths = np.array([
+            trajectory[next(iter(trajectory.keys()))].shape[0]
+            for trajectory in trajectories
+        ], dtype=np.int64)
+        num_samples = int(np.sum(lengths))
+
+        if self.fields is None:
+            self.fields = {
+                field_name: np.empty(
+                    (0, *values.shape[1:]), dtype=values.dtype)
+                for field_name, values in trajectories[0].items()
+            }
+
+        self._reserve(num_samples, len(trajectories))
+
+        for field_name, values in self.fields.items():
+            values[self._end:self._end + num_samples] = np.concatenate([
+                trajectory[field_name] for trajectory in trajectories
+            ])
+
+        new = slice(self._count, self._count + len(trajectories))
+        self._trajectory_starts[new] = (
+            self._end + np.cumsum(lengths) - lengths)
+        self._trajectory_lengths[new] = lengths
+        self._count += len(trajectories)
+        self._end += num_samples
+        self._size += num_samples
+        self._num_samples += num_samples
+        self._trajectories_since_save += len(trajectories)
+
+        num_dropped = max(self.num_trajectories - self._max_size, 0)
+        if num_dropped > 0:
+            dropped = slice(self._first, self._first + num_dropped)
+            self._size -= int(np.sum(self._trajectory_lengths[dropped]))
+            self._first += num_dropped
+            self._start = self._trajectory_starts[self._first]
+
+        self._update_sampling_distribution()
+
+    def _update_sampling_distribution(self):
+        if self._trajectory_weighting != 'softmax_length':
+            return
+        lengths = self._trajectory_lengths[self._first:self._count]
+        probabilities = softmax(lengths / self._size)
+        self._cumulative_probabilities = np.cumsum(probabilities)
+
+    def add_path(self, trajectory):
+        self.add_paths([trajectory])
+
+    def add_sample(self, sample):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} only supports adding full paths at"
+            " once.")
+
+    def add_samples(self, samples):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} only supports adding full paths at"
+            " once.")
+
+    def terminate_episode(self):
+        pass
+
+    def batch_by_flat_indices(self, indices, field_name_filter=None):
+        field_names = self.field_names
+        if field_name_filter is not None:
+            field_names = [
+                field_name for field_name in field_names
+                if field_name_filter(field_name)
+            ]
+
+        return {
+            field_name: self.fields[field_name][indices]
+            for field_name in field_names
+        }
+
+    def batch_by_indices(self,
+                         episode_indices,
+                         step_indices,
+                         field_name_filter=None):
+        assert len(episode_indices) == len(step_indices)
+        indices = self._trajectory_starts[
+            self._first + np.asarray(episode_indices, dtype=np.int64)
+        ] + np.asarray(step_indices, dtype=np.int64)
+        return self.batch_by_flat_indices(
+            indices, field_name_filter=field_name_filter)
+
+    def random_indices(self, batch_size):
+        if self._trajectory_weighting == 'uniform':
+            return np.random.randint(self._start, self._end, batch_size)
+
+        trajectory_indices = np.searchsorted(
+            self._cumulative_probabilities,
+            np.random.uniform(0, self._cumulative_probabilities[-1],
+                              batch_size),
+            side='right')
+        # guard against the rounding of the last cumulative probability
+        trajectory_indices = np.minimum(
+            trajectory_indices, self.num_trajectories - 1) + self._first
+        step_indices = np.floor(
+            np.random.uniform(0, self._trajectory_lengths[trajectory_indices])
+        ).astype(np.int64)
+        return self._trajectory_starts[trajectory_indices] + step_indices
+
+    def random_batch(self, batch_size, field_name_filter=None, **kwargs):
+        if self.num_trajectories < 1:
+            return {}
+
+        return self.batch_by_flat_indices(
+            self.random_indices(batch_size),
+            field_name_filter=field_name_filter)
+
+    def last_n_batch(self, last_n, field_name_filter=None, **kwargs):
+        if self.num_trajectories < 1:
+            return {}
+
+        indices = np.arange(max(self._end - last_n, self._start), self._end)
+        return self.batch_by_flat_indices(
+            indices, field_name_filter=field_name_filter)
+
+    def _trajectories(self, first, last):
+        return tuple(
+            {
+                field_name: values[start:start + length].copy()
+                for field_name, values in self.fields.items()
+            }
+            for start, length in zip(
+                self._trajectory_starts[first:last],
+                self._trajectory_lengths[first:last])
+        )
+
+    def save_latest_experience(self, pickle_path):
+        start_index = max(
+            self._count - self._trajectories_since_save, self._first)
+        latest_trajectories = self._trajectories(start_index, self._count)
+
+        with gzip.open(pickle_path, 'wb') as f:
+            pickle.dump(latest_trajectories, f)
+
+        self._trajectories_since_save = 0
+
+    def load_experience(self, experience_path):
+        with gzip.open(experience_path, 'rb') as f:
+            latest_trajectories = pickle.load(f)
+
+        self.add_paths(list(latest_trajectories))
+        self._trajectories_since_save = 0
@@ -3,15 +3,89 @@ import pickle
 
 import numpy as np
 
+from .dataset_registry import DatasetRegistry
 from .replay_pool import ReplayPool
 
 
+class BatchArena(object):
+    """Round robin set of preallocated batches.
+
+    `next_batch` hands out the buffers of the arena in turn, so with two
+    buffers the trainer can hold on to one batch while the next one is
+    gathered into the other. The buffers are allocated on first use with
+    `initializer(shape, dtype=dtype)`, which can e.g. return page-locked
+    memory for faster host to device copies.
+    """
+
+    def __init__(self, num_buffers=2, initializer=np.empty):
+        assert num_buffers > 0, num_buffers
+        self._num_buffers = num_buffers
+        self._initializer = initializer
+        self._batches = {}
+        self._counters = {}
+
+    def next_batch(self, batch_size, fields):
+        """Return the next batch of `batch_size` rows for `fields`.
+
+        Args:
+            batch_size (`int`): Number of rows of every field.
+            fields: Dict of the arrays the batch is gathered from. Only their
+                per-sample shapes and dtypes are used.
+        """
+        key = (batch_size, tuple(fields.keys()))
+        if key not in self._batches:
+            self._batches[key] = [None] * self._num_buffers
+            self._counters[key] = 0
+
+        index = self._counters[key]
+        self._counters[key] = (index + 1) % self._num_buffers
+
+        if self._batches[key][index] is None:
+            self._batches[key][index] = {
+                field_name: self._initializer(
+                    (batch_size, *field.shape[1:]), dtype=field.dtype)
+                for field_name, field in fields.items()
+            }
+
+        return self._batches[key][index]
+
+    def __getstate__(self):
+        return {
+            '_num_buffers': self._num_buffers,
+            '_initializer': self._initializer,
+            '_batches': {},
+            '_counters': {},
+        }
+
+
 class FlexibleReplayPool(ReplayPool):
-    def __init__(self, max_size, fields_attrs):
+    def __init__(self,
+                 max_size,
+                 fields_attrs,
+                 validate_indices=True,
+                 num_batch_buffers=0,
+                 batch_initializer=np.empty):
+        """
+        Args:
+            max_size (`int`): Maximum number of samples in the pool.
+            fields_attrs: Dict of the shape and dtype of every field.
+            validate_indices (`bool`): Whether `batch_by_indices` checks that
+                the indices are within the current size of the pool.
+            num_batch_buffers (`int`): If positive, batches are gathered into
+                a `BatchArena` with this many reused buffers instead of newly
+                allocated arrays. A batch of `random_batch` is then only valid
+                until `num_batch_buffers` more batches have been sampled.
+            batch_initializer: Allocation function of the arena buffers.
+        """
         super(FlexibleReplayPool, self).__init__()
 
         max_size = int(max_size)
         self._max_size = max_size
+        self._validate_indices = validate_indices
+        self._batch_arena = (
+            BatchArena(num_batch_buffers, initializer=batch_initializer)
+            if num_batch_buffers > 0
+            else None)
 
         self.fields = {}
         self.fields_attrs = {}
@@ -26,6 +100,14 @@ class FlexibleReplayPool(ReplayPool):
     def size(self):
         return self._size
 
+    @property
+    def batches_from_fields(self):
+        """Whether `batch_by_indices` returns the rows of `fields` as they
+        are, such that other pools (e.g. `UnionPool`) can gather the batches
+        from `fields` directly."""
+        return (type(self).batch_by_indices
+                is FlexibleReplayPool.batch_by_indices)
+
     @property
     def field_names(self):
         return list(self.fields.keys())
@@ -73,6 +155,20 @@ class FlexibleReplayPool(ReplayPool):
 
     def random_batch(self, batch_size, field_name_filter=None, **kwargs):
         random_indices = self.random_indices(batch_size)
+
+        # Only the training batches go through the arena, its buffers are
+        # keyed by the batch size and kept for the lifetime of the pool.
+        if self._batch_arena is not None and kwargs.get('out') is None:
+            field_names = self.field_names
+            if field_name_filter is not None:
+                field_names = self.filter_fields(
+                    field_names, field_name_filter)
+            kwargs['out'] = self._batch_arena.next_batch(
+                len(random_indices), {
+                    field_name: self.fields[field_name]
+                    for field_name in field_names
+                })
+
         return self.batch_by_indices(
             random_indices, field_name_filter=field_name_filter, **kwargs)
 
@@ -103,8 +199,18 @@ class FlexibleReplayPool(ReplayPool):
 
         return filtered_field_names
 
-    def batch_by_indices(self, indices, field_name_filter=None):
-        if np.any(indices % self._max_size > self.size):
+    def batch_by_indices(self, indices, field_name_filter=None, out=None):
+        """Gather the samples at `indices`.
+
+        Args:
+            indices: Indices of the samples.
+            field_name_filter: Optional field names, or a predicate over the
+                field names, of the fields to gather.
+            out: Optional dict of preallocated arrays to gather the fields
+                into, with `len(indices)` rows and the dtypes of the fields.
+        """
+        if (self._validate_indices
+            and np.any(indices % self._max_size >= self.size)):
             raise ValueError(
                 "Tried to retrieve batch with indices greater than current"
                 " size")
@@ -114,10 +220,19 @@ class FlexibleReplayPool(ReplayPool):
             field_names = self.filter_fields(
                 field_names, field_name_filter)
 
-        return {
-            field_name: self.fields[field_name][indices]
-            for field_name in field_names
-        }
+        if out is None:
+            return {
+                field_name: self.fields[field_name][indices]
+                for field_name in field_names
+            }
+
+        for field_name in field_names:
+            np.take(self.fields[field_name],
+                    indices,
+                    axis=0,
+                    out=out[field_name])
+
+        return {field_name: out[field_name] for field_name in field_names}
 
     def save_latest_experience(self, pickle_path):
         latest_samples = self.last_n_batch(self._samples_since_save)
@@ -139,6 +254,40 @@ class FlexibleReplayPool(ReplayPool):
         self.add_samples(latest_samples)
         self._samples_since_save = 0
 
+    def attach_experience(self, experience_path, registry=None):
+        """Like `load_experience`, but map the fields read-only from a
+        `DatasetRegistry` instead of copying them into the pool.
+
+        Every pool that attaches the same dataset on a node shares one copy
+        of it. Samples can't be added to the pool afterwards.
+        """
+        registry = registry or DatasetRegistry()
+        samples = registry.get(experience_path, dtypes={
+            field_name: field_attrs['dtype']
+            for field_name, field_attrs in self.fields_attrs.items()
+        })
+
+        key = list(samples.keys())[0]
+        num_samples = samples[key].shape[0]
+        for field_name, data in samples.items():
+            assert data.shape[0] == num_samples, data.shape
+        # Same samples as `add_samples` would keep, without the wrap around.
+        num_samples = min(num_samples, self._max_size)
+
+        for field_name in self.field_names:
+            field_attrs = self.fields_attrs[field_name]
+            if field_name in samples:
+                self.fields[field_name] = samples[field_name][-num_samples:]
+            else:
+                self.fields[field_name] = np.full(
+                    (num_samples, *field_attrs['shape']),
+                    field_attrs.get('default_value', 0.0),
+                    dtype=field_attrs['dtype'])
+
+        self._size = num_samples
+        self._pointer = num_samples % self._max_size
+        self._samples_since_save = 0
+
     def __getstate__(self):
         state = self.__dict__.copy()
         state['fields'] = {
@@ -158,4 +307,8 @@ class FlexibleReplayPool(ReplayPool):
                     np.zeros((pad_size, *field_shape))
                 ), axis=0)
 
+        # pools pickled before the batch arena was added
+        state.setdefault('_validate_indices', True)
+        state.setdefault('_batch_arena', None)
+
         self.__dict__ = state
@@ -35,6 +35,12 @@ def normalize_observation_fields(observation_space, name='observations'):
 
 class SimpleReplayPool(FlexibleReplayPool):
     def __init__(self, observation_space, action_space, *args, **kwargs):
+        if (isinstance(observation_space, Dict)
+            and kwargs.get('num_batch_buffers', 0) > 0):
+            raise NotImplementedError(
+                "Gathering into preallocated batches is not supported for"
+                " Dict observation spaces.")
+
         self._observation_space = observation_space
         self._action_space = action_space
 
@@ -99,13 +105,24 @@ class SimpleReplayPool(FlexibleReplayPool):
 
         return super(SimpleReplayPool, self).add_samples(samples)
 
+    @property
+    def batches_from_fields(self):
+        # Dict observations are stored per key and concatenated on sampling
+        return not isinstance(self._observation_space, Dict)
+
     def batch_by_indices(self,
                          indices,
                          field_name_filter=None,
-                         observation_keys=None):
+                         observation_keys=None,
+                         out=None):
         if not isinstance(self._observation_space, Dict):
             return super(SimpleReplayPool, self).batch_by_indices(
-                indices, field_name_filter=field_name_filter)
+                indices, field_name_filter=field_name_filter, out=out)
+
+        if out is not None:
+            raise NotImplementedError(
+                "Gathering into preallocated batches is not supported for"
+                " Dict observation spaces.")
 
         batch = {
             field_name: self.fields[field_name][indices]
@@ -1,16 +1,48 @@
 import numpy as np
 
+from .flexible_replay_pool import BatchArena
 from .replay_pool import ReplayPool
 
 
 class UnionPool(ReplayPool):
-    def __init__(self, pools):
-        pool_sizes = np.array([b.size for b in pools])
-        self._total_size = sum(pool_sizes)
-        self._normalized_pool_sizes = pool_sizes / self._total_size
+    """Samples batches from the union of several replay pools.
 
+    Batches are drawn with a single vector of global indices over the
+    concatenated pools, split into per-pool segments and gathered with
+    `np.take` straight from the pools' fields into the buffers of a
+    `BatchArena`, so sampling doesn't allocate new arrays. If any of the pools
+    doesn't store its batches as rows of `fields` (see
+    `FlexibleReplayPool.batches_from_fields`), the partial batches are
+    sampled with the pools' own `random_batch` and concatenated instead.
+
+    NOTE: The returned batch is overwritten after `num_batch_buffers` more
+    `random_batch` calls with the same batch size and has to be copied if it
+    is kept around longer.
+    """
+
+    def __init__(self, pools, ratios=None, num_batch_buffers=2):
+        """
+        Args:
+            pools: Pools to sample from. Only the fields that are present
+                in all pools are sampled.
+            ratios: Optional fraction of every batch that comes from each
+                pool, e.g. `(0.5, 0.5)` to mix interaction and observation
+                data evenly regardless of the pool sizes. If None, the pools
+                are sampled proportionally to their current sizes.
+            num_batch_buffers (`int`): Number of reused output batches.
+        """
         self.pools = pools
 
+        if ratios is not None:
+            assert len(ratios) == len(pools), (ratios, len(pools))
+            ratios = np.asarray(ratios, dtype=np.float64)
+            ratios = ratios / np.sum(ratios)
+        self._ratios = ratios
+
+        self._batch_arena = BatchArena(num_batch_buffers)
+        self._gather_from_fields = all(
+            getattr(pool, 'batches_from_fields', False) for pool in pools)
+
     def add_sample(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -19,26 +51,100 @@ class UnionPool(ReplayPool):
 
     @property
     def size(self):
-        return self._total_size
+        return sum(pool.size for pool in self.pools)
+
+    @property
+    def field_names(self):
+        return [
+            field_name for field_name in self.pools[0].fields.keys()
+            if all(field_name in pool.fields for pool in self.pools[1:])
+        ]
 
     def add_path(self, **kwargs):
         raise NotImplementedError
 
-    def random_batch(self, batch_size):
+    def _random_indices(self, batch_size, pool_sizes):
+        """Sample pool-local indices, grouped by pool.
+
+        Returns:
+            The indices, ordered such that the first `partial_batch_sizes[0]`
+            belong to the first pool and so on, and the partial batch sizes.
+        """
+        if self._ratios is None:
+            # One global index vector over the live sizes of all pools, so
+            # every sample in the union is equally likely.
+            ends = np.cumsum(pool_sizes)
+            global_indices = np.sort(
+                np.random.randint(0, ends[-1], batch_size))
+            pool_ids = np.searchsorted(ends, global_indices, side='right')
+            indices = global_indices - (ends - pool_sizes)[pool_ids]
+            partial_batch_sizes = np.bincount(
+                pool_ids, minlength=len(self.pools))
+            return indices, partial_batch_sizes
 
-        # TODO: Hack
-        partial_batch_sizes = self._normalized_pool_sizes * batch_size
-        partial_batch_sizes = partial_batch_sizes.astype(int)
-        partial_batch_sizes[0] = batch_size - sum(partial_batch_sizes[1:])
+        partial_batch_sizes = (self._ratios * batch_size).astype(int)
+        partial_batch_sizes[0] = batch_size - np.sum(partial_batch_sizes[1:])
+        assert np.all(pool_sizes[partial_batch_sizes > 0] > 0), (
+            "Tried to sample from an empty pool.")
+        indices = np.random.randint(
+            0, np.repeat(pool_sizes, partial_batch_sizes), batch_size)
+        return indices, partial_batch_sizes
 
+    def _concatenated_batch(self, partial_batch_sizes):
         partial_batches = [
-            pool.random_batch(partial_batch_size) for pool,
-            partial_batch_size in zip(self.pools, partial_batch_sizes)
+            pool.random_batch(partial_batch_size)
+            for pool, partial_batch_size in zip(
+                    self.pools, partial_batch_sizes)
+            if partial_batch_size > 0
         ]
+        keys = [
+            key for key in partial_batches[0].keys()
+            if all(key in partial_batch for partial_batch in partial_batches)
+        ]
+
+        return {
+            key: np.concatenate([
+                partial_batch[key] for partial_batch in partial_batches
+            ], axis=0)
+            for key in keys
+        }
+
+    def random_batch(self, batch_size):
+        pool_sizes = np.array([pool.size for pool in self.pools])
+        indices, partial_batch_sizes = self._random_indices(
+            batch_size, pool_sizes)
+
+        if not self._gather_from_fields:
+            return self._concatenated_batch(partial_batch_sizes)
 
-        def all_values(key):
-            return [partial_batch[key] for partial_batch in partial_batches]
+        # Checked once for the whole batch, so that an index past the live
+        # size of its pool raises instead of being clipped by `np.take`.
+        if np.any(indices >= np.repeat(pool_sizes, partial_batch_sizes)):
+            raise ValueError(
+                "Tried to retrieve batch with indices greater than current"
+                " size")
 
-        keys = partial_batches[0].keys()
+        # The batch holds every field in the dtype all the pools' fields
+        # can be cast to without loss, like `np.concatenate` would.
+        batch = self._batch_arena.next_batch(batch_size, {
+            field_name: np.empty(
+                (0, *self.pools[0].fields[field_name].shape[1:]),
+                dtype=np.result_type(*(
+                    pool.fields[field_name].dtype for pool in self.pools)))
+            for field_name in self.field_names
+        })
+        ends = np.cumsum(partial_batch_sizes)
+        for pool, start, end in zip(
+                self.pools, ends - partial_batch_sizes, ends):
+            if start == end:
+                continue
+            pool_indices = indices[start:end]
+            for field_name, values in batch.items():
+                field = pool.fields[field_name]
+                if field.dtype == values.dtype:
+                    np.take(field, pool_indices, axis=0,
+                            out=values[start:end], mode='clip')
+                else:
+                    values[start:end] = field[pool_indices]
 
-        return {key: np.concatenate(all_values(key), axis=0) for key in keys}
+        return batch
@@ -6,6 +6,7 @@ from . import (
     extra_policy_info_replay_pool,
     union_pool,
     trajectory_replay_pool,
+    flat_trajectory_replay_pool,
     active_replay_pool)
 
 
@@ -14,6 +15,8 @@ POOL_CLASSES = {
     'SimpleReplayPool': simple_replay_pool.SimpleReplayPool,
     'ActiveReplayPool': active_replay_pool.ActiveReplayPool,
     'TrajectoryReplayPool': trajectory_replay_pool.TrajectoryReplayPool,
+    'FlatTrajectoryReplayPool': (
+        flat_trajectory_replay_pool.FlatTrajectoryReplayPool),
     'ExtraPolicyInfoReplayPool': (
         extra_policy_info_replay_pool.ExtraPolicyInfoReplayPool),
     'UnionPool': union_pool.UnionPool,
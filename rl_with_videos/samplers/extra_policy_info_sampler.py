@@ -1,11 +1,7 @@
 """Sampler that stores raw actions and log pis from policy."""
 
 
-from collections import defaultdict
-
-import numpy as np
-
-from .simple_sampler import SimpleSampler
+from .simple_sampler import PathBuffer, SimpleSampler
 
 
 class ExtraPolicyInfoSampler(SimpleSampler):
@@ -15,8 +11,13 @@ class ExtraPolicyInfoSampler(SimpleSampler):
 
         observations = self.env.convert_to_active_observation(
             self._current_observation)[None]
-        actions = self.policy.actions_np([observations])
-        log_pis = self.policy.log_pis_np([observations], actions)
+        actions, log_pis, raw_actions = self.policy.actions_and_log_pis_np(
+            [observations], return_raw_actions=True)
+        if raw_actions is None:
+            raise ValueError(
+                "{} doesn't provide the raw actions that the"
+                " ExtraPolicyInfoSampler stores.".format(
+                    type(self.policy).__name__))
 
         action = actions[0]
         log_pi = log_pis[0]
@@ -26,20 +27,18 @@ class ExtraPolicyInfoSampler(SimpleSampler):
         self._path_return += reward
         self._total_samples += 1
 
-        self._current_path['observations'].append(self._current_observation)
-        self._current_path['actions'].append(action)
-        self._current_path['rewards'].append([reward])
-        self._current_path['terminals'].append([terminal])
-        self._current_path['next_observations'].append(next_observation)
-        self._current_path['infos'].append(info)
-        # self._current_path['raw_actions'].append(raw_action)
-        self._current_path['log_pis'].append(log_pi)
+        self._current_path.add(
+            observations=self._current_observation,
+            actions=action,
+            rewards=[reward],
+            terminals=[terminal],
+            next_observations=next_observation,
+            infos=info,
+            raw_actions=raw_actions[0],
+            log_pis=log_pi)
 
         if terminal or self._path_length >= self._max_path_length:
-            last_path = {
-                field_name: np.array(values)
-                for field_name, values in self._current_path.items()
-            }
+            last_path = self._current_path.path()
             self.pool.add_path(last_path)
             self._last_n_paths.appendleft(last_path)
 
@@ -52,7 +51,7 @@ class ExtraPolicyInfoSampler(SimpleSampler):
 
             self._path_length = 0
             self._path_return = 0
-            self._current_path = defaultdict(list)
+            self._current_path = PathBuffer(self._max_path_length)
 
             self._n_episodes += 1
         else:
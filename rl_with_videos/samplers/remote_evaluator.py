@@ -0,0 +1,92 @@
+import pickle
+
+import ray
+
+from .remote_sampler import EnvironmentWorker
+from .utils import rollouts
+
+
+class RemoteEvaluator(object):
+    """Runs evaluation rollouts on a pool of ray actors.
+
+    Every actor holds its own copy of the evaluation environment and the
+    policy. An evaluation is started with a snapshot of the policy weights
+    and its episodes are split over the actors, so the learner can keep
+    training while the rollouts run.
+    """
+
+    def __init__(self, env, policy, n_workers, inference_policy=None):
+        """
+        Args:
+            env: Evaluation environment, pickled to every worker.
+            policy: Policy to evaluate, pickled to every worker.
+            n_workers (`int`): Number of evaluation actors.
+            inference_policy: Optional tensorflow-free copy of the policy
+                used by the workers instead of `policy`, see `RemoteSampler`.
+        """
+        assert n_workers > 0, n_workers
+
+        if not ray.is_initialized():
+            ray.init()
+
+        env_pkl = pickle.dumps(env)
+        policy_pkl = pickle.dumps(
+            inference_policy if inference_policy is not None else policy)
+
+        self._workers = [
+            _EvaluationWorker.remote(
+                env_pkl, policy_pkl, needs_session=inference_policy is None)
+            for _ in range(n_workers)
+        ]
+        ray.get([worker.initialized.remote() for worker in self._workers])
+
+    def submit(self,
+               policy_weights,
+               n_episodes,
+               path_length,
+               deterministic=True,
+               render_mode=None):
+        """Start `n_episodes` rollouts and return a handle for `collect`."""
+        weights_id = ray.put(policy_weights)
+        n_workers = len(self._workers)
+        episodes_per_worker = [
+            n_episodes // n_workers + int(i < n_episodes % n_workers)
+            for i in range(n_workers)
+        ]
+        return [
+            worker.rollouts.remote(
+                weights_id, n, path_length, deterministic, render_mode)
+            for worker, n in zip(self._workers, episodes_per_worker)
+            if n > 0
+        ]
+
+    def ready(self, handle):
+        ready, _ = ray.wait(handle, num_returns=len(handle), timeout=0)
+        return len(ready) == len(handle)
+
+    def collect(self, handle):
+        """Block until the rollouts of `handle` are done and return them."""
+        return tuple(
+            path
+            for worker_paths in ray.get(handle)
+            for path in worker_paths)
+
+
+@ray.remote
+class _EvaluationWorker(EnvironmentWorker):
+    def rollouts(self,
+                 policy_weights,
+                 n_episodes,
+                 path_length,
+                 deterministic,
+                 render_mode):
+        self._policy.set_weights(policy_weights)
+        with self._policy.set_deterministic(deterministic):
+            paths = rollouts(
+                n_episodes,
+                self._env,
+                self._policy,
+                path_length,
+                render_mode=render_mode)
+
+        return paths
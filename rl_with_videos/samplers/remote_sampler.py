@@ -2,7 +2,6 @@ import pickle
 from collections import OrderedDict
 
 import ray
-import tensorflow as tf
 import numpy as np
 
 
@@ -11,9 +10,25 @@ from .utils import rollout
 
 
 class RemoteSampler(BaseSampler):
-    def __init__(self, **kwargs):
+    def __init__(self,
+                 inference_policy=None,
+                 inference_policy_params=None,
+                 **kwargs):
+        """
+        Args:
+            inference_policy: Optional tensorflow-free copy of the policy,
+                e.g. `NumpyGaussianPolicy`, used by the remote environment
+                instead of the pickled policy. It receives the weights of the
+                training policy before every rollout.
+            inference_policy_params: Optional `policy_params` of a variant,
+                the `NumpyGaussianPolicy` created from them on `initialize`
+                is used as the `inference_policy`.
+        """
         super(RemoteSampler, self).__init__(**kwargs)
 
+        self._inference_policy = inference_policy
+        self._inference_policy_params = inference_policy_params
+
         self._remote_environment = None
         self._remote_path = None
         self._n_episodes = 0
@@ -23,12 +38,16 @@ class RemoteSampler(BaseSampler):
 
     def _create_remote_environment(self, env, policy):
         env_pkl = pickle.dumps(env)
-        policy_pkl = pickle.dumps(policy)
+        policy_pkl = pickle.dumps(
+            self._inference_policy
+            if self._inference_policy is not None
+            else policy)
 
         if not ray.is_initialized():
             ray.init()
 
-        self._remote_environment = _RemoteEnv.remote(env_pkl, policy_pkl)
+        self._remote_environment = _RemoteEnv.remote(
+            env_pkl, policy_pkl, needs_session=self._inference_policy is None)
 
         # Block until the env and policy is ready
         initialized = ray.get(self._remote_environment.initialized.remote())
@@ -36,6 +55,12 @@ class RemoteSampler(BaseSampler):
 
     def initialize(self, env, policy, pool):
         super(RemoteSampler, self).initialize(env, policy, pool)
+        if (self._inference_policy is None
+            and self._inference_policy_params is not None):
+            from rl_with_videos.policies.numpy_gaussian_policy import (
+                get_numpy_gaussian_policy_from_params)
+            self._inference_policy = get_numpy_gaussian_policy_from_params(
+                self._inference_policy_params, env)
         self._create_remote_environment(env, policy)
 
     def wait_for_path(self, timeout=1):
@@ -92,11 +117,19 @@ class RemoteSampler(BaseSampler):
         self._remote_path = None
 
 
-@ray.remote
-class _RemoteEnv(object):
-    def __init__(self, env_pkl, policy_pkl):
-        self._session = tf.keras.backend.get_session()
-        self._session.run(tf.global_variables_initializer())
+class EnvironmentWorker(object):
+    """Environment and policy unpickled in a ray actor.
+
+    Base of the actors of `RemoteSampler` and `RemoteEvaluator`.
+    """
+
+    def __init__(self, env_pkl, policy_pkl, needs_session=True):
+        if needs_session:
+            # keras policies need an initialized session, tensorflow-free
+            # inference policies start without importing tensorflow
+            import tensorflow as tf
+            self._session = tf.keras.backend.get_session()
+            self._session.run(tf.global_variables_initializer())
 
         self._env = pickle.loads(env_pkl)
         self._policy = pickle.loads(policy_pkl)
@@ -109,6 +142,9 @@ class _RemoteEnv(object):
     def initialized(self):
         return self._initialized
 
+
+@ray.remote
+class _RemoteEnv(EnvironmentWorker):
     def rollout(self, policy_weights, path_length):
         self._policy.set_weights(policy_weights)
         path = rollout(self._env, self._policy, path_length)
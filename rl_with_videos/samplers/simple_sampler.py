@@ -1,17 +1,81 @@
-from collections import defaultdict
-
 import numpy as np
 
 from .base_sampler import BaseSampler
 
 
+class PathBuffer(object):
+    """Preallocated storage for the samples of a single path.
+
+    Array fields are written in place into buffers of `max_path_length` rows
+    that are allocated from the first sample, and promoted like `np.array`
+    would when a later sample needs a wider dtype, e.g. a float reward after
+    an integer one. `path()` returns views of the filled rows, so no per-step
+    lists have to be copied into arrays at the end of the episode. The
+    buffers are allocated with `np.empty`, which only commits the memory of
+    the rows that are actually written. Fields that aren't arrays, like the
+    info dicts or the observations of `Dict` observation spaces, are
+    collected in lists.
+
+    The returned path owns the buffers, so a new `PathBuffer` has to be used
+    for the next path.
+    """
+
+    def __init__(self, max_path_length):
+        self._max_path_length = max_path_length
+        self._buffers = None
+        self._lists = None
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def _allocate(self, sample):
+        self._buffers, self._lists = {}, {}
+        for key, value in sample.items():
+            if isinstance(value, dict):
+                self._lists[key] = []
+                continue
+            value = np.asarray(value)
+            self._buffers[key] = np.empty(
+                (self._max_path_length, *value.shape), dtype=value.dtype)
+
+    def add(self, **sample):
+        if self._buffers is None:
+            self._allocate(sample)
+
+        assert self._length < self._max_path_length, self._max_path_length
+        for key, buffer in self._buffers.items():
+            value = np.asarray(sample[key])
+            if value.dtype != buffer.dtype:
+                dtype = np.promote_types(buffer.dtype, value.dtype)
+                if dtype != buffer.dtype:
+                    buffer = self._buffers[key] = buffer.astype(dtype)
+            buffer[self._length] = value
+        for key, values in self._lists.items():
+            values.append(sample[key])
+
+        self._length += 1
+
+    def path(self):
+        return {
+            **{
+                key: buffer[:self._length]
+                for key, buffer in self._buffers.items()
+            },
+            **{
+                key: np.array(values)
+                for key, values in self._lists.items()
+            },
+        }
+
+
 class SimpleSampler(BaseSampler):
     def __init__(self, **kwargs):
         super(SimpleSampler, self).__init__(**kwargs)
 
         self._path_length = 0
         self._path_return = 0
-        self._current_path = defaultdict(list)
+        self._current_path = PathBuffer(self._max_path_length)
         self._last_path_return = 0
         self._max_path_return = -np.inf
         self._n_episodes = 0
@@ -60,14 +124,10 @@ class SimpleSampler(BaseSampler):
             info=info,
         )
 
-        for key, value in processed_sample.items():
-            self._current_path[key].append(value)
+        self._current_path.add(**processed_sample)
 
         if terminal or self._path_length >= self._max_path_length:
-            last_path = {
-                field_name: np.array(values)
-                for field_name, values in self._current_path.items()
-            }
+            last_path = self._current_path.path()
             self.pool.add_path(last_path)
             self._last_n_paths.appendleft(last_path)
 
@@ -79,7 +139,7 @@ class SimpleSampler(BaseSampler):
             self._current_observation = None
             self._path_length = 0
             self._path_return = 0
-            self._current_path = defaultdict(list)
+            self._current_path = PathBuffer(self._max_path_length)
 
             self._n_episodes += 1
         else:
@@ -30,6 +30,21 @@ def get_sampler_from_variant(variant, *args, **kwargs):
     sampler_args = deepcopy(sampler_params.get('args', ()))
     sampler_kwargs = deepcopy(sampler_params.get('kwargs', {}))
 
+    # 'numpy' runs the rollouts of the remote sampler with a tensorflow-free
+    # copy of the policy
+    policy_inference = (
+        variant.get('policy_params', {}).get('inference', 'tensorflow'))
+    if policy_inference == 'numpy':
+        if sampler_type != 'RemoteSampler':
+            raise ValueError(
+                "NumPy policy inference is only supported by the"
+                " RemoteSampler, got '{}'.".format(sampler_type))
+        sampler_kwargs['inference_policy_params'] = deepcopy(
+            variant['policy_params'])
+    elif policy_inference != 'tensorflow':
+        raise ValueError(
+            "Unknown policy inference '{}'.".format(policy_inference))
+
     sampler = SAMPLERS[sampler_type](
         *sampler_args, *args, **sampler_kwargs, **kwargs)
 
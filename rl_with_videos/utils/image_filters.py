@@ -0,0 +1,178 @@
+"""Batched image filters used to augment images and to create visual domain shifts.
+
+Filters are given as a list of specs in the format of the other variant
+params, e.g. `{'type': 'tint', 'kwargs': {'color': (0, 0, 255), 'alpha': 0.2}}`,
+and are applied in order to a whole batch of images of shape (N, H, W, C).
+Every filter is implemented for numpy arrays (`apply_filters`, for offline
+processing of replay pools) and for tensorflow tensors (`tf_apply_filters`,
+for online augmentation inside the training graph). Intermediate results are
+kept in float32, the result is rounded and cast back to the input dtype once.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def _gaussian_kernel(kernel_size, sigma):
+    if sigma <= 0:
+        # same default as cv2.getGaussianKernel
+        sigma = 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
+    x = np.arange(kernel_size, dtype=np.float32) - (kernel_size - 1) / 2
+    kernel = np.exp(-x ** 2 / (2 * sigma ** 2))
+    return kernel / kernel.sum()
+
+
+def _tint(images, color=(0, 0, 255), alpha=0.2, random_state=None):
+    """Blend the images with a constant color, like `cv2.addWeighted`."""
+    return images * (1 - alpha) + np.asarray(color, dtype=np.float32) * alpha
+
+
+def _blur(images, kernel_size=5, sigma=0, random_state=None):
+    """Separable gaussian blur with reflected borders, like `cv2.GaussianBlur`."""
+    kernel = _gaussian_kernel(kernel_size, sigma)
+    radius = kernel_size // 2
+    height, width = images.shape[1:3]
+    padded = np.pad(
+        images,
+        ((0, 0), (radius, radius), (radius, radius), (0, 0)),
+        mode='reflect')
+    rows = sum(w * padded[:, i:i + height] for i, w in enumerate(kernel))
+    return sum(w * rows[:, :, i:i + width] for i, w in enumerate(kernel))
+
+
+def _swap_channels(images, order=(2, 1, 0), random_state=None):
+    return images[..., list(order)]
+
+
+def _random_crop(images, pad=4, random_state=None):
+    """Zero-pad the images by `pad` and crop them back at a random offset per image."""
+    random_state = random_state or np.random
+    n, height, width = images.shape[:3]
+    padded = np.pad(images, ((0, 0), (pad, pad), (pad, pad), (0, 0)))
+    offsets = random_state.randint(0, 2 * pad + 1, size=(n, 2))
+    rows = offsets[:, 0, None] + np.arange(height)
+    cols = offsets[:, 1, None] + np.arange(width)
+    return padded[np.arange(n)[:, None, None], rows[:, :, None], cols[:, None, :]]
+
+
+FILTER_FUNCTIONS = {
+    'tint': _tint,
+    'blur': _blur,
+    'swap_channels': _swap_channels,
+    'random_crop': _random_crop,
+}
+
+
+def apply_filters(images, filters, image_shape=None, random_state=None):
+    """Apply `filters` to a batch of images in one pass.
+
+    Args:
+        images: Array of shape (N, H, W, C), or (N, H * W * C) if
+            `image_shape` is given.
+        filters: List of filter specs, see the module docstring.
+        image_shape: (H, W, C) of flattened images.
+        random_state: `np.random.RandomState` for the random filters.
+
+    Returns:
+        Filtered images with the shape and dtype of `images`.
+    """
+    if not filters:
+        return images
+
+    result = images.astype(np.float32)
+    if image_shape is not None:
+        result = result.reshape((-1, *image_shape))
+
+    for image_filter in filters:
+        result = FILTER_FUNCTIONS[image_filter['type']](
+            result, random_state=random_state, **image_filter.get('kwargs', {}))
+
+    if np.issubdtype(images.dtype, np.integer):
+        info = np.iinfo(images.dtype)
+        result = np.clip(np.rint(result), info.min, info.max)
+    return result.astype(images.dtype).reshape(images.shape)
+
+
+def apply_filters_in_chunks(images,
+                            filters,
+                            chunk_size=10000,
+                            image_shape=None,
+                            out=None,
+                            random_state=None):
+    """Apply `filters` to a large array of images chunk by chunk.
+
+    Only one chunk is converted to float32 at a time, `out` can be
+    `images` itself to filter a pool in place.
+    """
+    out = np.empty_like(images) if out is None else out
+    for start in range(0, images.shape[0], chunk_size):
+        out[start:start + chunk_size] = apply_filters(
+            images[start:start + chunk_size],
+            filters,
+            image_shape=image_shape,
+            random_state=random_state)
+    return out
+
+
+def _tf_tint(images, color=(0, 0, 255), alpha=0.2):
+    return images * (1 - alpha) + tf.constant(color, dtype=tf.float32) * alpha
+
+
+def _tf_blur(images, kernel_size=5, sigma=0):
+    kernel = _gaussian_kernel(kernel_size, sigma)
+    radius = kernel_size // 2
+    channels = images.shape[-1].value
+    padded = tf.pad(
+        images,
+        [[0, 0], [radius, radius], [radius, radius], [0, 0]],
+        mode='REFLECT')
+    kernel_rows = np.tile(kernel[:, None, None, None], (1, 1, channels, 1))
+    kernel_cols = np.tile(kernel[None, :, None, None], (1, 1, channels, 1))
+    rows = tf.nn.depthwise_conv2d(
+        padded, kernel_rows, strides=[1, 1, 1, 1], padding='VALID')
+    return tf.nn.depthwise_conv2d(
+        rows, kernel_cols, strides=[1, 1, 1, 1], padding='VALID')
+
+
+def _tf_swap_channels(images, order=(2, 1, 0)):
+    return tf.gather(images, list(order), axis=-1)
+
+
+def _tf_random_crop(images, pad=4):
+    batch_size = tf.shape(images)[0]
+    height, width = images.shape[1].value, images.shape[2].value
+    padded = tf.pad(images, [[0, 0], [pad, pad], [pad, pad], [0, 0]])
+    offsets = tf.random.uniform(
+        (batch_size, 2), minval=0, maxval=2 * pad + 1, dtype=tf.int32)
+    rows = offsets[:, 0, None] + tf.range(height)
+    cols = offsets[:, 1, None] + tf.range(width)
+    cropped = tf.gather(padded, rows, axis=1, batch_dims=1)
+    return tf.gather(cropped, cols, axis=2, batch_dims=1)
+
+
+TF_FILTER_FUNCTIONS = {
+    'tint': _tf_tint,
+    'blur': _tf_blur,
+    'swap_channels': _tf_swap_channels,
+    'random_crop': _tf_random_crop,
+}
+
+
+def tf_apply_filters(images, filters, image_shape=None):
+    """Tensorflow version of `apply_filters`, for use inside the graph."""
+    if not filters:
+        return images
+
+    result = tf.cast(images, tf.float32)
+    if image_shape is not None:
+        result = tf.reshape(result, (-1, *image_shape))
+
+    for image_filter in filters:
+        result = TF_FILTER_FUNCTIONS[image_filter['type']](
+            result, **image_filter.get('kwargs', {}))
+
+    if images.dtype.is_integer:
+        result = tf.clip_by_value(
+            tf.round(result), images.dtype.min, images.dtype.max)
+    return tf.reshape(
+        tf.cast(result, images.dtype), [-1, *images.shape[1:].as_list()])
@@ -1,18 +1,58 @@
+import json
 import tempfile
 
 import tensorflow as tf
 
 
 class PicklableKerasModel(tf.keras.Model):
+    """Keras model that pickles as its config and raw weights.
+
+    The config is serialized once per model and reused by every later
+    `__getstate__`, so repeated pickling only costs copying the weights
+    instead of writing a whole hdf5 file. The weights are kept as numpy
+    arrays, which pickle protocol 5 transfers as out-of-band buffers (e.g.
+    through ray) instead of copying them into the pickle stream.
+
+    Unpickling rebuilds the model from its config every time; the rebuilt
+    models are deliberately not cached per config. In graph mode a model's
+    layers and variables belong to the graph it was built in, and every
+    unpickled copy needs its own variables: a cached model would alias the
+    weights of e.g. a Q function and its target, and would be stale once the
+    default graph is reset, as happens between trials in a reused ray worker.
+    Cloning a cached template doesn't help either, `clone_model` creates all
+    the layers and variables again, and the template's own unused variables
+    would end up in the graph's global variables, which the default
+    `tf.train.Saver` and `tf.global_variables_initializer` pick up.
+    """
+
     def __getstate__(self):
-        with tempfile.NamedTemporaryFile(suffix='.hdf5', delete=True) as fd:
-            tf.keras.models.save_model(self, fd.name, overwrite=True)
-            model_str = fd.read()
-        d = {'model_str': model_str}
+        model_json = getattr(self, '_pickled_model_json', None)
+        if model_json is None:
+            model_json = self.to_json()
+            self._pickled_model_json = model_json
+
+        state = {
+            'model_json': model_json,
+            'weights': self.get_weights(),
+        }
 
-        return d
+        return state
 
     def __setstate__(self, state):
+        if 'model_str' in state:
+            return self._setstate_from_hdf5(state)
+
+        model_json = state['model_json']
+        loaded_model = tf.keras.models.model_from_config(
+            json.loads(model_json),
+            custom_objects={self.__class__.__name__: self.__class__})
+        loaded_model.set_weights(state['weights'])
+
+        self.__dict__.update(loaded_model.__dict__.copy())
+        self._pickled_model_json = model_json
+
+    def _setstate_from_hdf5(self, state):
+        """Restore models pickled as a whole hdf5 file by older versions."""
         with tempfile.NamedTemporaryFile(suffix='.hdf5', delete=True) as fd:
             fd.write(state['model_str'])
             fd.flush()
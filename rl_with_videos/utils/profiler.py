@@ -0,0 +1,110 @@
+"""Low overhead wall-clock profiler for the training hot path.
+
+`Profiler.phase(name)` times a block with `time.perf_counter` and appends the
+duration to a per-phase list, which costs about a microsecond per call and
+doesn't grow any timer tree like `gtimer` does. `get_diagnostics` summarizes
+and clears the collected durations, so the profiler is meant to be read once
+per epoch.
+
+If a `trace_path` is given, every timed block is also written to a Chrome
+trace file (JSON array format) that can be opened in `chrome://tracing` or
+Perfetto. The events are appended to the file whenever the diagnostics are
+read.
+"""
+
+from collections import OrderedDict, defaultdict
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _Phase(object):
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        end = time.perf_counter()
+        self._profiler._record(self._name, self._start, end)
+        return False
+
+
+class Profiler(object):
+    def __init__(self, trace_path=None):
+        """
+        Args:
+            trace_path (`str`): Optional path of a Chrome trace file the
+                timed blocks are written to. None disables tracing.
+        """
+        self._trace_path = trace_path
+        self._durations = defaultdict(list)
+        self._trace_events = []
+        self._trace_started = False
+        self._pid = os.getpid()
+
+    def phase(self, name):
+        """Return a context manager that times its block as `name`."""
+        return _Phase(self, name)
+
+    def _record(self, name, start, end):
+        self._durations[name].append(end - start)
+        if self._trace_path is not None:
+            self._trace_events.append(
+                (name, start, end - start, threading.get_ident()))
+
+    def get_diagnostics(self):
+        """Summarize the phases timed since the last call and reset them.
+
+        Returns:
+            `OrderedDict` with the total time, number of calls and the 50th
+            and 99th percentile duration (in seconds) of every phase.
+        """
+        diagnostics = OrderedDict()
+        for name in sorted(self._durations.keys()):
+            durations = np.array(self._durations[name])
+            p50, p99 = np.percentile(durations, (50, 99))
+            diagnostics.update((
+                (f'{name}-total', np.sum(durations)),
+                (f'{name}-count', durations.size),
+                (f'{name}-p50', p50),
+                (f'{name}-p99', p99),
+            ))
+
+        self._durations.clear()
+        self._flush_trace()
+
+        return diagnostics
+
+    def _flush_trace(self):
+        if self._trace_path is None or not self._trace_events:
+            return
+
+        # The closing bracket of the array format is optional, which lets us
+        # append the events of every epoch without rewriting the file.
+        lines = [
+            json.dumps({
+                'name': name,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': duration * 1e6,
+                'pid': self._pid,
+                'tid': tid,
+            })
+            for name, start, duration, tid in self._trace_events
+        ]
+        mode = 'a' if self._trace_started else 'w'
+        with open(self._trace_path, mode) as f:
+            f.write(('[\n' if not self._trace_started else '')
+                    + ',\n'.join(lines) + ',\n')
+
+        self._trace_started = True
+        self._trace_events = []
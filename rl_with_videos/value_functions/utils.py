@@ -1,7 +1,6 @@
 from copy import deepcopy
 
 from rl_with_videos.preprocessors.utils import get_preprocessor_from_params
-from . import vanilla
 
 
 def create_double_value_function(value_fn, *args, **kwargs):
@@ -12,12 +11,22 @@ def create_double_value_function(value_fn, *args, **kwargs):
     return value_fns
 
 
+def get_feedforward_V_function(*args, **kwargs):
+    from .vanilla import create_feedforward_V_function
+
+    return create_feedforward_V_function(*args, **kwargs)
+
+
+def get_double_feedforward_Q_function(*args, **kwargs):
+    from .vanilla import create_feedforward_Q_function
+
+    return create_double_value_function(
+        create_feedforward_Q_function, *args, **kwargs)
+
+
 VALUE_FUNCTIONS = {
-    'feedforward_V_function': (
-        vanilla.create_feedforward_V_function),
-    'double_feedforward_Q_function': lambda *args, **kwargs: (
-        create_double_value_function(
-            vanilla.create_feedforward_Q_function, *args, **kwargs)),
+    'feedforward_V_function': get_feedforward_V_function,
+    'double_feedforward_Q_function': get_double_feedforward_Q_function,
 }
 
 
@@ -0,0 +1,47 @@
+import gzip
+import json
+import pickle
+import argparse
+
+from rl_with_videos.utils.image_filters import apply_filters_in_chunks
+
+
+def apply_image_filters_replay_pool(args):
+    with gzip.open(args.path, 'rb') as f:
+        data = pickle.load(f)
+
+    print("data", data.keys())
+    filters = json.loads(args.filters)
+    print("filters", filters)
+
+    image_shape = tuple(args.image_shape)
+    for key in ('observations', 'next_observations'):
+        # filtered in place, chunk by chunk, to keep the memory of the whole pool bounded
+        data[key] = apply_filters_in_chunks(data[key],
+                                            filters,
+                                            chunk_size=args.chunk_size,
+                                            image_shape=image_shape,
+                                            out=data[key])
+
+    print("obs shape:", data['observations'].shape)
+
+    with gzip.open(args.out_path, 'wb') as f:
+        pickle.dump(data, f)
+    print("saved filtered data to", args.out_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', type=str)
+    parser.add_argument('out_path', type=str)
+    parser.add_argument(
+        '--filters',
+        type=str,
+        default='[{"type": "swap_channels"}]',
+        help="json list of filter specs, e.g. "
+             "'[{\"type\": \"tint\", \"kwargs\": {\"alpha\": 0.2}}, {\"type\": \"blur\"}]'")
+    parser.add_argument('--image_shape', type=int, nargs=3, default=(48, 48, 3))
+    parser.add_argument('--chunk_size', type=int, default=10000)
+    args = parser.parse_args()
+
+    apply_image_filters_replay_pool(args)
@@ -0,0 +1,143 @@
+"""Benchmark SAC gradient updates per second for different `fused_train_steps`.
+
+Every configuration builds a fresh graph and runs the same total number of
+training steps on a replay pool filled with random transitions, so the
+numbers only measure the training step itself, not the sampling.
+
+Example:
+    python -m scripts.benchmark_fused_training \
+        --domain Pendulum --task v0 --fused_train_steps 1 4 16
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from rl_with_videos.algorithms.sac import SAC
+from rl_with_videos.environments.adapters.gym_adapter import GymAdapter
+from rl_with_videos.misc.utils import initialize_tf_variables
+from rl_with_videos.policies.utils import get_policy_from_variant
+from rl_with_videos.replay_pools.simple_replay_pool import SimpleReplayPool
+from rl_with_videos.samplers.simple_sampler import SimpleSampler
+from rl_with_videos.value_functions.utils import get_Q_function_from_variant
+
+
+def get_variant(hidden_layer_sizes):
+    return {
+        'policy_params': {
+            'type': 'GaussianPolicy',
+            'kwargs': {
+                'hidden_layer_sizes': hidden_layer_sizes,
+                'squash': True,
+            },
+        },
+        'Q_params': {
+            'type': 'double_feedforward_Q_function',
+            'kwargs': {
+                'hidden_layer_sizes': hidden_layer_sizes,
+            },
+        },
+    }
+
+
+def fill_pool(pool, env, num_samples):
+    observations = np.stack([
+        env.observation_space.sample() for _ in range(2 * num_samples)])
+    pool.add_samples({
+        'observations': observations[:num_samples],
+        'next_observations': observations[num_samples:],
+        'actions': np.stack([
+            env.action_space.sample() for _ in range(num_samples)]),
+        'rewards': np.random.normal(size=(num_samples, 1)),
+        'terminals': np.random.uniform(size=(num_samples, 1)) < 0.01,
+    })
+
+
+def build_algorithm(env, fused_train_steps, args):
+    tf.keras.backend.clear_session()
+    session = tf.keras.backend.get_session()
+
+    variant = get_variant(tuple(args.hidden_layer_sizes))
+    Qs = get_Q_function_from_variant(variant, env)
+    policy = get_policy_from_variant(variant, env, Qs)
+
+    pool = SimpleReplayPool(
+        env.observation_space, env.action_space, max_size=args.pool_size)
+    fill_pool(pool, env, args.pool_size)
+    sampler = SimpleSampler(
+        max_path_length=1000, min_pool_size=0, batch_size=args.batch_size)
+    sampler.initialize(env, policy, pool)
+
+    algorithm = SAC(
+        training_environment=env,
+        evaluation_environment=env,
+        policy=policy,
+        Qs=Qs,
+        pool=pool,
+        sampler=sampler,
+        session=session,
+        reparameterize=True,
+        fused_train_steps=fused_train_steps)
+
+    initialize_tf_variables(session, only_uninitialized=True)
+    algorithm._init_training()
+
+    return algorithm
+
+
+def run_training_steps(algorithm, fused_train_steps, num_steps):
+    if fused_train_steps > 1:
+        for _ in range(num_steps // fused_train_steps):
+            algorithm._do_fused_training(
+                iteration=0, num_steps=fused_train_steps)
+    else:
+        for _ in range(num_steps):
+            algorithm._do_training(
+                iteration=0, batch=algorithm._training_batch())
+
+
+def benchmark(args):
+    env = GymAdapter(domain=args.domain, task=args.task)
+
+    results = {}
+    for fused_train_steps in args.fused_train_steps:
+        algorithm = build_algorithm(env, fused_train_steps, args)
+
+        run_training_steps(algorithm, fused_train_steps, args.warmup_steps)
+
+        start = time.perf_counter()
+        run_training_steps(algorithm, fused_train_steps, args.num_steps)
+        elapsed = time.perf_counter() - start
+
+        results[fused_train_steps] = args.num_steps / elapsed
+        print(f"fused_train_steps={fused_train_steps}:"
+              f" {results[fused_train_steps]:.1f} updates/sec")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--domain', type=str, default='Pendulum')
+    parser.add_argument('--task', type=str, default='v0')
+    parser.add_argument('--fused_train_steps',
+                        type=int,
+                        nargs='+',
+                        default=(1, 4, 16))
+    parser.add_argument('--hidden_layer_sizes',
+                        type=int,
+                        nargs='+',
+                        default=(256, 256))
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--pool_size', type=int, default=10000)
+    parser.add_argument('--warmup_steps', type=int, default=64)
+    parser.add_argument('--num_steps', type=int, default=1024)
+    args = parser.parse_args()
+
+    benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark the start up time of a worker, up to its first environment step.
+
+Every repeat runs in a fresh interpreter, so nothing is cached in
+`sys.modules`. The child process times the import of the environment
+utilities, the creation of the environment and its first reset and step. It
+can also time the import of extra modules, e.g. the experiment module that
+the Ray workers import.
+
+Example:
+    python -m scripts.benchmark_startup \
+        --universe gym --domain Pendulum --task v0 --repeats 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+
+CHILD_SCRIPT = """
+import importlib
+import json
+import sys
+import time
+
+universe, domain, task, modules = (
+    sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4:])
+timings = {}
+
+start = time.perf_counter()
+for module in modules:
+    importlib.import_module(module)
+timings['import_modules'] = time.perf_counter() - start
+
+start = time.perf_counter()
+from rl_with_videos.environments.utils import get_environment
+timings['import_environment_utils'] = time.perf_counter() - start
+
+start = time.perf_counter()
+env = get_environment(universe, domain, task, {})
+timings['create_environment'] = time.perf_counter() - start
+
+start = time.perf_counter()
+env.reset()
+env.step(env.action_space.sample())
+timings['first_step'] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def run_child(args):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT,
+         args.universe, args.domain, args.task, *args.modules],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True).stdout
+    # the environments may print to stdout, the timings are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(args):
+    runs = [run_child(args) for _ in range(args.repeats)]
+
+    results = {
+        stage: float(np.median([run[stage] for run in runs]))
+        for stage in runs[0]
+    }
+    results['time_to_first_step'] = float(np.median([
+        sum(run.values()) for run in runs]))
+
+    for stage, seconds in results.items():
+        print(f"{stage}: {seconds:.3f} s")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--universe', type=str, default='gym')
+    parser.add_argument('--domain', type=str, default='Pendulum')
+    parser.add_argument('--task', type=str, default='v0')
+    parser.add_argument('--modules',
+                        type=str,
+                        nargs='*',
+                        default=(),
+                        help="Modules imported before the environment,"
+                             " e.g. examples.run_rl.main.")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark(args)
+
+
+if __name__ == '__main__':
+    main()